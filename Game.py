@@ -1,11 +1,11 @@
 import pygame
 import random
-from collections import deque
 import sys
 import math
-import threading
 import json
 import os
+import itertools
+from collections import OrderedDict
 
 pygame.init()
 
@@ -60,6 +60,98 @@ images = {
 
 rects = {k + "_rect": images[k].get_rect() for k in images}
 
+# Scaled, display-format card surfaces keyed by (card_key, w, h[, alpha]), and the static
+# table layer keyed by (SCREEN_W, SCREEN_H); both emptied by _recalc_layout
+_card_cache = {}
+_table_layer = {}
+
+def card_surf(card_key, w=None, h=None, alpha=None):
+    """images[card_key] scaled to w x h (default CARD_W x CARD_H), converted once and reused."""
+    w = CARD_W if w is None else w; h = CARD_H if h is None else h
+    k = (card_key, w, h) if alpha is None else (card_key, w, h, alpha)
+    s = _card_cache.get(k)
+    if s is None:
+        s = pygame.transform.scale(images[card_key], (w, h)).convert_alpha()
+        if alpha is not None: s.set_alpha(alpha)
+        _card_cache[k] = s
+    return s
+
+# Fonts are looked up once per (name, size, bold, italic); rendered strings are kept LRU
+_fonts = {}
+_text_cache = OrderedDict()
+TEXT_CACHE_SIZE = 512
+
+def get_font(name, size, bold=False, italic=False):
+    k = (name, size, bold, italic)
+    f = _fonts.get(k)
+    if f is None:
+        f = _fonts[k] = pygame.font.SysFont(name, size, bold=bold, italic=italic)
+    return f
+
+def render_text(font, text, colour):
+    """font.render(text, True, colour), cached by (font, text, colour).  The surface is shared:
+    a caller that set_alpha()s it must do so on every blit."""
+    k = (font, text, colour)
+    s = _text_cache.get(k)
+    if s is None:
+        s = _text_cache[k] = font.render(text, True, colour)
+        if len(_text_cache) > TEXT_CACHE_SIZE: _text_cache.popitem(last=False)
+    else:
+        _text_cache.move_to_end(k)
+    return s
+
+# Retained-mode presentation: loops describe their frame as regions and only repaint what changed
+class Compositor:
+    """
+    Dirty-rectangle bookkeeping for one screen loop.  Each frame the loop
+    describes what it would draw as {key: (rect, state)}; update() returns
+    the rects of regions that appeared, vanished, moved or changed state
+    since the previous frame (the whole screen after invalidate()), and an
+    empty list when the frame can be skipped.
+    """
+
+    def __init__(self):
+        self.regions = {}
+        self.full = True
+
+    def invalidate(self):
+        """Something else drew over the screen: repaint all of it next frame."""
+        self.full = True
+
+    def update(self, regions):
+        old, self.regions = self.regions, regions
+        if self.full:
+            self.full = False
+            return [pygame.Rect(0, 0, SCREEN_W, SCREEN_H)]
+        dirty = []
+        for k in old.keys() | regions.keys():
+            a, b = old.get(k), regions.get(k)
+            if a != b:
+                if a: dirty.append(a[0])
+                if b: dirty.append(b[0])
+        return dirty
+
+    def present(self, screen, rects, draw):
+        """
+        Repaint the dirty rects with draw(), which must cover everything it
+        clips to (start with an opaque blit), and push just those rects.
+        Far-apart rects are drawn one clip at a time rather than as their
+        union.  Returns False when nothing was dirty.
+        """
+        if not rects: return False
+        union = rects[0].unionall(rects[1:])
+        clips = [union]
+        if 1 < len(rects) <= 8 and union.w * union.h > 2 * sum(r.w * r.h for r in rects):
+            clips = rects
+        try:
+            for clip in clips:
+                screen.set_clip(clip)
+                draw()
+        finally:
+            screen.set_clip(None)
+        pygame.display.update(rects)
+        return True
+
 def ease_out_cubic(t): return 1 - pow(1 - t, 3)
 
 BLACK      = (0, 0, 0)
@@ -84,7 +176,7 @@ def load_config():
                 return json.load(f)
         except Exception:
             pass
-    return {"api_key": "", "resolution": [1980, 1080], "fullscreen": False}
+    return {"api_key": "", "resolution": [1980, 1080], "fullscreen": False, "ai_backend": "claude"}
 
 def save_config(cfg):
     try:
@@ -116,6 +208,7 @@ def _recalc_layout():
     CARD_W = max(60, int(120 * scale))
     CARD_H = max(90, int(180 * scale))
     MARGIN = max(30, int(60 * scale))
+    _card_cache.clear(); _table_layer.clear()
 
 def apply_resolution(screen_ref, w, h, fullscreen):
     global SCREEN_W, SCREEN_H, FULLSCREEN
@@ -131,53 +224,7 @@ def apply_resolution(screen_ref, w, h, fullscreen):
 
 _recalc_layout()
 
-# ── Card parsing ───────────────────────────────────────────────────────────────
-
-_RANK_NAMES  = {'six':'6','seven':'7','eight':'8','nine':'9','ten':'10',
-                'jack':'J','queen':'Q','king':'K','ace':'A'}
-_SUIT_SUFFIX = {'C':'clubs','D':'diamonds','H':'hearts','S':'spades'}
-_RANK_ORDER  = ['6','7','8','9','10','J','Q','K','A']
-_UNPLAYABLE  = {'back'}
-_SKIP_SUIT   = {'skipC':'clubs','skipD':'diamonds','skipH':'hearts','skipS':'spades'}
-_REVERSE_SUIT= {'reverseC':'clubs','reverseD':'diamonds','reverseH':'hearts','reverseS':'spades'}
-
-def _is_skip(k):    return k in _SKIP_SUIT
-def _is_wild(k):    return k == 'wild'
-def _is_reverse(k): return k in _REVERSE_SUIT
-
-def _parse_key(key):
-    if _is_wild(key):    return ('wild','WILD')
-    if _is_skip(key):    return (_SKIP_SUIT[key],'SKIP')
-    if _is_reverse(key): return (_REVERSE_SUIT[key],'REVERSE')
-    low = key.lower()
-    for name, rank in _RANK_NAMES.items():
-        if low.startswith(name):
-            return _SUIT_SUFFIX[key[len(name):]],rank
-    raise ValueError(f"Cannot parse image key: {key!r}")
-
-def _trump_suit_of(key): return _parse_key(key)[0]
-
-def _can_beat(atk_key, def_key, trump_suit):
-    if _is_wild(def_key): return True
-    a_suit,a_rank = _parse_key(atk_key)
-    d_suit,d_rank = _parse_key(def_key)
-    if _is_reverse(def_key) or _is_skip(def_key): return d_suit==a_suit
-    if d_suit!=trump_suit and d_suit!=a_suit: return False
-    a_str = _RANK_ORDER.index(a_rank)+(100 if a_suit==trump_suit else 0)
-    d_str = _RANK_ORDER.index(d_rank)+(100 if d_suit==trump_suit else 0)
-    return d_str>a_str
-
-def _ranks_on_table(table):
-    ranks=set()
-    for slot in table:
-        if slot is None: continue
-        atk,dfn=slot
-        _,ar=_parse_key(atk)
-        if ar not in ('SKIP','WILD','REVERSE'): ranks.add(ar)
-        if dfn is not None:
-            _,dr=_parse_key(dfn)
-            if dr not in ('SKIP','WILD','REVERSE'): ranks.add(dr)
-    return ranks
+from durak_rules import DurakRules, DECK
 
 # ── Suit picker ────────────────────────────────────────────────────────────────
 
@@ -196,41 +243,49 @@ def run_suit_picker(screen, fonts):
     by  = cy-btn_h//2+20
     suit_rects = [(s, pygame.Rect(bx0+i*(btn_w+gap), by, btn_w, btn_h))
                   for i,s in enumerate(_SUIT_NAMES)]
-    title_f = pygame.font.SysFont("Georgia",26,bold=True)
-    sym_f   = pygame.font.SysFont("Georgia",40,bold=True)
+    title_f = get_font("Georgia",26,bold=True)
+    sym_f   = get_font("Georgia",40,bold=True)
+    # The dimmed table, panel and title never change while the picker is up
+    base = screen.copy()
+    ov = pygame.Surface((SCREEN_W,SCREEN_H),pygame.SRCALPHA)
+    ov.fill((0,0,0,160))
+    base.blit(ov,(0,0))
+    panel = pygame.Surface((pw,ph),pygame.SRCALPHA)
+    pygame.draw.rect(panel,(20,30,60,240),(0,0,pw,ph),border_radius=14)
+    pygame.draw.rect(panel,GOLD,(0,0,pw,ph),2,border_radius=14)
+    base.blit(panel,panel_rect.topleft)
+    t = render_text(title_f,"Choose new TRUMP suit",GOLD)
+    base.blit(t,(cx-t.get_width()//2, cy-ph//2+16))
+    comp = Compositor()
+
+    def draw():
+        screen.blit(base,(0,0))
+        for suit,rect in suit_rects:
+            hov=rect.collidepoint(mx,my)
+            pygame.draw.rect(screen,(60,50,10) if hov else (30,30,30),rect,border_radius=10)
+            pygame.draw.rect(screen,GOLD if hov else (120,100,40),rect,2,border_radius=10)
+            sym = render_text(sym_f,_SUIT_UNICODE[suit],_SUIT_COLOURS[suit])
+            screen.blit(sym,sym.get_rect(center=rect.center))
+
     while True:
         clock.tick(60)
         mx,my = pygame.mouse.get_pos()
         for event in pygame.event.get():
             if event.type==pygame.QUIT: pygame.quit(); sys.exit()
+            if event.type in (pygame.VIDEOEXPOSE,pygame.WINDOWEXPOSED): comp.invalidate()
             if event.type==pygame.MOUSEBUTTONDOWN and event.button==1:
                 for suit,rect in suit_rects:
                     if rect.collidepoint(mx,my): return suit
-        ov = pygame.Surface((SCREEN_W,SCREEN_H),pygame.SRCALPHA)
-        ov.fill((0,0,0,160))
-        screen.blit(ov,(0,0))
-        panel = pygame.Surface((pw,ph),pygame.SRCALPHA)
-        pygame.draw.rect(panel,(20,30,60,240),(0,0,pw,ph),border_radius=14)
-        pygame.draw.rect(panel,GOLD,(0,0,pw,ph),2,border_radius=14)
-        screen.blit(panel,panel_rect.topleft)
-        t = title_f.render("Choose new TRUMP suit",True,GOLD)
-        screen.blit(t,(cx-t.get_width()//2, cy-ph//2+16))
-        for suit,rect in suit_rects:
-            hov=rect.collidepoint(mx,my)
-            pygame.draw.rect(screen,(60,50,10) if hov else (30,30,30),rect,border_radius=10)
-            pygame.draw.rect(screen,GOLD if hov else (120,100,40),rect,2,border_radius=10)
-            sym = sym_f.render(_SUIT_UNICODE[suit],True,_SUIT_COLOURS[suit])
-            screen.blit(sym,sym.get_rect(center=rect.center))
-        pygame.display.flip()
+        comp.present(screen,comp.update({suit:(rect,rect.collidepoint(mx,my)) for suit,rect in suit_rects}),draw)
 
 # ── API Key entry screen ───────────────────────────────────────────────────────
 
 def run_api_key_screen(screen, bg, fonts):
     clock   = pygame.time.Clock()
     _,_,btn_font,hint_font,_ = fonts
-    title_f = pygame.font.SysFont("Georgia",28,bold=True)
-    sub_f   = pygame.font.SysFont("Palatino Linotype",18)
-    inp_f   = pygame.font.SysFont("Courier New",17)
+    title_f = get_font("Georgia",28,bold=True)
+    sub_f   = get_font("Palatino Linotype",18)
+    inp_f   = get_font("Courier New",17)
 
     cfg     = load_config()
     api_key = cfg.get("api_key","")
@@ -244,6 +299,29 @@ def run_api_key_screen(screen, bg, fonts):
     save_rect = pygame.Rect(cx-170, py+ph-66, 150, 42)
     back_rect = pygame.Rect(cx+20,  py+ph-66, 150, 42)
 
+    # Everything but the Back button's hover is fixed: draw it once
+    base = bg.copy()
+    ov = pygame.Surface((SCREEN_W,SCREEN_H),pygame.SRCALPHA)
+    ov.fill((0,0,0,190))
+    base.blit(ov,(0,0))
+    panel = pygame.Surface((pw,ph),pygame.SRCALPHA)
+    pygame.draw.rect(panel,(12,20,50,250),(0,0,pw,ph),border_radius=16)
+    pygame.draw.rect(panel,AI_BLUE,(0,0,pw,ph),2,border_radius=16)
+    base.blit(panel,(px,py))
+    pygame.draw.rect(base,(8,16,40),inp_rect,border_radius=6)
+    pygame.draw.rect(base,AI_BLUE,inp_rect,2,border_radius=6)
+    sl=render_text(btn_font,"Save",CREAM)
+    base.blit(sl,sl.get_rect(center=save_rect.center))
+    comp = Compositor()
+
+    def draw():
+        screen.blit(base,(0,0))
+        hov_b=back_rect.collidepoint(mx,my)
+        pygame.draw.rect(screen,(40,10,10) if hov_b else (30,20,20),back_rect,border_radius=8)
+        pygame.draw.rect(screen,(220,80,80) if hov_b else (150,60,60),back_rect,2,border_radius=8)
+        bl=render_text(btn_font,"Back",CREAM)
+        screen.blit(bl,bl.get_rect(center=back_rect.center))
+
     while True:
         dt = clock.tick(60)
         cursor_timer += dt
@@ -252,6 +330,7 @@ def run_api_key_screen(screen, bg, fonts):
 
         for event in pygame.event.get():
             if event.type==pygame.QUIT: pygame.quit(); sys.exit()
+            if event.type in (pygame.VIDEOEXPOSE,pygame.WINDOWEXPOSED): comp.invalidate()
             if event.type==pygame.KEYDOWN:
                 if event.key==pygame.K_ESCAPE:
                     return api_key
@@ -270,24 +349,7 @@ def run_api_key_screen(screen, bg, fonts):
                 if back_rect.collidepoint(mx,my):
                     return cfg.get("api_key","")
 
-        screen.blit(bg,(0,0))
-        ov = pygame.Surface((SCREEN_W,SCREEN_H),pygame.SRCALPHA)
-        ov.fill((0,0,0,190))
-        screen.blit(ov,(0,0))
-        panel = pygame.Surface((pw,ph),pygame.SRCALPHA)
-        pygame.draw.rect(panel,(12,20,50,250),(0,0,pw,ph),border_radius=16)
-        pygame.draw.rect(panel,AI_BLUE,(0,0,pw,ph),2,border_radius=16)
-        screen.blit(panel,(px,py))
-        pygame.draw.rect(screen,(8,16,40),inp_rect,border_radius=6)
-        pygame.draw.rect(screen,AI_BLUE,inp_rect,2,border_radius=6)
-        sl=btn_font.render("Save",True,CREAM)
-        screen.blit(sl,sl.get_rect(center=save_rect.center))
-        hov_b=back_rect.collidepoint(mx,my)
-        pygame.draw.rect(screen,(40,10,10) if hov_b else (30,20,20),back_rect,border_radius=8)
-        pygame.draw.rect(screen,(220,80,80) if hov_b else (150,60,60),back_rect,2,border_radius=8)
-        bl=btn_font.render("Back",True,CREAM)
-        screen.blit(bl,bl.get_rect(center=back_rect.center))
-        pygame.display.flip()
+        comp.present(screen,comp.update({'back':(back_rect,back_rect.collidepoint(mx,my))}),draw)
 
 # ── Settings menu ──────────────────────────────────────────────────────────────
 
@@ -295,9 +357,9 @@ def run_settings_menu(screen, bg, fonts):
     global SCREEN_W, SCREEN_H, FULLSCREEN
     clock=pygame.time.Clock()
     _,_,btn_font,_,_ = fonts
-    title_f  = pygame.font.SysFont("Georgia",32,bold=True)
-    option_f = pygame.font.SysFont("Palatino Linotype",22)
-    sub_f    = pygame.font.SysFont("Palatino Linotype",18)
+    title_f  = get_font("Georgia",32,bold=True)
+    option_f = get_font("Palatino Linotype",22)
+    sub_f    = get_font("Palatino Linotype",18)
 
     current_idx=next((i for i,(w,h,_) in enumerate(RESOLUTIONS) if w==SCREEN_W and h==SCREEN_H),2)
     pending_idx=current_idx; pending_fs=FULLSCREEN
@@ -311,36 +373,27 @@ def run_settings_menu(screen, bg, fonts):
     back_rect =pygame.Rect(cx_abs+20,  py+ph-66, 150, 42)
 
     def _row_rect(i): return pygame.Rect(px+30, row_y0+i*ROW_H, pw-60, ROW_H-4)
+    fs_rect=pygame.Rect(px+30,fs_row_y,pw-60,ROW_H-4)
 
-    while True:
-        clock.tick(60)
-        mx,my=pygame.mouse.get_pos()
-        for event in pygame.event.get():
-            if event.type==pygame.QUIT: pygame.quit(); sys.exit()
-            if event.type==pygame.KEYDOWN and event.key==pygame.K_ESCAPE:
-                return screen,False
-            if event.type==pygame.MOUSEBUTTONDOWN and event.button==1:
-                for i in range(len(RESOLUTIONS)):
-                    if _row_rect(i).collidepoint(mx,my): pending_idx=i
-                fs_rect=pygame.Rect(px+30,fs_row_y,pw-60,ROW_H-4)
-                if fs_rect.collidepoint(mx,my): pending_fs=not pending_fs
-                if apply_rect.collidepoint(mx,my):
-                    w,h,_=RESOLUTIONS[pending_idx]
-                    new_screen=apply_resolution(screen,w,h,pending_fs)
-                    return new_screen,True
-                if back_rect.collidepoint(mx,my): return screen,False
-
-        screen.blit(bg,(0,0))
-        ov=pygame.Surface((SCREEN_W,SCREEN_H),pygame.SRCALPHA); ov.fill((0,0,0,180)); screen.blit(ov,(0,0))
-        panel=pygame.Surface((pw,ph),pygame.SRCALPHA)
-        pygame.draw.rect(panel,(18,28,18,245),(0,0,pw,ph),border_radius=16)
-        pygame.draw.rect(panel,GOLD,(0,0,pw,ph),2,border_radius=16)
-        screen.blit(panel,(px,py))
-        t=title_f.render("Settings",True,GOLD)
-        screen.blit(t,(cx_abs-t.get_width()//2, py+22))
-        pygame.draw.line(screen,(*GOLD,100),(px+30,py+70),(px+pw-30,py+70),1)
-        sec=sub_f.render("RESOLUTION",True,(150,130,60))
-        screen.blit(sec,(px+30, row_y0-22))
+    # Panel, headings and hint are fixed: draw them once
+    base=bg.copy()
+    ov=pygame.Surface((SCREEN_W,SCREEN_H),pygame.SRCALPHA); ov.fill((0,0,0,180)); base.blit(ov,(0,0))
+    panel=pygame.Surface((pw,ph),pygame.SRCALPHA)
+    pygame.draw.rect(panel,(18,28,18,245),(0,0,pw,ph),border_radius=16)
+    pygame.draw.rect(panel,GOLD,(0,0,pw,ph),2,border_radius=16)
+    base.blit(panel,(px,py))
+    t=render_text(title_f,"Settings",GOLD)
+    base.blit(t,(cx_abs-t.get_width()//2, py+22))
+    pygame.draw.line(base,(*GOLD,100),(px+30,py+70),(px+pw-30,py+70),1)
+    sec=render_text(sub_f,"RESOLUTION",(150,130,60))
+    base.blit(sec,(px+30, row_y0-22))
+    pygame.draw.line(base,(*GOLD,60),(px+30,fs_row_y-8),(px+pw-30,fs_row_y-8),1)
+    hint=render_text(sub_f,"ESC to discard  *  Apply restarts layout",(100,90,50))
+    base.blit(hint,(cx_abs-hint.get_width()//2, py+ph+10))
+    comp=Compositor()
+
+    def draw():
+        screen.blit(base,(0,0))
         for i,(w,h,label) in enumerate(RESOLUTIONS):
             rr=_row_rect(i); hov=rr.collidepoint(mx,my); selected=(i==pending_idx)
             bg_col=(40,55,40,200) if selected else ((30,45,30,160) if hov else (20,30,20,120))
@@ -349,14 +402,12 @@ def run_settings_menu(screen, bg, fonts):
             pygame.draw.circle(screen,GOLD,(rr.x+18,rr.centery),9,2)
             if selected: pygame.draw.circle(screen,GOLD,(rr.x+18,rr.centery),5)
             col=GOLD if selected else (CREAM if hov else (180,160,100))
-            lbl=option_f.render(label,True,col)
+            lbl=render_text(option_f,label,col)
             screen.blit(lbl,(rr.x+38, rr.centery-lbl.get_height()//2))
             if w==SCREEN_W and h==SCREEN_H:
-                badge=sub_f.render("current",True,(80,160,80))
+                badge=render_text(sub_f,"current",(80,160,80))
                 screen.blit(badge,(rr.right-badge.get_width()-10, rr.centery-badge.get_height()//2))
-        fs_rect=pygame.Rect(px+30,fs_row_y,pw-60,ROW_H-4)
-        pygame.draw.line(screen,(*GOLD,60),(px+30,fs_row_y-8),(px+pw-30,fs_row_y-8),1)
-        fs_sec=sub_f.render("DISPLAY MODE",True,(150,130,60))
+        fs_sec=render_text(sub_f,"DISPLAY MODE",(150,130,60))   # overlaps the last row: goes on top of it
         screen.blit(fs_sec,(px+30,fs_row_y-28))
         hov_fs=fs_rect.collidepoint(mx,my)
         fs_bg=pygame.Surface((fs_rect.width,fs_rect.height),pygame.SRCALPHA)
@@ -366,185 +417,52 @@ def run_settings_menu(screen, bg, fonts):
         if pending_fs:
             pygame.draw.line(screen,GOLD,(cb_x-5,cb_y),(cb_x-1,cb_y+5),2)
             pygame.draw.line(screen,GOLD,(cb_x-1,cb_y+5),(cb_x+6,cb_y-5),2)
-        fs_lbl=option_f.render("Fullscreen",True,GOLD if pending_fs else CREAM)
+        fs_lbl=render_text(option_f,"Fullscreen",GOLD if pending_fs else CREAM)
         screen.blit(fs_lbl,(fs_rect.x+38, fs_rect.centery-fs_lbl.get_height()//2))
         hov_a=apply_rect.collidepoint(mx,my)
         pygame.draw.rect(screen,(50,40,5) if hov_a else (35,28,3),apply_rect,border_radius=8)
         pygame.draw.rect(screen,GOLD_HOVER if hov_a else GOLD,apply_rect,2,border_radius=8)
-        al=btn_font.render("Apply",True,GOLD_HOVER if hov_a else CREAM)
+        al=render_text(btn_font,"Apply",GOLD_HOVER if hov_a else CREAM)
         screen.blit(al,al.get_rect(center=apply_rect.center))
         hov_b=back_rect.collidepoint(mx,my)
         pygame.draw.rect(screen,(40,10,10) if hov_b else (30,20,20),back_rect,border_radius=8)
         pygame.draw.rect(screen,(220,80,80) if hov_b else (150,60,60),back_rect,2,border_radius=8)
-        bl=btn_font.render("Back",True,CREAM)
+        bl=render_text(btn_font,"Back",CREAM)
         screen.blit(bl,bl.get_rect(center=back_rect.center))
-        hint=sub_f.render("ESC to discard  *  Apply restarts layout",True,(100,90,50))
-        screen.blit(hint,(cx_abs-hint.get_width()//2, py+ph+10))
-        pygame.display.flip()
 
-# ── DurakRules ─────────────────────────────────────────────────────────────────
-
-class DurakRules:
-    def __init__(self, all_card_keys, trump_key):
-        self.trump_suit=_trump_suit_of(trump_key)
-        self.trump_key=trump_key
-        pool=[k for k in all_card_keys if k not in _UNPLAYABLE]
-        random.shuffle(pool)
-        self.hand=pool[:6]; self.opp_hand=pool[6:12]
-        self.remaining=deque(pool[12:])
-        self.attacker=self._first_attacker()
-        self.defender='opponent' if self.attacker=='player' else 'player'
-        self.table=[None]*6; self.locked_ranks=set()
-        self.phase='attack'; self.winner=None; self.status=""
-        self.pending_wild=False
-        self.player_taken=[]; self.opp_taken=[]
-        self._refresh_status()
-
-    def _first_attacker(self):
-        def lowest_trump(hand):
-            ts=[(_RANK_ORDER.index(r),k) for k in hand for s,r in [_parse_key(k)]
-                if s==self.trump_suit and r not in ('SKIP','WILD','REVERSE')]
-            return min(ts)[0] if ts else 999
-        p,o=lowest_trump(self.hand),lowest_trump(self.opp_hand)
-        if p==o: return random.choice(['player','opponent'])
-        return 'player' if p<o else 'opponent'
-
-    def _refresh_status(self):
-        if self.phase=='game_over':
-            if self.winner=='draw':   self.status="DRAW - both players emptied their hands!"
-            elif self.winner=='player': self.status="YOU WIN - AI is the Durak!"
-            else:                     self.status="YOU LOSE - You are the Durak!"
-            return
-        if self.phase=='attack':
-            who="YOUR TURN" if self.attacker=='player' else "AI ATTACKS"
-            self.status=f"{who}: drag a card to attack."
-        else:
-            who="YOUR TURN" if self.defender=='player' else "AI DEFENDS"
-            self.status=f"{who}: defend or click TAKE."
-
-    def _attacker_hand(self):  return self.hand if self.attacker=='player' else self.opp_hand
-    def _defender_hand(self):  return self.hand if self.defender=='player' else self.opp_hand
-    def _defender_taken(self): return self.player_taken if self.defender=='player' else self.opp_taken
-    def _attacker_taken(self): return self.player_taken if self.attacker=='player' else self.opp_taken
-
-    def valid_attack_cards(self):
-        hand=self._attacker_hand()+self._attacker_taken()
-        occupied=[s for s in self.table if s is not None]
-        if not occupied:
-            return {k for k in hand if not _is_skip(k) and not _is_wild(k) and not _is_reverse(k)}
-        table_ranks=_ranks_on_table(self.table)
-        return {k for k in hand
-                if not _is_skip(k) and not _is_wild(k) and not _is_reverse(k)
-                and _parse_key(k)[1] in table_ranks
-                and _parse_key(k)[1] not in self.locked_ranks}
-
-    def valid_defense_for(self,atk_key):
-        hand=self._defender_hand()+self._defender_taken()
-        return {k for k in hand if _can_beat(atk_key,k,self.trump_suit)}
-
-    def all_defense_cards(self):
-        hand=self._defender_hand()+self._defender_taken()
-        return {k for k in hand
-                if any(_can_beat(slot[0],k,self.trump_suit)
-                       for slot in self.table if slot is not None and slot[1] is None)}
-
-    def _unbeaten(self):  return [s for s in self.table if s is not None and s[1] is None]
-    def _all_beaten(self):
-        occupied=[s for s in self.table if s is not None]
-        return bool(occupied) and all(s[1] is not None for s in occupied)
-
-    def try_attack(self,card_key,slot_index):
-        if self.phase!='attack': return False
-        if card_key not in self.valid_attack_cards(): return False
-        if self.table[slot_index] is not None: return False
-        self.table[slot_index]=[card_key,None]; self.phase='defense'
-        atk_taken=self._attacker_taken()
-        if card_key in atk_taken: atk_taken.remove(card_key)
-        else: self._attacker_hand().remove(card_key)
-        self._check_game_over(); self._refresh_status()
-        return True
+    while True:
+        clock.tick(60)
+        mx,my=pygame.mouse.get_pos()
+        for event in pygame.event.get():
+            if event.type==pygame.QUIT: pygame.quit(); sys.exit()
+            if event.type in (pygame.VIDEOEXPOSE,pygame.WINDOWEXPOSED): comp.invalidate()
+            if event.type==pygame.KEYDOWN and event.key==pygame.K_ESCAPE:
+                return screen,False
+            if event.type==pygame.MOUSEBUTTONDOWN and event.button==1:
+                for i in range(len(RESOLUTIONS)):
+                    if _row_rect(i).collidepoint(mx,my): pending_idx=i
+                if fs_rect.collidepoint(mx,my): pending_fs=not pending_fs
+                if apply_rect.collidepoint(mx,my):
+                    w,h,_=RESOLUTIONS[pending_idx]
+                    new_screen=apply_resolution(screen,w,h,pending_fs)
+                    return new_screen,True
+                if back_rect.collidepoint(mx,my): return screen,False
 
-    def try_defend(self,atk_key,def_key):
-        if self.phase!='defense': return False
-        if def_key not in self.valid_defense_for(atk_key): return False
-        def_taken=self._defender_taken()
-        if def_key in def_taken: def_taken.remove(def_key)
-        else: self._defender_hand().remove(def_key)
-        if _is_skip(def_key):
-            _,atk_rank=_parse_key(atk_key); self.locked_ranks.add(atk_rank)
-        for slot in self.table:
-            if slot is not None and slot[0]==atk_key and slot[1] is None:
-                slot[1]=def_key; break
-        if _is_reverse(def_key):
-            self.attacker,self.defender=self.defender,self.attacker
-            self.phase='attack'; self._check_game_over(); self._refresh_status()
-            return 'ok_reverse'
-        if self._all_beaten(): self.phase='attack'
-        self._check_game_over(); self._refresh_status()
-        if _is_wild(def_key): self.pending_wild=True; return 'ok_wild'
-        return 'ok'
-
-    def try_take(self):
-        if self.phase!='defense': return False
-        occupied=[s for s in self.table if s is not None]
-        if not occupied: return False
-        taken=self._defender_taken()
-        for slot in self.table:
-            if slot is not None:
-                taken.append(slot[0])
-                if slot[1] is not None: taken.append(slot[1])
-        self.table=[None]*6; self.locked_ranks=set()
-        atk_r=self._refill_hand(self._attacker_hand(),self._attacker_taken())
-        def_r=self._refill_hand(self._defender_hand(),self._defender_taken())
-        self.phase='attack'; self._check_game_over(); self._refresh_status()
-        return (True,atk_r,def_r)
-
-    def _refill_hand(self,hand,taken_pile):
-        refilled=[]
-        while len(hand)<6 and taken_pile:
-            card=taken_pile.pop(0); hand.append(card); refilled.append((card,'taken'))
-        while len(hand)<6 and self.remaining:
-            card=self.remaining.popleft(); hand.append(card); refilled.append((card,'deck'))
-        return refilled
-
-    def resolve_wild(self,new_suit):
-        self.trump_suit=new_suit
-        suffix={'clubs':'C','diamonds':'D','hearts':'H','spades':'S'}
-        self.trump_key='ace'+suffix[new_suit]; self.pending_wild=False
-
-    def try_end_attack(self):
-        if self.phase!='attack': return []
-        occupied=[s for s in self.table if s is not None]
-        if not occupied or self._unbeaten(): return []
-        cleared=[]
-        for slot in self.table:
-            if slot is not None:
-                cleared.append(slot[0])
-                if slot[1] is not None: cleared.append(slot[1])
-        self.attacker,self.defender=self.defender,self.attacker
-        self.table=[None]*6; self.locked_ranks=set()
-        atk_r=self._refill_hand(self._attacker_hand(),self._attacker_taken())
-        def_r=self._refill_hand(self._defender_hand(),self._defender_taken())
-        self.phase='attack'; self._check_game_over(); self._refresh_status()
-        return (cleared,atk_r,def_r)
-
-    def _check_game_over(self):
-        if self.remaining: return
-        p_empty=len(self.hand)==0 and len(self.player_taken)==0
-        o_empty=len(self.opp_hand)==0 and len(self.opp_taken)==0
-        if p_empty and o_empty: self.phase='game_over'; self.winner='draw'
-        elif p_empty:           self.phase='game_over'; self.winner='player'
-        elif o_empty:           self.phase='game_over'; self.winner='opponent'
+        regions={('row',i):(_row_rect(i),(_row_rect(i).collidepoint(mx,my),i==pending_idx)) for i in range(len(RESOLUTIONS))}
+        regions['fullscreen']=(fs_rect,(fs_rect.collidepoint(mx,my),pending_fs))
+        regions['apply']=(apply_rect,apply_rect.collidepoint(mx,my))
+        regions['back']=(back_rect,back_rect.collidepoint(mx,my))
+        comp.present(screen,comp.update(regions),draw)
 
 # ── Visual helpers ─────────────────────────────────────────────────────────────
 
 def load_fonts():
     return (
-        pygame.font.SysFont("Georgia",90,bold=True),
-        pygame.font.SysFont("Georgia",26,italic=True),
-        pygame.font.SysFont("Palatino Linotype",34,bold=True),
-        pygame.font.SysFont("Palatino Linotype",20),
-        pygame.font.SysFont("Palatino Linotype",22,bold=True),
+        get_font("Georgia",90,bold=True),
+        get_font("Georgia",26,italic=True),
+        get_font("Palatino Linotype",34,bold=True),
+        get_font("Palatino Linotype",20),
+        get_font("Palatino Linotype",22,bold=True),
     )
 
 def make_bg(w,h):
@@ -553,18 +471,22 @@ def make_bg(w,h):
     pygame.draw.rect(bg,DARK_GREEN,(40,40,w-80,h-80),8,border_radius=30)
     return bg
 
+_BG_CARDS=[(80,120,0,0.4),(1850,80,0.8,0.3),(60,920,1.6,0.5),(1860,800,2.4,0.35),(990,980,3.2,0.25)]
+
+def _bg_card_poses(tick):
+    # (centre x, centre y, angle) per drifting card, in whole pixels and half degrees so it only changes when the picture does
+    for bx,by,ao,sm in _BG_CARDS:
+        yield (int(bx*SCREEN_W/1980), int(int(by*SCREEN_H/1080)+math.sin(tick*0.0006*sm+ao)*12),
+               round((ao+math.sin(tick*0.0008*sm+ao)*8)*2)/2)
+
 def draw_bg_cards(surf,tick):
-    card_data=[(80,120,0,0.4),(1850,80,0.8,0.3),(60,920,1.6,0.5),(1860,800,2.4,0.35),(990,980,3.2,0.25)]
     cw,ch=72,108
-    for bx,by,ao,sm in card_data:
-        sx=int(bx*SCREEN_W/1980); sy=int(by*SCREEN_H/1080)
-        angle=ao+math.sin(tick*0.0008*sm+ao)*8
-        drift=math.sin(tick*0.0006*sm+ao)*12
+    for sx,sy,angle in _bg_card_poses(tick):
         cs=pygame.Surface((cw,ch),pygame.SRCALPHA)
         pygame.draw.rect(cs,(50,50,50,90),(0,0,cw,ch),border_radius=6)
         pygame.draw.rect(cs,(90,70,20,70),(0,0,cw,ch),2,border_radius=6)
         rot=pygame.transform.rotate(cs,angle)
-        surf.blit(rot,(sx-rot.get_width()//2, sy+drift-rot.get_height()//2))
+        surf.blit(rot,(sx-rot.get_width()//2, sy-rot.get_height()//2))
 
 def draw_zone_label(surf,font,text,cx,y):
     lbl=font.render(text,True,GOLD); x=cx-lbl.get_width()//2
@@ -579,58 +501,65 @@ def draw_card_slot(surf,x,y):
         pygame.draw.rect(surf,(*GOLD,60),(cx2,cy2,sz,sz),1)
 
 def draw_card_image(surf,card_key,x,y):
-    surf.blit(pygame.transform.scale(images[card_key],(CARD_W,CARD_H)),(x,y))
+    surf.blit(card_surf(card_key),(x,y))
 
-def draw_game_table(screen,bg,fonts,tick,trump_key,vs_ai=False):
+def _render_table_layer(bg,fonts):
     _,_,_,hint_font,label_font=fonts
-    screen.blit(bg,(0,0)); draw_bg_cards(screen,tick)
-    cx=SCREEN_W//2
+    layer=bg.copy(); cx=SCREEN_W//2
     dark=pygame.Surface((SCREEN_W,SCREEN_H),pygame.SRCALPHA); dark.fill((0,0,0,90))
     pygame.draw.ellipse(dark,(0,0,0,0),(MARGIN+10,MARGIN+10,SCREEN_W-MARGIN*2-20,SCREEN_H-MARGIN*2-20))
-    screen.blit(dark,(0,0))
+    layer.blit(dark,(0,0))
     brd=pygame.Surface((SCREEN_W,SCREEN_H),pygame.SRCALPHA)
     pygame.draw.ellipse(brd,(*GOLD,60),(MARGIN,MARGIN,SCREEN_W-MARGIN*2,SCREEN_H-MARGIN*2),3)
     pygame.draw.ellipse(brd,(*DARK_GREEN,120),(MARGIN+12,MARGIN+12,SCREEN_W-MARGIN*2-24,SCREEN_H-MARGIN*2-24),8)
-    screen.blit(brd,(0,0))
+    layer.blit(brd,(0,0))
     deck_x=SCREEN_W-CARD_W-220; deck_y=SCREEN_H//2-CARD_H//2
-    draw_card_slot(screen,deck_x,deck_y)
-    draw_zone_label(screen,label_font,"DECK",deck_x+CARD_W//2,deck_y-36)
-    screen.blit(pygame.transform.scale(images["back"],(CARD_W,CARD_H)),(deck_x,deck_y))
+    draw_card_slot(layer,deck_x,deck_y)
+    draw_zone_label(layer,label_font,"DECK",deck_x+CARD_W//2,deck_y-36)
+    layer.blit(card_surf("back"),(deck_x,deck_y))
     trump_x=deck_x-CARD_W-30; trump_y=deck_y+20
-    draw_card_slot(screen,trump_x,trump_y)
-    draw_zone_label(screen,label_font,"TRUMP",trump_x+CARD_W//2,trump_y-36)
-    screen.blit(pygame.transform.scale(images[trump_key],(CARD_W,CARD_H)),(trump_x,trump_y))
+    draw_card_slot(layer,trump_x,trump_y)
+    draw_zone_label(layer,label_font,"TRUMP",trump_x+CARD_W//2,trump_y-36)
     spacing=30; n_slots=3; total_w=n_slots*CARD_W+(n_slots-1)*spacing
     field_x0=cx-total_w//2
     atk_y=SCREEN_H//2-CARD_H-20; def_y=SCREEN_H//2+20
     for i in range(n_slots):
         x=field_x0+i*(CARD_W+spacing)
-        draw_card_slot(screen,x,atk_y); draw_card_slot(screen,x,def_y)
-    pygame.draw.line(screen,(*GOLD,70),(field_x0-20,SCREEN_H//2-4),(field_x0+total_w+20,SCREEN_H//2-4),1)
+        draw_card_slot(layer,x,atk_y); draw_card_slot(layer,x,def_y)
+    pygame.draw.line(layer,(*GOLD,70),(field_x0-20,SCREEN_H//2-4),(field_x0+total_w+20,SCREEN_H//2-4),1)
     hand_slots=6; hand_total=hand_slots*CARD_W+(hand_slots-1)*spacing
     hand_x0=cx-hand_total//2; hand_y=SCREEN_H-CARD_H-70; opp_y=70
-    draw_zone_label(screen,label_font,"YOUR HAND",cx,hand_y-36)
+    draw_zone_label(layer,label_font,"YOUR HAND",cx,hand_y-36)
     opp_label="AI"
-    draw_zone_label(screen,label_font,opp_label,cx,opp_y-36+16)
+    draw_zone_label(layer,label_font,opp_label,cx,opp_y-36+16)
     for i in range(hand_slots):
-        draw_card_slot(screen,hand_x0+i*(CARD_W+spacing),hand_y)
-        draw_card_slot(screen,hand_x0+i*(CARD_W+spacing),opp_y+20)
-    icon_f=pygame.font.SysFont("Georgia",36,bold=True)
+        draw_card_slot(layer,hand_x0+i*(CARD_W+spacing),hand_y)
+        draw_card_slot(layer,hand_x0+i*(CARD_W+spacing),opp_y+20)
+    icon_f=get_font("Georgia",36,bold=True)
     for (sx,sy),suit,col in zip(
             [(MARGIN+30,MARGIN+30),(SCREEN_W-MARGIN-60,MARGIN+30),(MARGIN+30,SCREEN_H-MARGIN-60),(SCREEN_W-MARGIN-60,SCREEN_H-MARGIN-60)],
             ["S","H","D","C"],[CREAM,RED_CARD,RED_CARD,CREAM]):
-        screen.blit(icon_f.render(suit,True,(*col,120)),(sx,sy))
+        layer.blit(icon_f.render(suit,True,(*col,120)),(sx,sy))
     hint=hint_font.render("Drag cards to play  *  ESC menu",True,(130,110,60))
-    screen.blit(hint,(cx-hint.get_width()//2,SCREEN_H-32))
+    layer.blit(hint,(cx-hint.get_width()//2,SCREEN_H-32))
+    return layer.convert()
+
+def draw_game_table(screen,bg,fonts,tick,trump_key,vs_ai=False):
+    """Static table (rendered once per resolution), then the drifting bg cards and the trump on top."""
+    key=(SCREEN_W,SCREEN_H)
+    if key not in _table_layer: _table_layer[key]=_render_table_layer(bg,fonts)
+    screen.blit(_table_layer[key],(0,0)); draw_bg_cards(screen,tick)
+    trump_x=SCREEN_W-CARD_W-220-CARD_W-30; trump_y=SCREEN_H//2-CARD_H//2+20
+    screen.blit(card_surf(trump_key),(trump_x,trump_y))
 
 def draw_taken_pile_panel(screen,pile,title,anchor_x,anchor_y,small_f,mx,my,is_active):
     if not pile: return []
-    lbl=small_f.render(f"{title} TAKEN ({len(pile)})",True,(220,160,60))
+    lbl=render_text(small_f,f"{title} TAKEN ({len(pile)})",(220,160,60))
     screen.blit(lbl,(anchor_x,anchor_y-22))
     card_rects=[]; mini_w,mini_h=60,90; visible=pile[-8:]
     for idx,card in enumerate(visible):
         cx2=anchor_x+idx*18; cy2=anchor_y
-        img=pygame.transform.scale(images[card],(mini_w,mini_h))
+        img=card_surf(card,mini_w,mini_h)
         if is_active and pygame.Rect(cx2,cy2,mini_w,mini_h).collidepoint(mx,my):
             glow=pygame.Surface((mini_w+8,mini_h+8),pygame.SRCALPHA)
             pygame.draw.rect(glow,(*GOLD,80),(0,0,mini_w+8,mini_h+8),border_radius=6)
@@ -640,18 +569,23 @@ def draw_taken_pile_panel(screen,pile,title,anchor_x,anchor_y,small_f,mx,my,is_a
         card_rects.append((card,pygame.Rect(cx2,cy2,mini_w,mini_h)))
     return card_rects
 
-def draw_ai_thinking(screen):
+def _ai_thinking_text(offline):
+    # (surface, alpha, box rect) of the pulsing indicator right now; alpha moves in steps of 8
     t=pygame.time.get_ticks()
     dots="."*(1+(t//400)%3)
-    f=pygame.font.SysFont("Georgia",22,italic=True)
-    surf=f.render(f"AI thinking{dots}",True,AI_BLUE)
-    alpha=160+int(80*math.sin(t*0.005))
+    # offline: the API breaker is open and the local AI is answering
+    surf=render_text(get_font("Georgia",22,italic=True),f"AI thinking (offline){dots}" if offline else f"AI thinking{dots}",AI_BLUE)
+    alpha=(160+int(80*math.sin(t*0.005)))//8*8
+    box=pygame.Rect(0,0,surf.get_width()+24,surf.get_height()+12); box.center=(SCREEN_W//2,SCREEN_H//2-60)
+    return surf,alpha,box
+
+def draw_ai_thinking(screen,offline=False):
+    surf,alpha,box=_ai_thinking_text(offline)
     surf.set_alpha(alpha)
-    cx=SCREEN_W//2; cy=SCREEN_H//2
-    bg_s=pygame.Surface((surf.get_width()+24,surf.get_height()+12),pygame.SRCALPHA)
-    pygame.draw.rect(bg_s,(0,0,40,180),(0,0,bg_s.get_width(),bg_s.get_height()),border_radius=8)
-    screen.blit(bg_s,(cx-bg_s.get_width()//2, cy-bg_s.get_height()//2-60))
-    screen.blit(surf,(cx-surf.get_width()//2, cy-surf.get_height()//2-60))
+    bg_s=pygame.Surface(box.size,pygame.SRCALPHA)
+    pygame.draw.rect(bg_s,(0,0,40,180),(0,0,box.w,box.h),border_radius=8)
+    screen.blit(bg_s,box.topleft)
+    screen.blit(surf,surf.get_rect(center=box.center))
 
 # ── Spark / MenuButton ─────────────────────────────────────────────────────────
 
@@ -718,16 +652,16 @@ def draw_how_to_play(surf,fonts):
     pygame.draw.rect(panel,(20,50,20,240),(0,0,pw,ph),border_radius=16)
     pygame.draw.rect(panel,GOLD,(0,0,pw,ph),2,border_radius=16)
     surf.blit(panel,(SCREEN_W//2-pw//2,SCREEN_H//2-ph//2))
-    tf=pygame.font.SysFont("Georgia",28,bold=True); bf=pygame.font.SysFont("Palatino Linotype",17)
+    tf=get_font("Georgia",28,bold=True); bf=get_font("Palatino Linotype",17)
     sy=SCREEN_H//2-ph//2+24
     for i,line in enumerate(HOW_TO_LINES):
         f=tf if i==0 else bf; col=GOLD if i==0 else CREAM
-        t=f.render(line,True,col); surf.blit(t,(SCREEN_W//2-t.get_width()//2,sy+i*19))
+        t=render_text(f,line,col); surf.blit(t,(SCREEN_W//2-t.get_width()//2,sy+i*19))
 
 def run_main_menu(screen,bg,fonts,return_on_play=False):
     clock=pygame.time.Clock()
     _,sub_font,btn_font,hint_font,_=fonts
-    title_font=pygame.font.SysFont("Georgia",90,bold=True)
+    title_font=get_font("Georgia",90,bold=True)
     cx=SCREEN_W//2
 
     if return_on_play:
@@ -778,21 +712,21 @@ def run_main_menu(screen,bg,fonts,return_on_play=False):
         for sp in sparks: sp.update()
         screen.blit(bg,(0,0)); draw_bg_cards(screen,tick)
         for sp in sparks: sp.draw(screen)
-        sh=title_font.render("UNO-URAK",True,BLACK)
+        sh=render_text(title_font,"UNO-URAK",BLACK)
         screen.blit(sh,(cx-sh.get_width()//2+4,204))
-        ti=title_font.render("UNO-URAK",True,GOLD)
+        ti=render_text(title_font,"UNO-URAK",GOLD)
         screen.blit(ti,(cx-ti.get_width()//2,200))
-        su=sub_font.render("The Card Game of Fools & Fortune",True,CREAM)
+        su=render_text(sub_font,"The Card Game of Fools & Fortune",CREAM)
         screen.blit(su,(cx-su.get_width()//2,310))
         pygame.draw.line(screen,GOLD,(cx-200,350),(cx+200,350),1)
         if not showing_howto:
             for btn in buttons: btn.draw(screen,btn_font)
-        screen.blit(hint_font.render("v0.2  -  ESC dismisses overlays",True,(100,100,80)),(cx-100,SCREEN_H-40))
+        screen.blit(render_text(hint_font,"v0.2  -  ESC dismisses overlays",(100,100,80)),(cx-100,SCREEN_H-40))
         if showing_howto: draw_how_to_play(screen,fonts)
         pygame.display.flip()
 
 def _new_game():
-    all_keys=[k for k in images if k not in _UNPLAYABLE]
+    all_keys=list(DECK)
     trump_key='ace'+random.choice(['C','D','H','S'])
     return all_keys,trump_key,DurakRules(all_keys,trump_key)
 
@@ -870,15 +804,249 @@ def _queue_take_anims(snap,rules,anim_queue,L,atk_r,def_r):
         sy=(L['o_taken_ay'] if rules.defender=='opponent' else L['p_taken_ay']) if source=='taken' else L['deck_y']
         anim_queue.append({'card':card,'sx':sx,'sy':sy,'ex':ex,'ey':ey,'t':0.0,'delay':delay}); delay+=80
 
+# ── Frame rendering ────────────────────────────────────────────────────────────
+
+def draw_frame(screen,bg,fonts,small_f,tick,rules,trump_key,vs_ai,L,ui):
+    """Draw one run_game frame (no flip).  `ui` holds the loop's transient state."""
+    mx,my=ui['mx'],ui['my']
+    held_card,held_offset,held_from_taken=ui['held_card'],ui['held_offset'],ui['held_from_taken']
+    anim_queue,animating_cards=ui['anim_queue'],ui['animating_cards']
+    discard_pile,discard_anims=ui['discard_pile'],ui['discard_anims']
+    reverse_flash,reverse_flash_timer=ui['reverse_flash'],ui['reverse_flash_timer']
+    ai_thinking=ui['ai_thinking']; ai_offline=ui.get('ai_offline',False)
+    spacing=L['spacing']; hand_x0=L['hand_x0']; hand_y=L['hand_y']; opp_y=L['opp_y']
+    n_slots=L['n_slots']; field_x0=L['field_x0']; atk_y=L['atk_y']; def_y=L['def_y']
+    end_btn_rect=L['end_btn_rect']; take_btn_rect=L['take_btn_rect']
+    p_taken_ax=L['p_taken_ax']; p_taken_ay=L['p_taken_ay']
+    o_taken_ax=L['o_taken_ax']; o_taken_ay=L['o_taken_ay']; cx=L['cx']
+    draw_game_table(screen,bg,fonts,tick,trump_key,vs_ai=vs_ai)
+
+    # Discard
+    PILE_X=60; PILE_Y=SCREEN_H//2-CARD_H//2-120
+    if discard_pile or discard_anims:
+        screen.blit(render_text(small_f,"DISCARD",GOLD),(PILE_X+CARD_W//2-small_f.size("DISCARD")[0]//2,PILE_Y-24))
+        for idx,card in enumerate(discard_pile[-6:]):
+            off=idx*3; draw_card_image(screen,"back",PILE_X+off,PILE_Y-off)
+        if len(discard_pile)>1:
+            screen.blit(render_text(small_f,str(len(discard_pile)),CREAM),(PILE_X+CARD_W+4,PILE_Y+CARD_H//2-8))
+    for a in discard_anims:
+        if a['delay']>0: continue
+        t=1-pow(1-min(a['t'],1.0),3); ax2=a['sx']+(PILE_X-a['sx'])*t; ay2=a['sy']+(PILE_Y-a['sy'])*t
+        img=card_surf("back")
+        rot=pygame.transform.rotate(img,(1-t)*-25)
+        screen.blit(rot,rot.get_rect(center=(int(ax2)+CARD_W//2,int(ay2)+CARD_H//2)))
+
+    # Table
+    for i,slot in enumerate(rules.table):
+        if slot is None: continue
+        atk_k,def_k=slot; row=i//n_slots; col=i%n_slots
+        sx=field_x0+col*(CARD_W+spacing); cy2=atk_y if row==0 else def_y
+        draw_card_image(screen,atk_k,sx,cy2)
+        if def_k is not None: draw_card_image(screen,def_k,sx+14,cy2+14)
+
+    # Player hand
+    p_legal=set()
+    if rules.phase=='attack' and rules.attacker=='player':    p_legal=rules.valid_attack_cards()
+    elif rules.phase=='defense' and rules.defender=='player':  p_legal=rules.all_defense_cards()
+    for i,card in enumerate(rules.hand):
+        if card in animating_cards or (card==held_card and not held_from_taken): continue
+        sx=hand_x0+i*(CARD_W+spacing); sy=hand_y; is_legal=card in p_legal
+        if pygame.Rect(sx,sy,CARD_W,CARD_H).collidepoint(mx,my) and not held_card and is_legal:
+            sy-=15
+            glow=pygame.Surface((CARD_W+10,CARD_H+10),pygame.SRCALPHA)
+            pygame.draw.rect(glow,(*GOLD,50),(0,0,CARD_W+10,CARD_H+10),border_radius=8)
+            screen.blit(glow,(sx-5,sy-5))
+        screen.blit(card_surf(card,alpha=None if (is_legal or not p_legal) else 120),(sx,sy))
+
+    # Opponent hand
+    o_legal=set()
+    if not vs_ai:
+        if rules.phase=='attack' and rules.attacker=='opponent':   o_legal=rules.valid_attack_cards()
+        elif rules.phase=='defense' and rules.defender=='opponent': o_legal=rules.all_defense_cards()
+    for i,card in enumerate(rules.opp_hand):
+        if card in animating_cards or (card==held_card and not held_from_taken): continue
+        sx=hand_x0+i*(CARD_W+spacing); sy=opp_y
+        if vs_ai:
+            screen.blit(card_surf("back"),(sx,sy))
+        else:
+            is_legal=card in o_legal
+            if pygame.Rect(sx,sy,CARD_W,CARD_H).collidepoint(mx,my) and not held_card and is_legal:
+                sy+=15
+                glow=pygame.Surface((CARD_W+10,CARD_H+10),pygame.SRCALPHA)
+                pygame.draw.rect(glow,(*GOLD,50),(0,0,CARD_W+10,CARD_H+10),border_radius=8)
+                screen.blit(glow,(sx-5,sy-5))
+            screen.blit(card_surf(card,alpha=None if (is_legal or not o_legal) else 120),(sx,sy))
+
+    # Taken piles
+    p_can=((rules.attacker=='player' and rules.phase=='attack') or (rules.defender=='player' and rules.phase=='defense'))
+    o_can=(not vs_ai and ((rules.attacker=='opponent' and rules.phase=='attack') or (rules.defender=='opponent' and rules.phase=='defense')))
+    draw_taken_pile_panel(screen,rules.player_taken,"YOUR",p_taken_ax,p_taken_ay,small_f,mx,my,p_can)
+    if vs_ai and rules.opp_taken:
+        screen.blit(render_text(small_f,f"AI TAKEN ({len(rules.opp_taken)})",(160,100,60)),(o_taken_ax,o_taken_ay-22))
+    else:
+        draw_taken_pile_panel(screen,rules.opp_taken,"OPP",o_taken_ax,o_taken_ay,small_f,mx,my,o_can)
+
+    # Animations
+    for a in anim_queue:
+        if a['delay']>0: continue
+        t=1-pow(1-min(a['t'],1.0),3)
+        ax2=a['sx']+(a['ex']-a['sx'])*t; ay2=a['sy']+(a['ey']-a['sy'])*t
+        if a.get('to_taken',False):
+            sc=1.0-t*0.5; w2,h2=int(CARD_W*sc),int(CARD_H*sc)
+            img=pygame.transform.scale(card_surf(a['card']),(w2,h2))   # size changes every frame: not cached
+            rot=pygame.transform.rotate(img,(1-t)*20)
+            screen.blit(rot,rot.get_rect(center=(int(ax2)+CARD_W//2,int(ay2)+CARD_H//2)))
+        else:
+            key=a['card']
+            if vs_ai and a.get('ey',0)<SCREEN_H//3: key="back"
+            img=card_surf(key)
+            rot=pygame.transform.rotate(img,(1-t)*20)
+            screen.blit(rot,rot.get_rect(center=(int(ax2)+CARD_W//2,int(ay2)+CARD_H//2)))
+
+    # Held
+    if held_card:
+        big=card_surf(held_card,int(CARD_W*1.08),int(CARD_H*1.08))
+        screen.blit(big,(mx-held_offset[0]-5,my-held_offset[1]-5))
+
+    # Status
+    sf=get_font("Palatino Linotype",20,italic=True)
+    ss=render_text(sf,rules.status,GOLD)
+    screen.blit(ss,(cx-ss.get_width()//2,SCREEN_H//2-14))
+
+    if vs_ai and ai_thinking: draw_ai_thinking(screen,ai_offline)
+
+    # End attack button
+    all_beaten=(any(s is not None for s in rules.table) and all(s[1] is not None for s in rules.table if s is not None))
+    can_end=rules.phase=='attack' and bool(rules.table) and all_beaten
+    plr_can_end=can_end and (not vs_ai or rules.attacker=='player')
+    if rules.phase!='game_over':
+        hov=end_btn_rect.collidepoint(mx,my) and plr_can_end
+        bc=GOLD_HOVER if hov else (GOLD if plr_can_end else (70,70,70))
+        tc_=GOLD_HOVER if hov else (CREAM if plr_can_end else (80,80,80))
+        pygame.draw.rect(screen,(50,40,5) if plr_can_end else (30,30,30),end_btn_rect,border_radius=8)
+        pygame.draw.rect(screen,bc,end_btn_rect,2,border_radius=8)
+        lbl=render_text(small_f,"End Attack",tc_); screen.blit(lbl,lbl.get_rect(center=end_btn_rect.center))
+
+    # Take button
+    can_take=rules.phase=='defense' and any(s is not None for s in rules.table)
+    plr_can_take=can_take and (not vs_ai or rules.defender=='player')
+    if rules.phase!='game_over':
+        hov_t=take_btn_rect.collidepoint(mx,my) and plr_can_take
+        tclr=GOLD_HOVER if hov_t else (RED_CARD if plr_can_take else (70,70,70))
+        tbg=(60,10,10) if plr_can_take else (30,30,30)
+        ttxt=CREAM if plr_can_take else (80,80,80)
+        pygame.draw.rect(screen,tbg,take_btn_rect,border_radius=8)
+        pygame.draw.rect(screen,tclr,take_btn_rect,2,border_radius=8)
+        lbl=render_text(small_f,"Take Cards",GOLD_HOVER if hov_t else ttxt)
+        screen.blit(lbl,lbl.get_rect(center=take_btn_rect.center))
+
+    # Reverse flash
+    if reverse_flash:
+        alpha=min(255,int(255*reverse_flash_timer/800)) if reverse_flash_timer<800 else 255
+        rf_s=render_text(get_font("Georgia",32,bold=True),reverse_flash,(255,160,40))
+        rf_s.set_alpha(alpha); screen.blit(rf_s,(cx-rf_s.get_width()//2,SCREEN_H//2-60))
+
+    # Role labels
+    rf2=get_font("Palatino Linotype",17,italic=True)
+    pr=render_text(rf2,"ATTACKER" if rules.attacker=='player' else "DEFENDER",GOLD if rules.attacker=='player' else CREAM)
+    or_=render_text(rf2,"ATTACKER" if rules.attacker=='opponent' else "DEFENDER",GOLD if rules.attacker=='opponent' else CREAM)
+    screen.blit(pr,(MARGIN+10,hand_y+CARD_H//2-10))
+    screen.blit(or_,(MARGIN+10,opp_y+CARD_H//2-10))
+
+    # Game over
+    if rules.phase=='game_over':
+        ov=pygame.Surface((SCREEN_W,SCREEN_H),pygame.SRCALPHA); ov.fill((0,0,0,190)); screen.blit(ov,(0,0))
+        pw,ph=700,220; panel=pygame.Surface((pw,ph),pygame.SRCALPHA)
+        wc=(15,55,15,240) if rules.winner=='player' else (55,15,15,240) if rules.winner=='opponent' else (40,40,10,240)
+        pygame.draw.rect(panel,wc,(0,0,pw,ph),border_radius=16)
+        pygame.draw.rect(panel,GOLD,(0,0,pw,ph),2,border_radius=16)
+        screen.blit(panel,(cx-pw//2,SCREEN_H//2-ph//2))
+        gof=get_font("Georgia",38,bold=True)
+        tc2=(40,200,80) if rules.winner=='player' else (220,60,60) if rules.winner=='opponent' else GOLD
+        msg=render_text(gof,rules.status,tc2)
+        screen.blit(msg,(cx-msg.get_width()//2,SCREEN_H//2-ph//2+30))
+        sub=render_text(small_f,"Click anywhere to play again",CREAM)
+        screen.blit(sub,(cx-sub.get_width()//2,SCREEN_H//2-ph//2+100))
+
+def frame_regions(rules,trump_key,vs_ai,L,ui,tick):
+    """draw_frame's output as Compositor regions {key: (rect, state)}: a change to any state repaints that rect."""
+    mx,my=ui['mx'],ui['my']; held_card=ui['held_card']
+    spacing=L['spacing']; hand_x0=L['hand_x0']; hand_y=L['hand_y']; opp_y=L['opp_y']
+    full=pygame.Rect(0,0,SCREEN_W,SCREEN_H)
+    # Card moves: any change to what sits where repaints everything
+    R={'board':(full,(trump_key,vs_ai,rules.phase,rules.attacker,rules.defender,rules.status,rules.winner,
+                      tuple(tuple(s) if s else None for s in rules.table),tuple(rules.hand),tuple(rules.opp_hand),
+                      tuple(rules.player_taken),tuple(rules.opp_taken),len(ui['discard_pile']),
+                      frozenset(ui['animating_cards']),held_card,ui['held_from_taken']))}
+    for i,(sx,sy,angle) in enumerate(_bg_card_poses(tick)):
+        r=pygame.Rect(0,0,132,132); r.center=(sx,sy); R['bg',i]=(r,angle)
+    # Hover: the hand card under the mouse (with its lift and glow), buttons, taken piles
+    col=(mx-hand_x0)//(CARD_W+spacing)
+    on_card=0<=col and mx<hand_x0+col*(CARD_W+spacing)+CARD_W
+    if not held_card and on_card and hand_y<=my<hand_y+CARD_H and col<len(rules.hand):
+        R['hover_hand']=(pygame.Rect(hand_x0+col*(CARD_W+spacing)-5,hand_y-20,CARD_W+10,CARD_H+25),col)
+    if not vs_ai and not held_card and on_card and opp_y<=my<opp_y+CARD_H and col<len(rules.opp_hand):
+        R['hover_opp']=(pygame.Rect(hand_x0+col*(CARD_W+spacing)-5,opp_y-5,CARD_W+10,CARD_H+25),col)
+    for k in ('end_btn_rect','take_btn_rect'): R[k]=(L[k],L[k].collidepoint(mx,my))
+    for k,pile in (('p_taken',rules.player_taken),('o_taken',rules.opp_taken)):
+        if not pile: continue
+        ax,ay=L[k+'_ax'],L[k+'_ay']; n=min(8,len(pile))
+        R[k]=(pygame.Rect(ax-4,ay-4,18*(n-1)+68,98),tuple(i for i in range(n) if pygame.Rect(ax+i*18,ay,60,90).collidepoint(mx,my)))
+    # Animations, the held card and the timed overlays
+    d=int(math.hypot(CARD_W,CARD_H))+2
+    for name,q in (('anim',ui['anim_queue']),('discard',ui['discard_anims'])):
+        for i,a in enumerate(q):
+            if a['delay']>0: continue
+            t=1-pow(1-min(a['t'],1.0),3)
+            ex,ey=(a['ex'],a['ey']) if name=='anim' else (60,SCREEN_H//2-CARD_H//2-120)
+            r=pygame.Rect(0,0,d,d); r.center=(int(a['sx']+(ex-a['sx'])*t)+CARD_W//2,int(a['sy']+(ey-a['sy'])*t)+CARD_H//2)
+            R[name,i]=(r,(a['card'],t))
+    if held_card:
+        ox,oy=ui['held_offset']
+        R['held']=(pygame.Rect(mx-ox-5,my-oy-5,int(CARD_W*1.08),int(CARD_H*1.08)),held_card)
+    if vs_ai and ui['ai_thinking']:
+        surf,alpha,box=_ai_thinking_text(ui.get('ai_offline',False)); R['ai']=(box,(surf,alpha))
+    if ui['reverse_flash']:
+        timer=ui['reverse_flash_timer']
+        rf_s=render_text(get_font("Georgia",32,bold=True),ui['reverse_flash'],(255,160,40))
+        R['flash']=(rf_s.get_rect(topleft=(L['cx']-rf_s.get_width()//2,SCREEN_H//2-60)),
+                    (rf_s,min(255,int(255*timer/800)) if timer<800 else 255))
+    return R
+
 # ── Main game loop ─────────────────────────────────────────────────────────────
 
+AI_DONE=pygame.USEREVENT+1   # posted by the AI service: req=<request id>, action=<action dict>
+AI_PLAN_STEP_MS=350          # pause before a pile-on reply that a defend_all plan already decided
+_plan_step_ids=itertools.count(-1,-1)   # request ids for those local replies; the service counts up
+
+_ai_svc=None
+def ai_service():
+    """The session's AIService, started on first use."""
+    global _ai_svc
+    if _ai_svc is None:
+        from ai_service import AIService
+        _ai_svc=AIService()
+    return _ai_svc
+
 def run_game(screen,bg,fonts,vs_ai,all_keys,trump_key,rules):
-    from ai_opponent import get_ai_action
+    try:
+        return _run_game(screen,bg,fonts,vs_ai,all_keys,trump_key,rules)
+    finally:
+        # Leaving this game (new game, resolution change, quit): drop its AI requests
+        if _ai_svc is not None: _ai_svc.cancel_all()
 
+def _run_game(screen,bg,fonts,vs_ai,all_keys,trump_key,rules):
+    from ai_opponent import _validate_action, api_breaker
     clock=pygame.time.Clock()
     _,_,btn_font,hint_font,label_font=fonts
-    small_f=pygame.font.SysFont("Palatino Linotype",18)
+    small_f=get_font("Palatino Linotype",18)
     cfg=load_config(); api_key=cfg.get("api_key","").strip() or None
+    # ai_backend: "claude" | "ismcts" | "heuristic"; ai_prompt: "compact" | "full"; see get_ai_action
+    ai_opts=dict(backend=cfg.get("ai_backend","claude"),budget_ms=cfg.get("ismcts_budget_ms",500),
+                 workers=cfg.get("ismcts_workers",0),whole_turn=True,hedge_ms=cfg.get("ai_hedge_ms",1500),
+                 compact=cfg.get("ai_prompt","compact")=="compact",indexed=cfg.get("ai_move_menu",True),
+                 endgame_ms=cfg.get("ai_endgame_ms",250))
+    ai_deadline=cfg.get("ai_deadline_s",15)
 
     tick=0; held_card=None; held_offset=(0,0); held_from_taken=False
 
@@ -905,14 +1073,35 @@ def run_game(screen,bg,fonts,vs_ai,all_keys,trump_key,rules):
     reverse_flash=""; reverse_flash_timer=0
 
     # AI state
-    ai_thinking=False; ai_result=[None]; ai_delay=0
+    ai_thinking=False; ai_req=None; ai_ask_wild=False
+    ai_plan={}; ai_plan_table=frozenset()   # defend_all replies still to come: pile-on key -> defender key
     AI_MIN=600; AI_MAX=1400
-
-    def start_ai(ask_wild=False):
-        nonlocal ai_thinking
-        ai_thinking=True; ai_result[0]=None
-        def worker(): ai_result[0]=get_ai_action(rules,api_key,ask_wild=ask_wild)
-        threading.Thread(target=worker,daemon=True).start()
+    svc=ai_service() if vs_ai else None
+
+    def post_ai_done(req,action): pygame.event.post(pygame.event.Event(AI_DONE,req=req,action=action))
+
+    def planned_defense():
+        # The reply the last defend_all committed to for the attacker's pile-on, if still legal
+        if rules.phase!='defense' or rules.defender!='opponent' or not ai_plan: return None
+        table={k for slot in rules.table if slot for k in slot if k}
+        unbeaten=[slot[0] for slot in rules.table if slot and slot[1] is None]
+        if len(unbeaten)!=1 or not ai_plan_table<=table: return None
+        def_=ai_plan.pop(unbeaten[0],None)
+        if def_ is None: return None
+        return _validate_action({"action":"defend","atk_card":unbeaten[0],"def_card":def_},rules,False)
+
+    def start_ai(ask_wild=False,delay=None):
+        nonlocal ai_thinking,ai_req,ai_ask_wild
+        ai_thinking=True; ai_ask_wild=ask_wild
+        step=None if ask_wild else planned_defense()
+        if step:
+            ai_req=next(_plan_step_ids)
+            pygame.time.set_timer(pygame.event.Event(AI_DONE,req=ai_req,action=step),AI_PLAN_STEP_MS,loops=1)
+            return
+        ai_plan.clear()
+        if delay is None: delay=random.randint(AI_MIN,AI_MAX)
+        ai_req=svc.submit(rules,api_key,post_ai_done,ask_wild=ask_wild,deadline_s=ai_deadline,
+                          min_delay_ms=delay,**ai_opts)
 
     def queue_deal(old_p,old_o):
         delay=0
@@ -925,8 +1114,9 @@ def run_game(screen,bg,fonts,vs_ai,all_keys,trump_key,rules):
 
     queue_deal(0,0)
     if vs_ai and rules.attacker=='opponent':
-        ai_delay=random.randint(AI_MIN,AI_MAX); start_ai()
+        start_ai()
 
+    comp=Compositor()
     running=True
     while running:
         dt=clock.tick(144); tick+=dt
@@ -949,13 +1139,17 @@ def run_game(screen,bg,fonts,vs_ai,all_keys,trump_key,rules):
         mx,my=pygame.mouse.get_pos()
         p_is_atk=(rules.attacker=='player'); o_is_atk=(rules.attacker=='opponent')
 
-        # AI processing
-        if vs_ai and ai_thinking and ai_result[0] is not None:
-            ai_delay-=dt
-            if ai_delay<=0:
+        # AI processing: the service posts each finished move as an AI_DONE event
+        for ai_ev in pygame.event.get(AI_DONE):
+            if vs_ai and ai_thinking and ai_ev.req==ai_req:
                 ai_thinking=False
-                action=ai_result[0]; ai_result[0]=None
+                action=ai_ev.action
                 a_type=action.get("action")
+                if a_type=="defend_all":
+                    # Play the first pair now; keep the rest for the attacker's pile-ons
+                    (atk,def_),*rest=action["pairs"]
+                    ai_plan.clear(); ai_plan.update((a,d) for a,d in rest)
+                    action={"action":"defend","atk_card":atk,"def_card":def_}; a_type="defend"
 
                 if a_type=="choose_suit":
                     rules.resolve_wild(action.get("suit","clubs"))
@@ -967,6 +1161,7 @@ def run_game(screen,bg,fonts,vs_ai,all_keys,trump_key,rules):
                     atk=action.get("atk_card"); def_=action.get("def_card")
                     if atk and def_:
                         res=rules.try_defend(atk,def_)
+                        ai_plan_table=frozenset(k for slot in rules.table if slot for k in slot if k)
                         if res=='ok_reverse':
                             reverse_flash="ROLES REVERSED!"; reverse_flash_timer=2000
                         elif res=='ok_wild':
@@ -985,22 +1180,26 @@ def run_game(screen,bg,fonts,vs_ai,all_keys,trump_key,rules):
                 # Trigger next AI move if needed
                 if rules.phase!='game_over':
                     if rules.pending_wild:
-                        ai_delay=400; start_ai(ask_wild=True)
+                        start_ai(ask_wild=True,delay=400)
                     elif (rules.phase=='attack' and rules.attacker=='opponent') or \
                          (rules.phase=='defense' and rules.defender=='opponent'):
-                        ai_delay=random.randint(AI_MIN,AI_MAX); start_ai()
+                        start_ai()
 
         # Events
         for event in pygame.event.get():
             if event.type==pygame.QUIT: running=False
+            if event.type in (pygame.VIDEOEXPOSE,pygame.WINDOWEXPOSED): comp.invalidate()
 
             if event.type==pygame.KEYDOWN and event.key==pygame.K_ESCAPE:
                 sbg=make_bg(SCREEN_W,SCREEN_H)
                 screen,result,ai_flag=run_main_menu(screen,sbg,fonts,return_on_play=True)
-                bg=make_bg(SCREEN_W,SCREEN_H); rebuild_layout()
+                bg=make_bg(SCREEN_W,SCREEN_H); rebuild_layout(); comp.invalidate()
                 if result=='new_game': return screen,bg,'new_game' if not ai_flag else 'new_ai'
                 if result=='new_ai':   return screen,bg,'new_ai'
                 if result=='resolution_changed': return screen,bg,'resolution_changed'
+                if vs_ai and ai_thinking:
+                    # The menu loop swallowed any AI_DONE posted meanwhile: ask again
+                    svc.cancel(ai_req); start_ai(ask_wild=ai_ask_wild,delay=0)
 
             if event.type==pygame.MOUSEBUTTONDOWN and event.button==1:
                 if rules.phase=='game_over':
@@ -1018,7 +1217,7 @@ def run_game(screen,bg,fonts,vs_ai,all_keys,trump_key,rules):
                         cleared,atk_r,def_r=res
                         _queue_end_attack_anims(snap,rules,anim_queue,discard_anims,L,atk_r,def_r)
                         if vs_ai and rules.attacker=='opponent':
-                            ai_delay=random.randint(AI_MIN,AI_MAX); start_ai()
+                            start_ai()
                     continue
 
                 # TAKE
@@ -1030,7 +1229,7 @@ def run_game(screen,bg,fonts,vs_ai,all_keys,trump_key,rules):
                         _,atk_r,def_r=res
                         _queue_take_anims(snap,rules,anim_queue,L,atk_r,def_r)
                         if vs_ai and rules.attacker=='opponent':
-                            ai_delay=random.randint(AI_MIN,AI_MAX); start_ai()
+                            start_ai()
                     continue
 
                 active_is_player=((rules.attacker=='player') if rules.phase=='attack' else (rules.defender=='player'))
@@ -1073,7 +1272,7 @@ def run_game(screen,bg,fonts,vs_ai,all_keys,trump_key,rules):
                             slot_index=i if hit_top else i+n_slots
                             dropped=rules.try_attack(held_card,slot_index)
                             if dropped and vs_ai and rules.defender=='opponent':
-                                ai_delay=random.randint(AI_MIN,AI_MAX); start_ai()
+                                start_ai()
                         elif rules.phase=='defense':
                             hit_top=pygame.Rect(slot_x,atk_y,CARD_W,CARD_H).collidepoint(mx,my)
                             hit_bot=pygame.Rect(slot_x,def_y,CARD_W,CARD_H).collidepoint(mx,my)
@@ -1089,176 +1288,30 @@ def run_game(screen,bg,fonts,vs_ai,all_keys,trump_key,rules):
                                 res=rules.try_defend(target_atk,held_card)
                                 dropped=bool(res)
                                 if res=='ok_wild':
-                                    new_suit=run_suit_picker(screen,fonts)
+                                    new_suit=run_suit_picker(screen,fonts); comp.invalidate()
                                     rules.resolve_wild(new_suit); trump_key=rules.trump_key
                                     if vs_ai and rules.attacker=='opponent':
-                                        ai_delay=random.randint(AI_MIN,AI_MAX); start_ai()
+                                        start_ai()
                                 elif res=='ok_reverse':
                                     reverse_flash="ROLES REVERSED!"; reverse_flash_timer=2000
                                     if vs_ai and rules.attacker=='opponent':
-                                        ai_delay=random.randint(AI_MIN,AI_MAX); start_ai()
+                                        start_ai()
                                 elif dropped and vs_ai:
                                     if (rules.phase=='attack' and rules.attacker=='opponent') or \
                                        (rules.phase=='defense' and rules.defender=='opponent'):
-                                        ai_delay=random.randint(AI_MIN,AI_MAX); start_ai()
+                                        start_ai()
                         if dropped: break
                     held_card=None; held_from_taken=False
 
         # ── DRAW ──────────────────────────────────────────────────────────────
-        draw_game_table(screen,bg,fonts,tick,trump_key,vs_ai=vs_ai)
-
-        # Discard
-        PILE_X=60; PILE_Y=SCREEN_H//2-CARD_H//2-120
-        if discard_pile or discard_anims:
-            screen.blit(small_f.render("DISCARD",True,GOLD),(PILE_X+CARD_W//2-small_f.size("DISCARD")[0]//2,PILE_Y-24))
-            for idx,card in enumerate(discard_pile[-6:]):
-                off=idx*3; draw_card_image(screen,"back",PILE_X+off,PILE_Y-off)
-            if len(discard_pile)>1:
-                screen.blit(small_f.render(str(len(discard_pile)),True,CREAM),(PILE_X+CARD_W+4,PILE_Y+CARD_H//2-8))
-        for a in discard_anims:
-            if a['delay']>0: continue
-            t=1-pow(1-min(a['t'],1.0),3); ax2=a['sx']+(PILE_X-a['sx'])*t; ay2=a['sy']+(PILE_Y-a['sy'])*t
-            img=pygame.transform.scale(images["back"],(CARD_W,CARD_H))
-            rot=pygame.transform.rotate(img,(1-t)*-25)
-            screen.blit(rot,rot.get_rect(center=(int(ax2)+CARD_W//2,int(ay2)+CARD_H//2)))
-
-        # Table
-        for i,slot in enumerate(rules.table):
-            if slot is None: continue
-            atk_k,def_k=slot; row=i//n_slots; col=i%n_slots
-            sx=field_x0+col*(CARD_W+spacing); cy2=atk_y if row==0 else def_y
-            draw_card_image(screen,atk_k,sx,cy2)
-            if def_k is not None: draw_card_image(screen,def_k,sx+14,cy2+14)
-
-        # Player hand
-        p_legal=set()
-        if rules.phase=='attack' and rules.attacker=='player':    p_legal=rules.valid_attack_cards()
-        elif rules.phase=='defense' and rules.defender=='player':  p_legal=rules.all_defense_cards()
-        for i,card in enumerate(rules.hand):
-            if card in animating_cards or (card==held_card and not held_from_taken): continue
-            sx=hand_x0+i*(CARD_W+spacing); sy=hand_y; is_legal=card in p_legal
-            if pygame.Rect(sx,sy,CARD_W,CARD_H).collidepoint(mx,my) and not held_card and is_legal:
-                sy-=15
-                glow=pygame.Surface((CARD_W+10,CARD_H+10),pygame.SRCALPHA)
-                pygame.draw.rect(glow,(*GOLD,50),(0,0,CARD_W+10,CARD_H+10),border_radius=8)
-                screen.blit(glow,(sx-5,sy-5))
-            img=pygame.transform.scale(images[card],(CARD_W,CARD_H))
-            img.set_alpha(255 if (is_legal or not p_legal) else 120)
-            screen.blit(img,(sx,sy))
-
-        # Opponent hand
-        o_legal=set()
-        if not vs_ai:
-            if rules.phase=='attack' and rules.attacker=='opponent':   o_legal=rules.valid_attack_cards()
-            elif rules.phase=='defense' and rules.defender=='opponent': o_legal=rules.all_defense_cards()
-        for i,card in enumerate(rules.opp_hand):
-            if card in animating_cards or (card==held_card and not held_from_taken): continue
-            sx=hand_x0+i*(CARD_W+spacing); sy=opp_y
-            if vs_ai:
-                screen.blit(pygame.transform.scale(images["back"],(CARD_W,CARD_H)),(sx,sy))
-            else:
-                is_legal=card in o_legal
-                if pygame.Rect(sx,sy,CARD_W,CARD_H).collidepoint(mx,my) and not held_card and is_legal:
-                    sy+=15
-                    glow=pygame.Surface((CARD_W+10,CARD_H+10),pygame.SRCALPHA)
-                    pygame.draw.rect(glow,(*GOLD,50),(0,0,CARD_W+10,CARD_H+10),border_radius=8)
-                    screen.blit(glow,(sx-5,sy-5))
-                img=pygame.transform.scale(images[card],(CARD_W,CARD_H))
-                img.set_alpha(255 if (is_legal or not o_legal) else 120)
-                screen.blit(img,(sx,sy))
-
-        # Taken piles
-        p_can=((rules.attacker=='player' and rules.phase=='attack') or (rules.defender=='player' and rules.phase=='defense'))
-        o_can=(not vs_ai and ((rules.attacker=='opponent' and rules.phase=='attack') or (rules.defender=='opponent' and rules.phase=='defense')))
-        draw_taken_pile_panel(screen,rules.player_taken,"YOUR",p_taken_ax,p_taken_ay,small_f,mx,my,p_can)
-        if vs_ai and rules.opp_taken:
-            screen.blit(small_f.render(f"AI TAKEN ({len(rules.opp_taken)})",True,(160,100,60)),(o_taken_ax,o_taken_ay-22))
-        else:
-            draw_taken_pile_panel(screen,rules.opp_taken,"OPP",o_taken_ax,o_taken_ay,small_f,mx,my,o_can)
-
-        # Animations
-        for a in anim_queue:
-            if a['delay']>0: continue
-            t=1-pow(1-min(a['t'],1.0),3)
-            ax2=a['sx']+(a['ex']-a['sx'])*t; ay2=a['sy']+(a['ey']-a['sy'])*t
-            if a.get('to_taken',False):
-                sc=1.0-t*0.5; w2,h2=int(CARD_W*sc),int(CARD_H*sc)
-                img=pygame.transform.scale(images[a['card']],(w2,h2))
-                rot=pygame.transform.rotate(img,(1-t)*20)
-                screen.blit(rot,rot.get_rect(center=(int(ax2)+CARD_W//2,int(ay2)+CARD_H//2)))
-            else:
-                key=a['card']
-                if vs_ai and a.get('ey',0)<SCREEN_H//3: key="back"
-                img=pygame.transform.scale(images[key],(CARD_W,CARD_H))
-                rot=pygame.transform.rotate(img,(1-t)*20)
-                screen.blit(rot,rot.get_rect(center=(int(ax2)+CARD_W//2,int(ay2)+CARD_H//2)))
-
-        # Held
-        if held_card:
-            big=pygame.transform.scale(images[held_card],(int(CARD_W*1.08),int(CARD_H*1.08)))
-            screen.blit(big,(mx-held_offset[0]-5,my-held_offset[1]-5))
-
-        # Status
-        sf=pygame.font.SysFont("Palatino Linotype",20,italic=True)
-        ss=sf.render(rules.status,True,GOLD)
-        screen.blit(ss,(cx-ss.get_width()//2,SCREEN_H//2-14))
-
-        if vs_ai and ai_thinking: draw_ai_thinking(screen)
-
-        # End attack button
-        all_beaten=(any(s is not None for s in rules.table) and all(s[1] is not None for s in rules.table if s is not None))
-        can_end=rules.phase=='attack' and bool(rules.table) and all_beaten
-        plr_can_end=can_end and (not vs_ai or rules.attacker=='player')
-        if rules.phase!='game_over':
-            hov=end_btn_rect.collidepoint(mx,my) and plr_can_end
-            bc=GOLD_HOVER if hov else (GOLD if plr_can_end else (70,70,70))
-            tc_=GOLD_HOVER if hov else (CREAM if plr_can_end else (80,80,80))
-            pygame.draw.rect(screen,(50,40,5) if plr_can_end else (30,30,30),end_btn_rect,border_radius=8)
-            pygame.draw.rect(screen,bc,end_btn_rect,2,border_radius=8)
-            screen.blit(small_f.render("End Attack",True,tc_),small_f.render("End Attack",True,tc_).get_rect(center=end_btn_rect.center))
-
-        # Take button
-        can_take=rules.phase=='defense' and any(s is not None for s in rules.table)
-        plr_can_take=can_take and (not vs_ai or rules.defender=='player')
-        if rules.phase!='game_over':
-            hov_t=take_btn_rect.collidepoint(mx,my) and plr_can_take
-            tclr=GOLD_HOVER if hov_t else (RED_CARD if plr_can_take else (70,70,70))
-            tbg=(60,10,10) if plr_can_take else (30,30,30)
-            ttxt=CREAM if plr_can_take else (80,80,80)
-            pygame.draw.rect(screen,tbg,take_btn_rect,border_radius=8)
-            pygame.draw.rect(screen,tclr,take_btn_rect,2,border_radius=8)
-            lbl=small_f.render("Take Cards",True,GOLD_HOVER if hov_t else ttxt)
-            screen.blit(lbl,lbl.get_rect(center=take_btn_rect.center))
-
-        # Reverse flash
-        if reverse_flash:
-            alpha=min(255,int(255*reverse_flash_timer/800)) if reverse_flash_timer<800 else 255
-            rf_s=pygame.font.SysFont("Georgia",32,bold=True).render(reverse_flash,True,(255,160,40))
-            rf_s.set_alpha(alpha); screen.blit(rf_s,(cx-rf_s.get_width()//2,SCREEN_H//2-60))
-
-        # Role labels
-        rf2=pygame.font.SysFont("Palatino Linotype",17,italic=True)
-        pr=rf2.render("ATTACKER" if rules.attacker=='player' else "DEFENDER",True,GOLD if rules.attacker=='player' else CREAM)
-        or_=rf2.render("ATTACKER" if rules.attacker=='opponent' else "DEFENDER",True,GOLD if rules.attacker=='opponent' else CREAM)
-        screen.blit(pr,(MARGIN+10,hand_y+CARD_H//2-10))
-        screen.blit(or_,(MARGIN+10,opp_y+CARD_H//2-10))
-
-        # Game over
-        if rules.phase=='game_over':
-            ov=pygame.Surface((SCREEN_W,SCREEN_H),pygame.SRCALPHA); ov.fill((0,0,0,190)); screen.blit(ov,(0,0))
-            pw,ph=700,220; panel=pygame.Surface((pw,ph),pygame.SRCALPHA)
-            wc=(15,55,15,240) if rules.winner=='player' else (55,15,15,240) if rules.winner=='opponent' else (40,40,10,240)
-            pygame.draw.rect(panel,wc,(0,0,pw,ph),border_radius=16)
-            pygame.draw.rect(panel,GOLD,(0,0,pw,ph),2,border_radius=16)
-            screen.blit(panel,(cx-pw//2,SCREEN_H//2-ph//2))
-            gof=pygame.font.SysFont("Georgia",38,bold=True)
-            tc2=(40,200,80) if rules.winner=='player' else (220,60,60) if rules.winner=='opponent' else GOLD
-            msg=gof.render(rules.status,True,tc2)
-            screen.blit(msg,(cx-msg.get_width()//2,SCREEN_H//2-ph//2+30))
-            sub=small_f.render("Click anywhere to play again",True,CREAM)
-            screen.blit(sub,(cx-sub.get_width()//2,SCREEN_H//2-ph//2+100))
-
-        pygame.display.flip()
+        # Only what changed since the last frame is repainted; an idle table skips the frame entirely
+        ui=dict(mx=mx,my=my,held_card=held_card,held_offset=held_offset,held_from_taken=held_from_taken,
+                anim_queue=anim_queue,animating_cards=animating_cards,
+                discard_pile=discard_pile,discard_anims=discard_anims,
+                reverse_flash=reverse_flash,reverse_flash_timer=reverse_flash_timer,ai_thinking=ai_thinking,
+                ai_offline=bool(api_key) and ai_opts['backend']=="claude" and api_breaker.state!="closed")
+        comp.present(screen,comp.update(frame_regions(rules,trump_key,vs_ai,L,ui,tick)),
+                     lambda: draw_frame(screen,bg,fonts,small_f,tick,rules,trump_key,vs_ai,L,ui))
 
     return screen,bg,'menu'
 
@@ -1280,6 +1333,16 @@ def main():
     all_keys,trump_key,rules=_new_game()
     while True:
         screen,bg,outcome=run_game(screen,bg,fonts,vs_ai,all_keys,trump_key,rules)
+        from ai_opponent import decision_cache, decision_stats
+        st=decision_cache.stats()
+        if st['hits'] or st['misses']:
+            print(f"[AI] decision cache: {st['hits']} hits / {st['misses']} misses ({st['hit_rate']:.0%}),"
+                  f" ~{st['saved_ms']/1000:.1f}s of API time saved")
+        st=decision_stats.stats()
+        if st['moves']:
+            print(f"[AI] {st['moves']} decisions: p50 {st['p50_ms']:.0f} ms, p90 {st['p90_ms']:.0f} ms,"
+                  f" p99 {st['p99_ms']:.0f} ms; "+", ".join(f"{k} {v:.0%}" for k,v in st['share'].items())
+                  +f"; invalid answers {st['invalid_rate']:.0%}")
         if outcome=='resolution_changed':
             bg=make_bg(SCREEN_W,SCREEN_H); all_keys,trump_key,rules=_new_game()
         elif outcome in ('new_ai','new_game'):
@@ -4,17 +4,35 @@ ai_opponent.py  –  Claude-powered Durak AI for Uno-Urak
 The AI receives a full, structured game-state snapshot and returns one of:
   { "action": "attack",  "card": "<key>",  "slot": <0-5> }
   { "action": "defend",  "atk_card": "<key>",  "def_card": "<key>" }
+  { "action": "defend_all",  "pairs": [["<atk key>", "<def key>"], ...] }
   { "action": "take" }
   { "action": "end_attack" }
   { "action": "choose_suit", "suit": "<clubs|diamonds|hearts|spades>" }
 
+defend_all is a plan for the whole defending round in one decision: the first
+pair covers the unbeaten attack, the others are replies committed in advance
+to cards the attacker may pile on with, which the game plays locally.
+
 All communication is synchronous (called from a worker thread).
 """
 
+import http.client
+import itertools
 import json
-import urllib.request
+import socket
+import ssl
+import threading
+import time
 import urllib.error
+import urllib.parse
 import random
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from cards import (BEATS, CARD_CODES, CARD_ID, CARD_KEYS, CARD_RANK, CARD_SUIT, CARD_SPECIAL,
+                   CARD_SUIT_NAME, CARD_RANK_NAME, CODE_ID, NORMAL, RANKSET_CARDS, REVERSE, SKIP, SUITS,
+                   SUIT_INDEX, WILD, bit_ids, card_id, strength)
+from durak_rules import DurakRules, VisibleState
 
 
 # ── Expert AI system prompt ────────────────────────────────────────────────────
@@ -83,31 +101,64 @@ ENDGAME (deck empty):
 • If opponent has 1 card, attack with your strongest trump to prevent them winning.
 
 ─── OUTPUT FORMAT ─────────────────────────────────────────────────────────────
-Respond with ONLY a single JSON object.  No prose, no markdown, no explanation.
-Choose EXACTLY one of these shapes:
+When the state ends with a numbered list of legal moves, reply with ONLY the
+number of your move (e.g. 3).  Otherwise respond with ONLY a single JSON object.
+No prose, no markdown, no explanation.  JSON replies take EXACTLY one of these shapes:
 
   {"action":"attack",  "card":"<key>", "slot":<0|1|2|3|4|5>}
   {"action":"defend",  "atk_card":"<key>", "def_card":"<key>"}
+  {"action":"defend_all", "pairs":[["<atk key>","<def key>"], ...]}
   {"action":"take"}
   {"action":"end_attack"}
   {"action":"choose_suit", "suit":"<clubs|diamonds|hearts|spades>"}
 
-"key" is the exact image-dictionary key from the game (e.g. "aceH", "skipC",
-"reverseD", "wild", "tenS").  Only output keys that appear in your legal moves.
+defend_all (only when the prompt offers it) plans the whole defending round:
+the first pair covers the unbeaten attack; every further pair is your reply if
+the attacker piles on with that card.  Each defender may appear once.  Leave out
+pile-ons you would rather TAKE against.  It is the one JSON reply still allowed
+next to a numbered move list, when the prompt offers it.
+
+"key" names a card exactly as the state does: the image-dictionary key in the
+full format (e.g. "aceH", "skipC", "reverseD", "wild", "tenS"), or the code in
+the compact format (e.g. "Ah", "Sc", "Rd", "W", "Ts").  Only output cards that
+appear in your legal moves.
+
+─── COMPACT STATE FORMAT ──────────────────────────────────────────────────────
+Cards are codes: rank 6 7 8 9 T J Q K A, then suit c d h s (Th = 10 of hearts).
+Sx / Rx = SKIP / REVERSE of suit x, W = WILD.  "-" means none.
+  trump:<suit> deck:<cards left> you:<attack|defend|pick suit>
+  hand: / taken:   your hand and your taken pile
+  opp:<hand size>/<taken pile size>
+  table: <slot>:<attack>/<defense> ...   occupied slots only, the rest are free
+  attack: your legal attack cards   end:<yes|no> whether end_attack is allowed
+  beat <attack>: the cards you could beat that unbeaten attack with
+  moves: <n>:<move> ...   numbered legal moves, in place of attack: / beat
+         lines: <card> attacks, <attack>><defense> defends, take, end
+         (end_attack), or a suit letter after a WILD
+  pile-ons: <card>:<your beaters> ...   cards the attacker may still add; when
+            this line is present you may answer with defend_all
 """
 
 
 # ── State serialiser ───────────────────────────────────────────────────────────
 
-def build_state_prompt(rules, ask_wild=False):
-    """Convert a DurakRules instance into a readable prompt for the AI."""
+def build_state_prompt(rules, ask_wild=False, whole_turn=False, compact=False, menu=None):
+    """
+    Convert a DurakRules instance into a readable prompt for the AI.
+    whole_turn offers the defend_all round plan in the defense phase.
+    compact writes the short-code format described in _SYSTEM instead.
+    menu (see move_menu) replaces the legal-card lists with that numbered
+    move list, to be answered with a move number.
+    """
+    if compact:
+        return _build_compact_prompt(rules, ask_wild, whole_turn, menu)
 
     def card_info(k):
         """Human-readable card description."""
-        from ai_opponent import _parse_key_local
-        suit, rank = _parse_key_local(k)
-        trump_mark = "★TRUMP" if suit == rules.trump_suit else ""
-        return f"{k}({rank} of {suit}{' ' + trump_mark if trump_mark else ''})"
+        i = CARD_ID[k]
+        suit = CARD_SUIT_NAME[i]
+        trump_mark = " ★TRUMP" if suit == rules.trump_suit else ""
+        return f"{k}({CARD_RANK_NAME[i]} of {suit}{trump_mark})"
 
     ai_hand_desc   = [card_info(k) for k in rules.opp_hand]
     ai_taken_desc  = [card_info(k) for k in rules.opp_taken]
@@ -136,74 +187,152 @@ def build_state_prompt(rules, ask_wild=False):
     ] + [f"  {d}" for d in table_desc]
 
     if ask_wild:
-        lines += [
-            "",
-            "You just played a WILD card.  Choose the new trump suit.",
-            "Return: {\"action\":\"choose_suit\", \"suit\":\"<clubs|diamonds|hearts|spades>\"}",
-        ]
+        lines += ["", "You just played a WILD card.  Choose the new trump suit."]
+        if menu is None:
+            lines.append("Return: {\"action\":\"choose_suit\", \"suit\":\"<clubs|diamonds|hearts|spades>\"}")
     elif rules.phase == 'attack' and rules.attacker == 'opponent':
-        legal = rules.valid_attack_cards()
-        all_beaten = (any(s is not None for s in rules.table) and
-                      all(s[1] is not None for s in rules.table if s is not None))
-        lines += [
-            "",
-            f"LEGAL ATTACK CARDS: {', '.join(legal) if legal else '(none — you must end attack)'}",
-            f"CAN END ATTACK: {'yes' if all_beaten and any(s is not None for s in rules.table) else 'no'}",
-            "",
-            "Choose: attack with a card, or end_attack if all cards are beaten and you want to finish.",
-        ]
+        if menu is None:
+            legal = [CARD_KEYS[i] for i in bit_ids(rules.attack_mask())]
+            all_beaten = (any(s is not None for s in rules.table) and
+                          all(s[1] is not None for s in rules.table if s is not None))
+            lines += [
+                "",
+                f"LEGAL ATTACK CARDS: {', '.join(legal) if legal else '(none — you must end attack)'}",
+                f"CAN END ATTACK: {'yes' if all_beaten and any(s is not None for s in rules.table) else 'no'}",
+                "",
+                "Choose: attack with a card, or end_attack if all cards are beaten and you want to finish.",
+            ]
     elif rules.phase == 'defense' and rules.defender == 'opponent':
-        unbeaten = [(i, s[0]) for i, s in enumerate(rules.table) if s is not None and s[1] is None]
-        def_options = {}
-        for i, atk_k in unbeaten:
-            valid = rules.valid_defense_for(atk_k)
-            def_options[atk_k] = list(valid)
-        lines += [
-            "",
-            "UNBEATEN ATTACKS (you must cover all or TAKE):",
-        ]
-        for atk_k, options in def_options.items():
-            lines.append(f"  {card_info(atk_k)}  →  can beat with: {', '.join(options) if options else '(nothing)' }")
-        lines += [
-            "",
-            "Choose: defend each attack, or take.",
-        ]
-
+        if menu is None:
+            unbeaten = [(i, s[0]) for i, s in enumerate(rules.table) if s is not None and s[1] is None]
+            def_options = {}
+            for i, atk_k in unbeaten:
+                def_options[atk_k] = [CARD_KEYS[d] for d in bit_ids(rules.defense_mask(CARD_ID[atk_k]))]
+            lines += [
+                "",
+                "UNBEATEN ATTACKS (you must cover all or TAKE):",
+            ]
+            for atk_k, options in def_options.items():
+                lines.append(f"  {card_info(atk_k)}  →  can beat with: {', '.join(options) if options else '(nothing)' }")
+            lines += [
+                "",
+                "Choose: defend each attack, or take.",
+            ]
+        if whole_turn:
+            d = rules._def_side()
+            own = rules._hands[d] | rules._taken[d]
+            beats = BEATS[rules._trump]
+            lines += ["", "POSSIBLE PILE-ONS (cards still in play with a rank on the table):"]
+            for c in bit_ids(_pile_on_candidates(rules)):
+                options = [CARD_KEYS[d] for d in bit_ids(beats[c] & own)]
+                lines.append(f"  {card_info(CARD_KEYS[c])}  →  can beat with: {', '.join(options) if options else '(nothing)'}")
+            lines.append("You may answer the whole round at once with defend_all.")
+
+    if menu is not None:
+        lines += ["", "LEGAL MOVES (reply with the number only):"]
+        lines += [f"  {i}. {_describe_move(m)}" for i, m in enumerate(menu)]
     return "\n".join(lines)
 
 
-# ── Local card parser (mirrors game logic, no pygame dependency) ──────────────
+def _describe_move(action):
+    """One entry of the full-format move list."""
+    a = action["action"]
+    if a == "attack":      return f"attack {action['card']} (slot {action['slot']})"
+    if a == "defend":      return f"beat {action['atk_card']} with {action['def_card']}"
+    if a == "choose_suit": return f"trump {action['suit']}"
+    return "end attack" if a == "end_attack" else a
 
-_RANK_NAMES_LOCAL = {
-    'six': '6', 'seven': '7', 'eight': '8', 'nine': '9', 'ten': '10',
-    'jack': 'J', 'queen': 'Q', 'king': 'K', 'ace': 'A'
-}
-_SUIT_SUFFIX_LOCAL = {'C': 'clubs', 'D': 'diamonds', 'H': 'hearts', 'S': 'spades'}
-_SKIP_SUIT_LOCAL   = {'skipC': 'clubs', 'skipD': 'diamonds', 'skipH': 'hearts', 'skipS': 'spades'}
-_REVERSE_SUIT_LOCAL = {'reverseC': 'clubs', 'reverseD': 'diamonds', 'reverseH': 'hearts', 'reverseS': 'spades'}
 
+def _compact_move(action):
+    """One entry of the compact move list."""
+    code = lambda k: CARD_CODES[CARD_ID[k]]
+    a = action["action"]
+    if a == "attack":      return code(action["card"])
+    if a == "defend":      return f"{code(action['atk_card'])}>{code(action['def_card'])}"
+    if a == "choose_suit": return action["suit"][0]
+    return "end" if a == "end_attack" else a
 
-def _parse_key_local(key):
-    if key == 'wild':      return ('wild', 'WILD')
-    if key in _SKIP_SUIT_LOCAL:    return (_SKIP_SUIT_LOCAL[key], 'SKIP')
-    if key in _REVERSE_SUIT_LOCAL: return (_REVERSE_SUIT_LOCAL[key], 'REVERSE')
-    low = key.lower()
-    for name, rank in _RANK_NAMES_LOCAL.items():
-        if low.startswith(name):
-            return _SUIT_SUFFIX_LOCAL[key[len(name):]], rank
-    raise ValueError(f"Cannot parse: {key!r}")
 
+def move_menu(rules, ask_wild=False) -> list:
+    """
+    Every legal action of the side to move as action dicts, in ismcts's
+    legal_moves order: the numbered list a menu prompt offers.  Attacks go
+    to the first free slot, since slots are interchangeable.  As in
+    _validate_action, end_attack is also offered when nothing can attack.
+    """
+    from ismcts import END, SUIT, legal_moves, to_action   # imports this module, so not at the top
+    moves = [(SUIT, s, 0) for s in range(len(SUITS))] if ask_wild else legal_moves(rules)
+    if not moves and rules.phase == 'attack':
+        moves = [(END, 0, 0)]
+    return [to_action(rules, m) for m in moves]
+
+
+def _build_compact_prompt(rules, ask_wild, whole_turn, menu):
+    codes = lambda mask: " ".join(CARD_CODES[i] for i in bit_ids(mask)) or "-"
+    code = lambda i: "-" if i < 0 else CARD_CODES[i]
+    if ask_wild:                  role = "pick suit"
+    elif rules.phase == 'attack': role = "attack" if rules.attacker == 'opponent' else "wait"
+    else:                         role = "defend" if rules.defender == 'opponent' else "wait"
+    table = " ".join(f"{i}:{code(a)}/{code(d)}" for i, (a, d) in enumerate(zip(rules._atk, rules._def)) if a >= 0)
+    lines = [
+        f"trump:{rules.trump_suit[0]} deck:{len(rules._deck)} you:{role}",
+        f"hand: {codes(rules._hands[1])}",
+        f"taken: {codes(rules._taken[1])}",
+        f"opp:{rules._hands[0].bit_count()}/{rules._taken[0].bit_count()}",
+        f"table: {table or '-'}",
+    ]
+    if role == "attack" and menu is None:
+        all_beaten = any(a >= 0 for a in rules._atk) and all(d >= 0 for a, d in zip(rules._atk, rules._def) if a >= 0)
+        lines.append(f"attack: {codes(rules.attack_mask())} end:{'yes' if all_beaten else 'no'}")
+    elif role == "defend":
+        for a, d in zip(rules._atk, rules._def):
+            if a >= 0 and d < 0 and menu is None:
+                lines.append(f"beat {CARD_CODES[a]}: {codes(rules.defense_mask(a))}")
+        if whole_turn:
+            own = rules._hands[1] | rules._taken[1]
+            beats = BEATS[rules._trump]
+            pile_ons = [f"{CARD_CODES[c]}:{','.join(CARD_CODES[d] for d in bit_ids(beats[c] & own)) or '-'}"
+                        for c in bit_ids(_pile_on_candidates(rules))]
+            lines.append(f"pile-ons: {' '.join(pile_ons) or '-'}")
+    if menu is not None:
+        lines.append("moves: " + " ".join(f"{i}:{_compact_move(m)}" for i, m in enumerate(menu)))
+    return "\n".join(lines)
 
-# ── Fallback heuristic AI (used if API unavailable) ───────────────────────────
 
-_RANK_ORDER_LOCAL = ['6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+def _keys_from_codes(action: dict) -> dict:
+    """A reply to a compact prompt with its card codes turned back into keys."""
+    key = lambda c: CARD_KEYS[CODE_ID[c]] if isinstance(c, str) and c in CODE_ID else c
+    action = dict(action)
+    for field in ("card", "atk_card", "def_card"):
+        if field in action: action[field] = key(action[field])
+    if isinstance(action.get("pairs"), list):
+        action["pairs"] = [[key(a) for a in p] if isinstance(p, (list, tuple)) else p for p in action["pairs"]]
+    return action
 
 
+def _pile_on_candidates(rules):
+    """
+    Normal cards the attacker could still pile on with: ranks on the table
+    and not locked, from everything the defender cannot account for (the
+    attacker's hand and taken pile plus the deck; public as a set).
+    """
+    a = rules._atk_side()
+    live = rules._hands[a] | rules._taken[a] | sum(1 << c for c in rules._deck)
+    return live & RANKSET_CARDS[rules._table_ranks & ~rules._locked]
+
+
+# ── Fallback heuristic AI (used if API unavailable) ───────────────────────────
+
 def _rank_strength(key, trump_suit):
-    suit, rank = _parse_key_local(key)
-    if rank in ('SKIP', 'REVERSE', 'WILD'): return 50
-    base = _RANK_ORDER_LOCAL.index(rank)
-    return base + (100 if suit == trump_suit else 0)
+    i = card_id(key)
+    if CARD_SPECIAL[i] != NORMAL: return 50
+    return strength(i, SUIT_INDEX.get(trump_suit, -1))
+
+
+def _id_strength(cid, trump):
+    """_rank_strength on a card ID and trump suit index."""
+    if CARD_SPECIAL[cid] != NORMAL: return 50
+    return strength(cid, trump)
 
 
 def heuristic_action(rules, ask_wild=False):
@@ -211,21 +340,21 @@ def heuristic_action(rules, ask_wild=False):
     Strong rule-based fallback AI.
     Returns the same dict format as the API AI.
     """
-    trump = rules.trump_suit
+    trump = SUIT_INDEX[rules.trump_suit]
 
     if ask_wild:
         # Pick the suit we hold the most of
         from collections import Counter
         c = Counter()
         for k in rules.opp_hand + rules.opp_taken:
-            suit, rank = _parse_key_local(k)
-            if rank not in ('SKIP', 'REVERSE', 'WILD'):
-                c[suit] += 1
-        best = max(c, key=c.get) if c else 'clubs'
+            i = CARD_ID[k]
+            if CARD_SPECIAL[i] == NORMAL:
+                c[CARD_SUIT[i]] += 1
+        best = SUITS[max(c, key=c.get)] if c else 'clubs'
         return {"action": "choose_suit", "suit": best}
 
     if rules.phase == 'attack' and rules.attacker == 'opponent':
-        legal = list(rules.valid_attack_cards())
+        legal = bit_ids(rules.attack_mask())
         if not legal:
             return {"action": "end_attack"}
 
@@ -244,122 +373,702 @@ def heuristic_action(rules, ask_wild=False):
             return {"action": "end_attack"}
 
         # Sort: prefer non-trump, higher rank first (to dump strong non-trump)
-        legal_sorted = sorted(legal, key=lambda k: _rank_strength(k, trump), reverse=True)
+        legal_sorted = sorted(legal, key=lambda i: _id_strength(i, trump), reverse=True)
         # Actually prefer mid-rank non-trump first, save trump
-        non_trump = [k for k in legal_sorted if _parse_key_local(k)[0] != trump]
-        trump_cards = [k for k in legal_sorted if _parse_key_local(k)[0] == trump]
+        non_trump = [i for i in legal_sorted if CARD_SUIT[i] != trump]
+        trump_cards = [i for i in legal_sorted if CARD_SUIT[i] == trump]
         ordered = non_trump + trump_cards
 
         chosen = ordered[0] if ordered else legal_sorted[0]
-        return {"action": "attack", "card": chosen, "slot": empty_slots[0]}
+        return {"action": "attack", "card": CARD_KEYS[chosen], "slot": empty_slots[0]}
 
     elif rules.phase == 'defense' and rules.defender == 'opponent':
         # Find all unbeaten attacks
-        unbeaten = [(i, s[0]) for i, s in enumerate(rules.table) if s is not None and s[1] is None]
+        unbeaten = [s[0] for s in rules.table if s is not None and s[1] is None]
         if not unbeaten:
             return {"action": "end_attack"}
 
         # Try to defend cheaply — pick weakest defender for strongest attack
         # Sort unbeaten by attack strength desc so we plan hardest first
-        unbeaten_sorted = sorted(unbeaten, key=lambda x: _rank_strength(x[1], trump), reverse=True)
+        unbeaten_sorted = sorted(unbeaten, key=lambda k: _id_strength(CARD_ID[k], trump), reverse=True)
 
+        cost = lambda i: _id_strength(i, trump)
         used = set()
         plan = []
-        for _, atk_k in unbeaten_sorted:
-            options = [k for k in rules.valid_defense_for(atk_k) if k not in used]
+        for atk_k in unbeaten_sorted:
+            atk = CARD_ID[atk_k]
+            options = [i for i in bit_ids(rules.defense_mask(atk)) if i not in used]
             if not options:
                 # Cannot defend — must take
                 return {"action": "take"}
             # Cheapest defender (non-trump preferred, lowest rank)
-            non_trump_opts = [k for k in options if _parse_key_local(k)[0] != trump]
-            trump_opts = [k for k in options if _parse_key_local(k)[0] == trump]
+            non_trump_opts = [i for i in options if CARD_SUIT[i] != trump]
+            trump_opts = [i for i in options if CARD_SUIT[i] == trump]
             # Prefer Reverse (role-swap is powerful)
-            reverse_opts = [k for k in options if _parse_key_local(k)[1] == 'REVERSE']
+            reverse_opts = [i for i in options if CARD_SPECIAL[i] == REVERSE]
             if reverse_opts:
-                chosen_def = min(reverse_opts, key=lambda k: _rank_strength(k, trump))
+                chosen_def = min(reverse_opts, key=cost)
             elif non_trump_opts:
-                chosen_def = min(non_trump_opts, key=lambda k: _rank_strength(k, trump))
+                chosen_def = min(non_trump_opts, key=cost)
             elif trump_opts:
                 # Only use trump if attack is also strong or is trump
-                atk_suit, atk_rank = _parse_key_local(atk_k)
-                if _rank_strength(atk_k, trump) >= 5 or atk_suit == trump:
-                    chosen_def = min(trump_opts, key=lambda k: _rank_strength(k, trump))
+                if cost(atk) >= 5 or CARD_SUIT[atk] == trump:
+                    chosen_def = min(trump_opts, key=cost)
                 else:
                     return {"action": "take"}  # Too expensive to use trump on weak card
             else:
                 return {"action": "take"}
-            plan.append((atk_k, chosen_def))
+            plan.append((atk, chosen_def))
             used.add(chosen_def)
 
         # Return first planned defense (game loop will call us again for next)
         if plan:
-            atk_k, def_k = plan[0]
-            return {"action": "defend", "atk_card": atk_k, "def_card": def_k}
+            atk, dfn = plan[0]
+            return {"action": "defend", "atk_card": CARD_KEYS[atk], "def_card": CARD_KEYS[dfn]}
 
     return {"action": "end_attack"}
 
 
 # ── Anthropic API call ─────────────────────────────────────────────────────────
 
-def call_claude_api(api_key: str, state_prompt: str, model: str = "claude-haiku-4-5-20251001") -> dict:
-    """
-    Call the Anthropic messages API synchronously.
-    Returns a parsed action dict, or raises on error.
-    Uses Haiku for speed; falls back to heuristic on any error.
-    """
-    payload = {
-        "model": model,
-        "max_tokens": 256,
-        "system": _SYSTEM,
-        "messages": [{"role": "user", "content": state_prompt}],
-    }
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        "https://api.anthropic.com/v1/messages",
-        data=data,
-        headers={
-            "Content-Type": "application/json",
-            "x-api-key": api_key,
-            "anthropic-version": "2023-06-01",
-        },
-        method="POST",
-    )
-    with urllib.request.urlopen(req, timeout=15) as resp:
-        body = json.loads(resp.read().decode("utf-8"))
+API_URL       = "https://api.anthropic.com/v1/messages"
+API_VERSION   = "2023-06-01"
+DEFAULT_MODEL = "claude-haiku-4-5-20251001"
+
+
+class ReplyParseError(ValueError):
+    """The API answered, but the model's text is not a JSON reply."""
+
 
+def _parse_reply(body: dict):
+    """The reply in a decoded messages API response body: an action dict or a move number."""
     text = ""
     for block in body.get("content", []):
         if block.get("type") == "text":
             text += block["text"]
+    return _parse_text(text)
 
+
+def _parse_text(text: str):
     # Strip any accidental markdown fences
     text = text.strip().lstrip("```json").lstrip("```").rstrip("```").strip()
 
-    return json.loads(text)
+    try:
+        return json.loads(text)
+    except ValueError as e:
+        raise ReplyParseError(f"unparseable reply: {e}") from None
+
+
+class _ObjectScanner:
+    """
+    Finds the first balanced {...} in text that arrives in pieces.  Text
+    before it (a markdown fence, say) is skipped; braces inside JSON
+    strings are not counted.
+    """
+
+    def __init__(self):
+        self._buf = []
+        self._depth = 0
+        self._in_str = self._esc = False
+
+    def feed(self, text: str) -> str | None:
+        """The complete object once its closing brace has been fed, else None."""
+        for ch in text:
+            if not self._depth and ch != "{":
+                continue
+            self._buf.append(ch)
+            if self._in_str:
+                if self._esc: self._esc = False
+                elif ch == "\\": self._esc = True
+                elif ch == '"': self._in_str = False
+            elif ch == '"':
+                self._in_str = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if not self._depth:
+                    return "".join(self._buf)
+        return None
+
+
+def _sse_data(resp):
+    """Decoded `data:` payloads of a server-sent event stream, in order."""
+    for line in resp:
+        if line.startswith(b"data:"):
+            yield json.loads(line[5:])
+
+
+class RequestAborted(ConnectionAbortedError):
+    """A ClaudeClient request cancelled by abort(): the caller gave up, the API did not fail."""
+
+
+class ClaudeClient:
+    """
+    Messages API client meant to live for a whole game session.
+
+    It keeps one HTTP/1.1 keep-alive connection open between moves, so only
+    the first move pays for the TCP + TLS handshake.  A reused connection
+    that the server has dropped is reopened once and the request retried.
+    The request body around the state prompt (model, max_tokens, the
+    system prompt) is encoded once, so each move only serialises its prompt.
+    The system prompt is marked with cache_control so the API can serve it
+    from its prompt cache.  `connects` and `requests` count handshakes and
+    calls; `usage` sums the token counts the API reports, cache reads and
+    writes included.
+
+    With stream=True (the default) decide() asks for a server-sent event
+    stream and returns as soon as the text deltas hold a balanced JSON
+    object.  The rest of that stream is read and discarded before the next
+    request, normally long after it has finished, so the connection is
+    still reused.
+    Safe to share between threads; requests are serialised.  Each request
+    has a ticket, taken by the caller when it queues the call, so that
+    abort(ticket) cancels that request alone, wherever it has got to.
+    """
+
+    def __init__(self, api_key: str, model: str = DEFAULT_MODEL, url: str = API_URL,
+                 timeout: float = 15, context=None, stream: bool = True):
+        parts = urllib.parse.urlsplit(url)
+        self.url = url
+        self._https = parts.scheme == "https"
+        self._host, self._path = parts.netloc, parts.path or "/"
+        self._timeout, self._context = timeout, context
+        self.stream = stream
+        self._headers = {
+            "Content-Type": "application/json",
+            "x-api-key": api_key,
+            "anthropic-version": API_VERSION,
+            "Connection": "keep-alive",
+        }
+        # Same bytes as json.dumps() of the full payload, split around the prompt
+        system = [{"type": "text", "text": _SYSTEM, "cache_control": {"type": "ephemeral"}}]
+        head = json.dumps({"model": model, "max_tokens": 256, "system": system})
+        self._body_head = (head[:-1] + ', "messages": [{"role": "user", "content": ').encode("utf-8")
+        self._body_tail = b"}]}"
+        self._stream_tail = b'}], "stream": true}'
+        self._conn = None
+        self._unread = None          # a stream decide() returned from early
+        self._lock = threading.Lock()
+        self._tickets = itertools.count(1)
+        self._aborted = deque(maxlen=32)   # recently aborted tickets
+        self._running = None               # ticket of the request holding _lock
+        self.connects = 0
+        self.requests = 0
+        self.usage = {"input_tokens": 0, "output_tokens": 0,
+                      "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+
+    def _connect(self):
+        if self._https:
+            conn = http.client.HTTPSConnection(self._host, timeout=self._timeout, context=self._context)
+        else:
+            conn = http.client.HTTPConnection(self._host, timeout=self._timeout)
+        # Published before the handshake, so abort() can shut its socket down
+        self._conn = conn
+        try:
+            if self._https:
+                # wrap_socket would handshake on a socket abort() cannot see yet
+                http.client.HTTPConnection.connect(conn)
+                context = self._context or ssl.create_default_context()
+                conn.sock = context.wrap_socket(conn.sock, server_hostname=conn.host,
+                                                do_handshake_on_connect=False)
+                conn.sock.do_handshake()
+            else:
+                conn.connect()
+        except BaseException:
+            self._conn = None
+            conn.close()
+            raise
+        self.connects += 1
+
+    def close(self):
+        # Finish an early-returned stream first: its message_delta carries the output tokens
+        self._discard()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def ticket(self) -> int:
+        """A new request ticket, for decide(..., ticket=) and abort()."""
+        return next(self._tickets)
+
+    def abort(self, ticket: int):
+        """
+        Cancel request `ticket` from another thread, whether it is still
+        queued, connecting, draining the last stream or waiting on its
+        reply: a socket it is using is shut down, and it raises
+        RequestAborted instead of retrying.
+        """
+        self._aborted.append(ticket)
+        conn = self._conn
+        if self._running == ticket and conn is not None and conn.sock is not None:
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def encode(self, state_prompt: str, stream: bool = False) -> bytes:
+        """Request body for `state_prompt`."""
+        return (self._body_head + json.dumps(state_prompt).encode("utf-8")
+                + (self._stream_tail if stream else self._body_tail))
+
+    def _check(self, ticket):
+        if ticket in self._aborted: raise RequestAborted("request aborted")
+
+    def _exchange(self, body: bytes, read, ticket=None):
+        """
+        POST `body` and return read(resp).  read returns (result, done);
+        done=False leaves the rest of the response to _discard().
+        """
+        if ticket is None: ticket = self.ticket()
+        with self._lock:
+            self._running = ticket
+            try:
+                return self._send(body, read, ticket)
+            finally:
+                self._running = None
+
+    def _send(self, body, read, ticket):
+        # An abort that found no socket to shut down is caught by the _check() calls
+        self._check(ticket)
+        self.requests += 1
+        self._discard()
+        while True:
+            self._check(ticket)
+            fresh = self._conn is None
+            if fresh:
+                try:
+                    self._connect()
+                except BaseException:
+                    if ticket in self._aborted: raise RequestAborted("request aborted") from None
+                    raise
+                self._check(ticket)
+            try:
+                self._conn.request("POST", self._path, body, self._headers)
+                resp = self._conn.getresponse()
+                if resp.status >= 400:
+                    resp.read()
+                    result = done = None
+                else:
+                    result, done = read(resp)
+            except (http.client.HTTPException, ConnectionError, ssl.SSLEOFError):
+                # A kept-alive socket the server already closed: reconnect once
+                self.close()
+                if ticket in self._aborted: raise RequestAborted("request aborted") from None
+                if fresh: raise
+                continue
+            except BaseException:
+                self.close()
+                if ticket in self._aborted: raise RequestAborted("request aborted") from None
+                raise
+            if not done and resp.status < 400:
+                self._unread = resp
+            elif resp.will_close:
+                self.close()
+            if resp.status >= 400:
+                raise urllib.error.HTTPError(self.url, resp.status, resp.reason, resp.headers, None)
+            return result
+
+    def _discard(self):
+        """Read what is left of an early-returned stream, keeping its usage counts."""
+        resp, self._unread = self._unread, None
+        if resp is None:
+            return
+        try:
+            for data in _sse_data(resp):
+                self._add_usage(data.get("usage"))
+        except (OSError, ValueError, http.client.HTTPException):
+            self.close()
+            return
+        if resp.will_close:
+            self.close()
+
+    def _add_usage(self, usage):
+        for k, v in (usage or {}).items():
+            if k in self.usage and isinstance(v, int): self.usage[k] += v
+
+    def _read_action(self, resp):
+        scanner, text = _ObjectScanner(), []
+        for data in _sse_data(resp):
+            kind = data.get("type")
+            if kind == "message_start":
+                # output_tokens here is a placeholder; message_delta carries the total
+                self._add_usage(dict(data["message"].get("usage") or {}, output_tokens=0))
+            elif kind == "message_delta":
+                self._add_usage(data.get("usage"))
+            elif kind == "content_block_delta" and data["delta"].get("type") == "text_delta":
+                text.append(data["delta"]["text"])
+                found = scanner.feed(text[-1])
+                if found is not None:
+                    return _parse_text(found), False
+            elif kind == "error":
+                raise ValueError(f"stream error: {data.get('error')}")
+        # No object: a bare move number, only complete once the stream has ended
+        return _parse_text("".join(text)), True
+
+    def post(self, state_prompt: str, ticket: int | None = None) -> dict:
+        """Send one messages request.  Returns the decoded response body; raises on error."""
+        return self._exchange(self.encode(state_prompt),
+                              lambda resp: (json.loads(resp.read().decode("utf-8")), True), ticket)
+
+    def decide(self, state_prompt: str, ticket: int | None = None) -> dict:
+        """Parsed reply to `state_prompt`: an action dict, or a move number."""
+        if self.stream:
+            return self._exchange(self.encode(state_prompt, stream=True), self._read_action, ticket)
+        body = self.post(state_prompt, ticket)
+        self._add_usage(body.get("usage"))
+        return _parse_reply(body)
+
+
+# ── Circuit breaker ────────────────────────────────────────────────────────────
+
+class CircuitOpenError(RuntimeError):
+    """call_claude_api refused: the breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Thread-safe breaker for the API.  "closed": calls go through.  After
+    `threshold` consecutive failures it turns "open" and refuses calls for
+    a backoff that starts at `backoff_s` and doubles (up to `max_backoff_s`)
+    each time it re-opens.  When the backoff has passed it is "half_open":
+    exactly one probe call goes through, and its outcome closes or
+    re-opens the breaker.  `trips` and `refused` count openings and calls
+    turned away.
+    """
+
+    def __init__(self, threshold: int = 3, backoff_s: float = 2.0, max_backoff_s: float = 60.0):
+        self.threshold, self.backoff_s, self.max_backoff_s = threshold, backoff_s, max_backoff_s
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._state = "closed"
+            self.failures = 0          # consecutive
+            self._backoff = self.backoff_s
+            self._retry_at = 0.0
+            self._probing = False
+            self.refused = self.trips = 0
+
+    @property
+    def state(self) -> str:
+        """"closed", "open" or "half_open" (the backoff has passed; the next call probes)."""
+        with self._lock:
+            if self._state == "open" and time.monotonic() >= self._retry_at:
+                return "half_open"
+            return self._state
+
+    def retry_in(self) -> float:
+        """Seconds until the next probe is allowed; 0 unless open."""
+        with self._lock:
+            return max(0.0, self._retry_at - time.monotonic()) if self._state == "open" else 0.0
+
+    def allow(self) -> bool:
+        """May a call go out now?  In half_open, True once until that call reports back."""
+        with self._lock:
+            if self._state == "open" and time.monotonic() >= self._retry_at:
+                self._state, self._probing = "half_open", False
+            if self._state == "closed" or (self._state == "half_open" and not self._probing):
+                self._probing = self._state == "half_open"
+                return True
+            self.refused += 1
+            return False
+
+    def success(self):
+        with self._lock:
+            self._state, self.failures, self._backoff, self._probing = "closed", 0, self.backoff_s, False
+
+    def cancel(self):
+        """A call that was let through but abandoned: no verdict, so a half_open breaker may probe again."""
+        with self._lock:
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._state == "half_open" or self.failures >= self.threshold:
+                if self._state != "open": self.trips += 1
+                self._state, self._probing = "open", False
+                self._retry_at = time.monotonic() + self._backoff
+                self._backoff = min(self._backoff * 2, self.max_backoff_s)
+
+
+api_breaker = CircuitBreaker()
+
+
+_clients = {}
+
+
+def get_client(api_key: str, model: str = DEFAULT_MODEL) -> ClaudeClient:
+    """The session-wide ClaudeClient for (api_key, model)."""
+    client = _clients.get((api_key, model))
+    if client is None:
+        client = _clients[api_key, model] = ClaudeClient(api_key, model)
+    return client
+
+
+def call_claude_api(api_key: str, state_prompt: str, model: str = DEFAULT_MODEL, ticket: int | None = None) -> dict:
+    """
+    Call the Anthropic messages API synchronously over the shared keep-alive
+    client.  Returns a parsed action dict, or raises on error.
+    Uses Haiku for speed; falls back to heuristic on any error.
+    Guarded by api_breaker: raises CircuitOpenError without calling while
+    it is open.  Transport and HTTP errors and timeouts count as failures;
+    a ReplyParseError still means the backend is up, so it counts as a
+    success and is raised to the caller.  A RequestAborted (the caller
+    gave up on a late reply) counts as neither.
+    """
+    if not api_breaker.allow():
+        raise CircuitOpenError(f"API paused after repeated failures, retry in {api_breaker.retry_in():.0f}s")
+    try:
+        action = get_client(api_key, model).decide(state_prompt, ticket)
+    except ReplyParseError:
+        api_breaker.success()
+        raise
+    except RequestAborted:
+        api_breaker.cancel()
+        raise
+    except Exception:
+        api_breaker.failure()
+        raise
+    api_breaker.success()
+    return action
+
+
+# ── Decision cache ─────────────────────────────────────────────────────────────
+
+class DecisionCache:
+    """
+    Thread-safe LRU of validated API decisions with TTL eviction, keyed by
+    (VisibleState, ask_wild, whole_turn, compact, indexed): everything the
+    prompt is built from.
+    A hit skips the network call entirely.  hits / misses / expired count
+    lookups; api_ms is the summed latency of the calls made on misses, so
+    saved_ms in stats() estimates the waiting time the hits avoided.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float = 600.0):
+        self.maxsize, self.ttl = maxsize, ttl
+        self._entries = OrderedDict()     # key -> (expires_at, action)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.expired = 0
+        self.api_calls, self.api_ms = 0, 0.0
+
+    def get(self, key) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]; self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, key, action: dict):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, dict(action))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def record_call(self, ms: float):
+        with self._lock:
+            self.api_calls += 1; self.api_ms += ms
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            mean_ms = self.api_ms / self.api_calls if self.api_calls else 0.0
+            return {"hits": self.hits, "misses": self.misses, "expired": self.expired,
+                    "size": len(self._entries), "hit_rate": self.hits / lookups if lookups else 0.0,
+                    "api_mean_ms": mean_ms, "saved_ms": self.hits * mean_ms}
+
+
+decision_cache = DecisionCache()
+
+
+# ── Decision latency ───────────────────────────────────────────────────────────
+
+class DecisionStats:
+    """
+    Thread-safe record of how long each get_ai_action call took and which
+    source decided it: "api", "cache", "late" (the API missed the hedge
+    budget), "invalid" (its answer failed validation), "error", "breaker"
+    (api_breaker was open), "endgame", "ismcts" or "heuristic".  Latencies
+    keep the last `window` decisions; `last` is the latest source.
+    invalid_rate is the share of API answers that failed validation.
+    """
+
+    def __init__(self, window: int = 2000):
+        self._ms = deque(maxlen=window)
+        self._sources = {}
+        self._lock = threading.Lock()
+        self.last = None
+
+    def record(self, source: str, ms: float):
+        with self._lock:
+            self._ms.append(ms)
+            self._sources[source] = self._sources.get(source, 0) + 1
+            self.last = source
+
+    def clear(self):
+        with self._lock:
+            self._ms.clear(); self._sources.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            ms, total = sorted(self._ms), sum(self._sources.values())
+            pct = lambda q: ms[min(len(ms) - 1, int(len(ms) * q))] if ms else 0.0
+            invalid = self._sources.get("invalid", 0)
+            answers = invalid + self._sources.get("api", 0)
+            return {"moves": total, "p50_ms": pct(0.50), "p90_ms": pct(0.90), "p99_ms": pct(0.99),
+                    "max_ms": ms[-1] if ms else 0.0, "invalid_rate": invalid / answers if answers else 0.0,
+                    "share": {k: n / total for k, n in sorted(self._sources.items())}}
+
+
+decision_stats = DecisionStats()
+_api_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ai-api")
 
 
 # ── Public entry point ─────────────────────────────────────────────────────────
 
-def get_ai_action(rules, api_key: str | None, ask_wild: bool = False) -> dict:
+def get_ai_action(rules, api_key: str | None, ask_wild: bool = False,
+                  backend: str = "claude", budget_ms: int = 500, workers: int = 0,
+                  whole_turn: bool = False, hedge_ms: int = 1500, compact: bool = True,
+                  indexed: bool = True, endgame_ms: int = 250, ticket: int | None = None) -> dict:
     """
     Main entry point called from the game loop (in a worker thread).
     Returns an action dict.  Never raises — falls back to heuristic on error.
+
+    `rules` may be a VisibleState, or a DurakRules / SeatView to freeze
+    into one for the 'opponent' seat.  Everything below (prompt, cache key,
+    backends, validation) works from that frozen state, on a private game
+    thawed from it, so the caller's live rules are never read again.
+
+    backend "claude" asks the API when api_key is set; "ismcts" runs the
+    local search in ismcts.py with a budget_ms per-move budget over
+    `workers` processes (0 = this thread); "heuristic" uses heuristic_action.
+    whole_turn lets the API answer a defense with a defend_all round plan.
+    compact sends the short-code state format (False: the full one).
+    indexed lists every legal move, numbered (move_menu), and takes a move
+    number as the answer.
+
+    Whatever the backend, once the deck is empty the exact solver in
+    endgame.py gets endgame_ms to find the move first (0 turns it off).
+
+    API calls are hedged: heuristic_action is worked out while the request
+    is in flight, and if no valid answer has arrived hedge_ms after the
+    call began, the heuristic move is played and the request aborted.
+    ticket is a get_client(api_key).ticket() for that request, taken when
+    the caller queued this call, so it can abort(ticket) it (AIService
+    does, at the deadline or on cancel); by default one is taken here.
+    Every decision is recorded in decision_stats.
     """
-    # Always try heuristic first as a sanity reference,
-    # but use the API when a key is provided.
-    if api_key:
+    t0 = time.perf_counter()
+    state = rules if isinstance(rules, VisibleState) else rules.visible_state()
+    source, action = _decide(state, api_key, ask_wild, backend, budget_ms, workers, whole_turn, hedge_ms,
+                             compact, indexed, endgame_ms, ticket)
+    decision_stats.record(source, (time.perf_counter() - t0) * 1000)
+    return action
+
+
+def _decide(state, api_key, ask_wild, backend, budget_ms, workers, whole_turn, hedge_ms, compact, indexed,
+            endgame_ms, ticket):
+    """(source, action) for get_ai_action."""
+    t0 = time.perf_counter()   # the hedge budget covers the endgame solver too
+    rules = DurakRules.from_visible(state)
+    if endgame_ms and not rules._deck:
         try:
-            prompt = build_state_prompt(rules, ask_wild=ask_wild)
-            action = call_claude_api(api_key, prompt)
-            # Validate the returned action makes sense
-            validated = _validate_action(action, rules, ask_wild)
-            if validated:
-                return validated
-            # Fall through to heuristic if validation fails
+            from endgame import endgame_action   # imports this module, so not at the top
+            action = endgame_action(rules, ask_wild=ask_wild, budget_ms=endgame_ms)
+            if action is not None:
+                return "endgame", action
         except Exception as e:
-            print(f"[AI] API error ({type(e).__name__}: {e}), using heuristic.")
+            print(f"[AI] endgame error ({type(e).__name__}: {e}), trying the backend.")
+    if backend == "ismcts":
+        try:
+            from ismcts import ismcts_action   # imports this module, so not at the top
+            return "ismcts", ismcts_action(rules, ask_wild=ask_wild, budget_ms=budget_ms, workers=workers)
+        except Exception as e:
+            print(f"[AI] search error ({type(e).__name__}: {e}), using heuristic.")
+        return "error", heuristic_action(rules, ask_wild=ask_wild)
+    if backend == "heuristic" or not api_key:
+        return "heuristic", heuristic_action(rules, ask_wild=ask_wild)
+
+    try:
+        key = (state, ask_wild, whole_turn, compact, indexed)
+        action = decision_cache.get(key)
+        if action is not None:
+            validated = _validate_action(action, rules, ask_wild)
+            if validated: return "cache", validated
+        if api_breaker.state == "open":
+            return "breaker", heuristic_action(rules, ask_wild=ask_wild)
+        menu = move_menu(rules, ask_wild) if indexed else None
+        prompt = build_state_prompt(rules, ask_wild=ask_wild, whole_turn=whole_turn, compact=compact, menu=menu)
+        t_call = time.perf_counter()
+        client = get_client(api_key)
+        if ticket is None: ticket = client.ticket()
+        call = _api_pool.submit(call_claude_api, api_key, prompt, ticket=ticket)
+    except Exception as e:
+        print(f"[AI] API error ({type(e).__name__}: {e}), using heuristic.")
+        return "error", heuristic_action(rules, ask_wild=ask_wild)
+
+    # The hedge: ready by the time the budget could run out
+    fallback = heuristic_action(rules, ask_wild=ask_wild)
+    try:
+        action = call.result(timeout=max(0.0, hedge_ms / 1000 - (time.perf_counter() - t0)))
+    except FutureTimeout:
+        # Abandon the late reply; aborting frees the shared connection for the next
+        # move.  A slow reply is not an outage, so api_breaker ignores the aborted call
+        client.abort(ticket)
+        return "late", fallback
+    except CircuitOpenError:
+        return "breaker", fallback
+    except ReplyParseError as e:
+        print(f"[AI] malformed reply ({e}), using heuristic.")
+        return "invalid", fallback
+    except Exception as e:
+        print(f"[AI] API error ({type(e).__name__}: {e}), using heuristic.")
+        return "error", fallback
+    decision_cache.record_call((time.perf_counter() - t_call) * 1000)
+    # Validate the returned action makes sense; a malformed reply is just an invalid one
+    try:
+        validated = _validate_reply(action, rules, ask_wild, menu, compact)
+    except Exception as e:
+        print(f"[AI] malformed reply ({type(e).__name__}: {e}), using heuristic.")
+        validated = None
+    if validated:
+        decision_cache.put(key, validated)
+        return "api", validated
+    return "invalid", fallback
+
+
+def _validate_reply(reply, rules, ask_wild: bool, menu, compact: bool) -> dict | None:
+    """
+    The legal action an API reply stands for, or None.  A move number
+    (bare, or as {"move": n}) only needs a bounds check against `menu`;
+    an action object goes through _validate_action.
+    """
+    if isinstance(reply, dict) and "action" not in reply:
+        reply = reply.get("move")
+    if type(reply) is int:
+        return dict(menu[reply]) if menu and 0 <= reply < len(menu) else None
+    if not isinstance(reply, dict):
+        return None
+    return _validate_action(_keys_from_codes(reply) if compact else reply, rules, ask_wild)
 
-    return heuristic_action(rules, ask_wild=ask_wild)
+
+def _card_id(key):
+    """CARD_ID of a reply field, or None when it is not a known card key."""
+    return CARD_ID.get(key) if isinstance(key, str) else None
 
 
 def _validate_action(action: dict, rules, ask_wild: bool) -> dict | None:
@@ -380,32 +1089,81 @@ def _validate_action(action: dict, rules, ask_wild: bool) -> dict | None:
         if rules.phase == 'attack' and all_beaten:
             return action
         # Also valid if no legal attacks available
-        if rules.phase == 'attack' and not rules.valid_attack_cards():
+        if rules.phase == 'attack' and not rules.attack_mask():
             return action
         return None
 
     if a == "attack":
-        card = action.get("card")
+        card = _card_id(action.get("card"))
         slot = action.get("slot")
-        if card is None or slot is None: return None
-        if card not in rules.valid_attack_cards(): return None
+        if card is None or type(slot) is not int: return None
         if not (0 <= slot <= 5): return None
         if rules.table[slot] is not None: return None
+        if not rules.attack_mask() >> card & 1: return None
         return action
 
     if a == "defend":
-        atk = action.get("atk_card")
-        def_ = action.get("def_card")
-        if atk is None or def_ is None: return None
-        if def_ not in rules.valid_defense_for(atk): return None
+        atk = _card_id(action.get("atk_card"))
+        dfn = _card_id(action.get("def_card"))
+        if atk is None or dfn is None: return None
+        if not rules.defense_mask(atk) >> dfn & 1: return None
         # Make sure atk_card is actually unbeaten on the table
-        found = any(s is not None and s[0] == atk and s[1] is None for s in rules.table)
+        atk_k = CARD_KEYS[atk]
+        found = any(s is not None and s[0] == atk_k and s[1] is None for s in rules.table)
         if not found: return None
         return action
 
+    if a == "defend_all":
+        return _validate_round_plan(action.get("pairs"), rules)
+
     if a == "take":
         if rules.phase == "defense":
             return action
         return None
 
     return None
+
+
+def _validate_round_plan(pairs, rules) -> dict | None:
+    """
+    Validate a defend_all plan as a unit.  The first pair must be a legal
+    defense now.  Each further pair (atk, def) must be a pile-on the
+    attacker could make after the pairs before it (a live card of a rank on
+    the table, or added by those pairs, and not locked by a SKIP), answered
+    by an unused card of ours that beats it.  A REVERSE or WILD defender
+    ends the round or changes trumps, so only the last pair may use one.
+    Returns the normalised action, a plain defend for a one-pair plan, or
+    None.
+    """
+    if not isinstance(pairs, list) or not pairs: return None
+    if not all(isinstance(p, (list, tuple)) and len(p) == 2 for p in pairs): return None
+    first = _validate_action({"action": "defend", "atk_card": pairs[0][0], "def_card": pairs[0][1]}, rules, False)
+    if first is None: return None
+    if len(pairs) == 1: return first
+
+    # A REVERSE or WILD reply ends the round or changes trumps: nothing to plan after it
+    if CARD_SPECIAL[CARD_ID[first["def_card"]]] in (REVERSE, WILD): return None
+    sim = rules.clone()
+    sim.try_defend(first["atk_card"], first["def_card"])
+    a = sim._atk_side()
+    live = sim._hands[a] | sim._taken[a] | sum(1 << c for c in sim._deck)
+    ranks, locked = sim._table_ranks, sim._locked
+    d = sim._def_side()
+    own = sim._hands[d] | sim._taken[d]
+    beats = BEATS[sim._trump]
+    slots = sum(x >= 0 for x in sim._atk)
+    seen = set()
+    for i, (atk_k, def_k) in enumerate(pairs[1:], 2):
+        atk, dfn = _card_id(atk_k), _card_id(def_k)
+        if atk is None or dfn is None or atk in seen: return None
+        if CARD_SPECIAL[dfn] in (REVERSE, WILD) and i < len(pairs): return None
+        if not (live & RANKSET_CARDS[ranks & ~locked]) >> atk & 1: return None
+        if not own >> dfn & 1 or not beats[atk] >> dfn & 1: return None
+        slots += 1
+        if slots > 6: return None
+        seen.add(atk); own &= ~(1 << dfn)
+        ranks |= 1 << CARD_RANK[atk]
+        if CARD_SPECIAL[dfn] == NORMAL: ranks |= 1 << CARD_RANK[dfn]
+        elif CARD_SPECIAL[dfn] == SKIP: locked |= 1 << CARD_RANK[atk]
+    return {"action": "defend_all", "pairs": [[p[0], p[1]] for p in pairs]}
+
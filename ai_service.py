@@ -0,0 +1,133 @@
+"""
+ai_service.py  –  Background asyncio service for AI moves
+
+One event loop on one daemon thread serves every AI request of the
+session.  Each request is an asyncio task that:
+
+  * runs get_ai_action on a VisibleState frozen at submit time, in a
+    small thread pool (the backends block), with at most `max_in_flight`
+    calls at a time
+  * gives up at its deadline, or on an error from the backend, and
+    answers with heuristic_action instead
+  * holds the answer back until `min_delay_ms` has passed, so quick
+    answers still read as "thinking"
+  * reports through on_done(request_id, action); run_game posts that as
+    a pygame event
+
+cancel(request_id) drops a request.  on_done is never called for it, and
+an API call in flight is aborted so that its pool thread is freed at once.
+No pygame dependency.
+"""
+
+import asyncio
+import functools
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ai_opponent import get_ai_action, get_client, heuristic_action
+from durak_rules import DurakRules
+
+
+class AIService:
+    """
+    submit() / cancel() / cancel_all() may be called from any thread.
+    `completed`, `timeouts`, `errors` and `cancelled` count how requests ended.
+    """
+
+    def __init__(self, max_in_flight: int = 2):
+        self.max_in_flight = max_in_flight
+        self.completed = self.timeouts = self.errors = self.cancelled = 0
+        self._ids = itertools.count(1)
+        self._tasks = {}             # request id -> Task; touched only on the loop thread
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="ai-call")
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ai-service", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._ready.set()
+        self._loop.run_forever()
+
+    # ── Public API ──
+
+    def submit(self, rules, api_key, on_done, ask_wild=False, deadline_s=15.0, min_delay_ms=0, **opts) -> int:
+        """
+        Queue an AI move for `rules` (frozen now into the opponent's
+        VisibleState, so the game may go on changing it).  `opts` are passed
+        on to get_ai_action.  Returns the request id that on_done and
+        cancel() use.
+        """
+        req = next(self._ids)
+        abort = None
+        if api_key and opts.get("backend", "claude") == "claude":
+            # The ticket is taken now, so an abort reaches the request even before it starts
+            client = get_client(api_key)
+            opts["ticket"] = client.ticket()
+            abort = functools.partial(client.abort, opts["ticket"])
+        call = functools.partial(get_ai_action, rules.visible_state(), api_key, ask_wild=ask_wild, **opts)
+        self._loop.call_soon_threadsafe(self._start, req, call, on_done, deadline_s, min_delay_ms, abort)
+        return req
+
+    def cancel(self, req: int):
+        self._loop.call_soon_threadsafe(self._cancel, req)
+
+    def cancel_all(self):
+        self._loop.call_soon_threadsafe(self._cancel_all)
+
+    def close(self):
+        self.cancel_all()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # ── Loop side ──
+
+    def _start(self, req, call, on_done, deadline_s, min_delay_ms, abort):
+        self._tasks[req] = self._loop.create_task(
+            self._serve(req, call, on_done, deadline_s, min_delay_ms, abort))
+
+    def _cancel(self, req):
+        task = self._tasks.get(req)
+        if task is not None: task.cancel()
+
+    def _cancel_all(self):
+        for task in self._tasks.values(): task.cancel()
+
+    async def _serve(self, req, call, on_done, deadline_s, min_delay_ms, abort):
+        t0 = time.monotonic()
+        calling = False
+        try:
+            async with self._slots:
+                calling = True
+                left = max(0.0, deadline_s - (time.monotonic() - t0))
+                try:
+                    action = await asyncio.wait_for(self._loop.run_in_executor(self._pool, call), left)
+                except asyncio.TimeoutError:
+                    if abort is not None: abort()
+                    action = heuristic_action(DurakRules.from_visible(call.args[0]),
+                                              ask_wild=call.keywords["ask_wild"])
+                    self.timeouts += 1
+                except Exception as e:
+                    # get_ai_action should never raise; if it does, the game still gets a move
+                    print(f"[AI] service error ({type(e).__name__}: {e}), using heuristic.")
+                    action = heuristic_action(DurakRules.from_visible(call.args[0]),
+                                              ask_wild=call.keywords["ask_wild"])
+                    self.errors += 1
+                calling = False
+            wait = min_delay_ms / 1000 - (time.monotonic() - t0)
+            if wait > 0:
+                await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            if calling and abort is not None: abort()
+            self.cancelled += 1
+            raise
+        finally:
+            self._tasks.pop(req, None)
+        self.completed += 1
+        on_done(req, action)
@@ -0,0 +1,545 @@
+"""
+api_stub.py  –  Local stand-in for the Anthropic messages API
+
+A ThreadingHTTPServer that answers POST /v1/messages with a canned action,
+counting connections (handshakes) and requests.  It speaks HTTP/1.1
+keep-alive, and with tls=True it serves HTTPS from a throwaway self-signed
+certificate (requires the openssl command).  Requests with "stream": true
+get the reply as server-sent events, one text delta per few characters;
+token_ms paces those deltas (and delays a whole-body reply by the same
+total) to stand in for generation time.  latency_ms adds an exponentially
+distributed wait before each reply, a long-tailed network.  While
+fail_status is set (say 401 or 529) every request gets that error instead.
+With answer=careless_answer the reply depends on the prompt: a model that
+knows its cards but not the rules.
+
+  python api_stub.py                     legacy urlopen vs ClaudeClient, 200 moves
+  python api_stub.py --tls --moves 500   the same over HTTPS
+  python api_stub.py --drop-every 10     server drops keep-alive every 10 requests
+  python api_stub.py --cache-games 200   decision-cache hit rate over self-play games
+  python api_stub.py --stream            time-to-action: whole body vs early-closed stream
+  python api_stub.py --hedge-ms 1500     get_ai_action over a slow, long-tailed network
+                                         (a slow stub must not trip the breaker)
+  python api_stub.py --breaker           API calls made while the stub fails, then recovers
+  python api_stub.py --invalid           invalid-answer rate, free-form replies vs move numbers
+                                         (add --api-key to ask the real API instead)
+  python api_stub.py --service-error     AIService still answers when the backend raises
+
+Prompts come from seeded heuristic self-play, so every run sends the same
+bodies.  The numbers are loopback numbers: on a real network each saved
+handshake is also worth one or two round trips.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import ai_opponent
+import ai_service
+from ai_opponent import (_SYSTEM, DEFAULT_MODEL, ClaudeClient, DecisionCache, _parse_reply,
+                         build_state_prompt, get_ai_action, heuristic_action)
+from cards import SUITS
+from durak_rules import DurakRules
+from prompt_tokens import record_states
+from selfplay import apply_action, new_game, seat_view, to_move
+
+
+# ── Stub server ────────────────────────────────────────────────────────────────
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; without this, Nagle plus
+        # the client's delayed ACK stalls every kept-alive response by ~40 ms
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.connections += 1
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionResetError:
+            pass                      # client closed a kept-alive connection, possibly mid-stream
+
+    def do_POST(self):
+        srv = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        request = json.loads(body)
+        srv.requests += 1
+        srv.last_body = body
+        if srv.fail_status:
+            error = {"type": "error", "error": {"type": "stub_error", "message": "failing on purpose"}}
+            self._send_json(srv.fail_status, error)
+            return
+        if srv.latency_ms:
+            time.sleep(random.expovariate(1000 / srv.latency_ms))
+        reply = srv.answer(request["messages"][0]["content"]) if srv.answer else srv.action
+        deltas = _reply_deltas(reply)
+        if request.get("stream"):
+            self._stream(deltas)
+        else:
+            time.sleep(len(deltas) * srv.token_ms / 1000)
+            self._reply("".join(deltas))
+        # Emulate an idle timeout: close without announcing it
+        if srv.drop_every and srv.requests % srv.drop_every == 0:
+            self.close_connection = True
+
+    def _reply(self, text):
+        self._send_json(200, {"content": [{"type": "text", "text": text}],
+                              "usage": {"input_tokens": 900, "output_tokens": 20}})
+
+    def _send_json(self, status, obj):
+        reply = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def _stream(self, deltas):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        events = [("message_start", {"message": {"usage": {"input_tokens": 900, "output_tokens": 1}}}),
+                  ("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})]
+        events += [("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": d}})
+                   for d in deltas]
+        events += [("content_block_stop", {"index": 0}),
+                   ("message_delta", {"delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": 20}}),
+                   ("message_stop", {})]
+        try:
+            for name, data in events:
+                if name == "content_block_delta": time.sleep(self.server.token_ms / 1000)
+                chunk = f"event: {name}\ndata: {json.dumps(dict(data, type=name))}\n\n".encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+def _reply_deltas(reply, size=4):
+    """
+    The model's reply text in small deltas: an action dict fenced as models
+    often do, or a str (a move number, say) as it is.
+    """
+    text = reply if isinstance(reply, str) else "```json\n" + json.dumps(reply) + "\n```"
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _self_signed(tmpdir):
+    cert, key = os.path.join(tmpdir, "cert.pem"), os.path.join(tmpdir, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+                    "-keyout", key, "-out", cert], check=True, capture_output=True)
+    return cert, key
+
+
+class StubServer:
+    """
+    Context manager running the stub on 127.0.0.1 in a background thread.
+    `url` is the messages endpoint; `client_context` is an SSLContext that
+    trusts the stub's certificate (None without tls).
+    """
+
+    def __init__(self, action=None, tls=False, drop_every=0, token_ms=0.0, latency_ms=0.0, fail_status=0,
+                 answer=None):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.action = action or {"action": "take"}
+        self.httpd.answer = answer
+        self.httpd.drop_every = drop_every
+        self.httpd.token_ms = token_ms
+        self.httpd.latency_ms = latency_ms
+        self.httpd.fail_status = fail_status
+        self.httpd.connections = self.httpd.requests = 0
+        self.httpd.last_body = b""
+        self.client_context = None
+        self._tmpdir = None
+        if tls:
+            self._tmpdir = tempfile.mkdtemp()
+            cert, key = _self_signed(self._tmpdir)
+            server_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            server_ctx.load_cert_chain(cert, key)
+            self.httpd.socket = server_ctx.wrap_socket(self.httpd.socket, server_side=True)
+            self.client_context = ssl.create_default_context(cafile=cert)
+        scheme = "https" if tls else "http"
+        self.url = f"{scheme}://127.0.0.1:{self.httpd.server_address[1]}/v1/messages"
+
+    @property
+    def connections(self): return self.httpd.connections
+
+    @property
+    def requests(self): return self.httpd.requests
+
+    def fail(self, status=529):
+        """Answer every request with `status` from now on; 0 recovers."""
+        self.httpd.fail_status = status
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._tmpdir: shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+
+# ── Clients under test ─────────────────────────────────────────────────────────
+
+def legacy_call(url, api_key, state_prompt, context=None, model="claude-haiku-4-5-20251001"):
+    """call_claude_api as it was: a fresh payload, Request and connection per move."""
+    payload = {
+        "model": model,
+        "max_tokens": 256,
+        "system": _SYSTEM,
+        "messages": [{"role": "user", "content": state_prompt}],
+    }
+    data = json.dumps(payload).encode("utf-8")
+    req = urllib.request.Request(url, data=data, headers={
+        "Content-Type": "application/json",
+        "x-api-key": api_key,
+        "anthropic-version": "2023-06-01",
+    }, method="POST")
+    with urllib.request.urlopen(req, timeout=15, context=context) as resp:
+        return _parse_reply(json.loads(resp.read().decode("utf-8")))
+
+
+def sample_prompts(n, seed=0):
+    """n state prompts from seeded heuristic self-play."""
+    prompts = []
+    while len(prompts) < n:
+        rules = new_game(seed); seed += 1
+        while len(prompts) < n and to_move(rules) is not None:
+            view = seat_view(rules, to_move(rules))
+            prompts.append(build_state_prompt(view))
+            if not apply_action(rules, heuristic_action(view)): break
+    return prompts
+
+
+# ── Measurement ────────────────────────────────────────────────────────────────
+
+def _stats(times):
+    times = sorted(times)
+    return {'mean_ms': sum(times) / len(times), 'p50_ms': times[len(times) // 2],
+            'p99_ms': times[min(len(times) - 1, int(len(times) * 0.99))]}
+
+
+def measure(moves=200, tls=False, drop_every=0):
+    prompts = sample_prompts(moves)
+    results = {}
+    for name in ('legacy', 'client'):
+        with StubServer(tls=tls, drop_every=drop_every) as stub:
+            client = ClaudeClient("stub-key", url=stub.url, context=stub.client_context, stream=False)
+            call = (lambda p: legacy_call(stub.url, "stub-key", p, stub.client_context)) \
+                if name == 'legacy' else client.decide
+            times = []
+            for p in prompts:
+                t0 = time.perf_counter()
+                assert call(p) == {"action": "take"}
+                times.append((time.perf_counter() - t0) * 1000)
+            client.close()
+            results[name] = dict(_stats(times), connections=stub.connections, requests=stub.requests)
+
+    # Body encoding alone: full json.dumps vs the pre-encoded pieces
+    client = ClaudeClient("stub-key")
+    legacy_body = lambda p: json.dumps({"model": "claude-haiku-4-5-20251001", "max_tokens": 256, "system": _SYSTEM,
+                                        "messages": [{"role": "user", "content": p}]}).encode("utf-8")
+    system = [{"type": "text", "text": _SYSTEM, "cache_control": {"type": "ephemeral"}}]
+    assert all(json.loads(client.encode(p)) == dict(json.loads(legacy_body(p)), system=system) for p in prompts)
+    for name, enc in (('legacy', legacy_body), ('client', client.encode)):
+        t0 = time.perf_counter()
+        for p in prompts: enc(p)
+        results[name]['encode_us'] = (time.perf_counter() - t0) / len(prompts) * 1e6
+    return results
+
+
+def stream_compare(moves=50, token_ms=15.0, action=None):
+    """
+    Time-to-action for whole-body replies vs streamed replies that return
+    at the closing brace, with the stub generating a delta every token_ms.
+    """
+    action = action or {"action": "defend", "atk_card": "sixH", "def_card": "nineH"}
+    prompts = sample_prompts(moves)
+    results = {}
+    with StubServer(action=action, token_ms=token_ms) as stub:
+        for name, stream in (('body', False), ('stream', True)):
+            client = ClaudeClient("stub-key", url=stub.url, stream=stream)
+            before = stub.connections
+            times = []
+            for p in prompts:
+                t0 = time.perf_counter()
+                assert client.decide(p) == action
+                times.append((time.perf_counter() - t0) * 1000)
+                time.sleep(len(_reply_deltas(action)) * token_ms / 1000)   # the player's turn
+            client.close()
+            results[name] = dict(_stats(times), connections=stub.connections - before,
+                                 output_tokens=client.usage["output_tokens"])
+    return results
+
+
+def defense_positions(n, seed=0):
+    """
+    n frozen views of the opponent's defense turns in seeded heuristic games:
+    positions where the stub's "take" is always legal.
+    """
+    positions, g = [], seed
+    while len(positions) < n:
+        rules = new_game(g); g += 1
+        for _ in range(500):
+            if len(positions) >= n or to_move(rules) is None: break
+            if to_move(rules) == 'opponent' and rules.phase == 'defense':
+                positions.append(rules.visible_state())
+            view = seat_view(rules, to_move(rules))
+            if not apply_action(rules, heuristic_action(view)): break
+    return positions
+
+
+class _StubKey:
+    """get_ai_action(..., "stub-key") talks to `stub` while this is active; AI stats start from zero."""
+
+    def __init__(self, stub):
+        self.key = ("stub-key", DEFAULT_MODEL)
+        self.client = ClaudeClient("stub-key", url=stub.url)
+
+    def __enter__(self):
+        ai_opponent.decision_stats.clear()
+        ai_opponent.decision_cache.clear()
+        ai_opponent._clients[self.key] = self.client
+        return self
+
+    def __exit__(self, *exc):
+        ai_opponent._clients.pop(self.key, None)
+        self.client.close()
+
+
+def hedge_replay(moves=200, hedge_ms=1500, latency_ms=600.0, seed=0):
+    """
+    decision_stats for get_ai_action on `moves` defense turns, with the
+    stub adding `latency_ms` mean latency, plus how often a fresh
+    api_breaker tripped: a slow but healthy stub should never trip it.
+    """
+    random.seed(seed)
+    saved, ai_opponent.api_breaker = ai_opponent.api_breaker, ai_opponent.CircuitBreaker()
+    try:
+        with StubServer(latency_ms=latency_ms) as stub, _StubKey(stub):
+            for rules in defense_positions(moves, seed):
+                get_ai_action(rules, "stub-key", hedge_ms=hedge_ms)
+        breaker = ai_opponent.api_breaker
+        return dict(ai_opponent.decision_stats.stats(), breaker=breaker.state,
+                    trips=breaker.trips, refused=breaker.refused)
+    finally:
+        ai_opponent.api_breaker = saved
+
+
+def breaker_replay(moves=40, fail_moves=20, move_ms=100, backoff_s=0.25):
+    """
+    get_ai_action on defense turns, one every move_ms, against a stub that
+    fails the first `fail_moves` of them and then recovers.  Returns a
+    (breaker state, requests the stub has seen, source) row per move.
+    """
+    saved, ai_opponent.api_breaker = ai_opponent.api_breaker, ai_opponent.CircuitBreaker(backoff_s=backoff_s)
+    rows = []
+    try:
+        with StubServer(fail_status=529) as stub, _StubKey(stub):
+            for i, rules in enumerate(defense_positions(moves)):
+                if i == fail_moves: stub.fail(0)
+                get_ai_action(rules, "stub-key")
+                rows.append((ai_opponent.api_breaker.state, stub.requests, ai_opponent.decision_stats.last))
+                time.sleep(move_ms / 1000)
+    finally:
+        ai_opponent.api_breaker = saved
+    return rows
+
+
+def careless_answer(prompt, rng=random):
+    """
+    Reply to a compact prompt like a model that knows its cards but not the
+    rules: a uniform pick among the listed move numbers when there is a
+    move list, else among its hand and taken cards plus take / end_attack,
+    played on the first unbeaten attack or the first free slot.
+    """
+    fields = dict(line.split(":", 1) for line in prompt.splitlines())
+    if "moves" in fields:
+        return str(rng.randrange(len(fields["moves"].split())))
+    role = fields["trump"].split("you:")[1]
+    if role == "pick suit":
+        return {"action": "choose_suit", "suit": rng.choice(SUITS)}
+    cards = [c for c in (fields["hand"] + " " + fields["taken"]).split() if c != "-"]
+    table = [slot.split(":") for slot in fields["table"].split() if slot != "-"]
+    if role == "attack":
+        pick = rng.choice(cards + ["end_attack"])
+        if pick == "end_attack": return {"action": pick}
+        used = {int(i) for i, _ in table}
+        return {"action": "attack", "card": pick, "slot": min(set(range(6)) - used)}
+    pick = rng.choice(cards + ["take"])
+    if pick == "take": return {"action": pick}
+    unbeaten = [pair.split("/")[0] for _, pair in table if pair.endswith("/-")]
+    return {"action": "defend", "atk_card": unbeaten[0] if unbeaten else "-", "def_card": pick}
+
+
+def invalid_replay(games=10, seed=0, api_key=None):
+    """
+    decision_stats for get_ai_action on every decision of `games` seeded
+    heuristic games (prompt_tokens's corpus), with free-form replies (indexed=False) and with
+    a numbered move menu (indexed=True).  The careless_answer stub answers
+    unless `api_key` is given.
+    """
+    states = record_states(games, seed)
+    results = {}
+    for indexed in (False, True):
+        random.seed(seed)
+        if api_key:
+            ai_opponent.decision_stats.clear(); ai_opponent.decision_cache.clear()
+            for state, ask_wild in states:
+                get_ai_action(state, api_key, ask_wild=ask_wild, indexed=indexed, hedge_ms=15000)
+        else:
+            with StubServer(answer=careless_answer) as stub, _StubKey(stub):
+                for state, ask_wild in states:
+                    get_ai_action(state, "stub-key", ask_wild=ask_wild, indexed=indexed)
+        results["menu" if indexed else "free-form"] = ai_opponent.decision_stats.stats()
+    return results
+
+
+def service_error_replay(moves=5):
+    """
+    Submit `moves` requests to an AIService whose get_ai_action raises
+    RuntimeError.  Returns (answers, service): answers maps request id to
+    the action on_done delivered; every request should have one.
+    """
+    def broken(*args, **kwargs):
+        raise RuntimeError("stub backend failure")
+
+    answers, done = {}, threading.Event()
+    def on_done(req, action):
+        answers[req] = action
+        if len(answers) == moves: done.set()
+
+    saved, ai_service.get_ai_action = ai_service.get_ai_action, broken
+    svc = ai_service.AIService()
+    try:
+        for state in defense_positions(moves):
+            svc.submit(DurakRules.from_visible(state), None, on_done, deadline_s=5.0)
+        done.wait(10)
+    finally:
+        ai_service.get_ai_action = saved
+        svc.close()
+    return answers, svc
+
+
+def cache_replay(games=200, seed=0, ttl=600.0):
+    """
+    Decision-cache statistics for the opponent's turns in `games` seeded
+    heuristic games, with misses answered by ClaudeClient through the stub.
+    """
+    cache = DecisionCache(ttl=ttl)
+    with StubServer() as stub:
+        client = ClaudeClient("stub-key", url=stub.url)
+        for g in range(seed, seed + games):
+            rules = new_game(g)
+            for _ in range(500):              # play_game's cap: some games cycle
+                if to_move(rules) is None: break
+                view = seat_view(rules, to_move(rules))
+                if to_move(rules) == 'opponent':
+                    state = view.visible_state()
+                    key = (state, False, False)
+                    if cache.get(key) is None:
+                        t0 = time.perf_counter()
+                        cache.put(key, client.decide(build_state_prompt(DurakRules.from_visible(state))))
+                        cache.record_call((time.perf_counter() - t0) * 1000)
+                if not apply_action(rules, heuristic_action(view)): break
+        client.close()
+    return cache.stats()
+
+
+def main(argv):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--moves", type=int, default=200)
+    ap.add_argument("--tls", action="store_true", help="serve HTTPS (needs openssl)")
+    ap.add_argument("--drop-every", type=int, default=0, help="server closes keep-alive after every N requests")
+    ap.add_argument("--cache-games", type=int, default=0, help="report decision-cache hits over N games instead")
+    ap.add_argument("--stream", action="store_true", help="compare time-to-action with and without streaming")
+    ap.add_argument("--token-ms", type=float, default=15.0, help="stub generation time per text delta (--stream)")
+    ap.add_argument("--hedge-ms", type=int, default=0, help="report get_ai_action latency with this hedge budget")
+    ap.add_argument("--latency-ms", type=float, default=600.0, help="mean stub latency (--hedge-ms)")
+    ap.add_argument("--breaker", action="store_true", help="show the circuit breaker against a failing stub")
+    ap.add_argument("--invalid", type=int, nargs="?", const=10, default=0, metavar="GAMES",
+                    help="invalid-answer rate with and without the move menu over GAMES games")
+    ap.add_argument("--api-key", help="--invalid against the real API instead of the stub")
+    ap.add_argument("--service-error", action="store_true", help="check AIService answers when get_ai_action raises")
+    args = ap.parse_args(argv)
+    if args.service_error:
+        moves = min(args.moves, 20)
+        answers, svc = service_error_replay(moves)
+        ok = len(answers) == moves and all(a.get("action") for a in answers.values())
+        print(f"AIService with a backend raising RuntimeError, {moves} requests")
+        print(f"  answered {len(answers)}/{moves}  errors {svc.errors}  timeouts {svc.timeouts}"
+              f"  -> {'ok' if ok else 'FAILED'}")
+        return 0 if ok else 1
+    if args.invalid:
+        results = invalid_replay(args.invalid, api_key=args.api_key)
+        print(f"decisions over {args.invalid} games, answered by "
+              + ("the API" if args.api_key else "the careless stub model"))
+        for name, st in results.items():
+            print(f"  {name:<10} {st['moves']:>5} moves  invalid {st['invalid_rate']:6.1%}  "
+                  + ", ".join(f"{k} {v:.0%}" for k, v in st['share'].items()))
+        return
+    if args.breaker:
+        fail_moves = args.moves // 2
+        rows = breaker_replay(args.moves, fail_moves)
+        print(f"{args.moves} moves 100 ms apart; the stub answers 529 for the first {fail_moves}")
+        print(f"  {'move':>4}  {'breaker':<9} {'requests':>8}  decided by")
+        for i, (state, requests, source) in enumerate(rows):
+            print(f"  {i:>4}  {state:<9} {requests:>8}  {source}")
+        return
+    if args.hedge_ms:
+        st = hedge_replay(args.moves, args.hedge_ms, args.latency_ms)
+        print(f"get_ai_action, {st['moves']} moves, hedge {args.hedge_ms} ms, mean stub latency {args.latency_ms:g} ms")
+        print(f"  p50 {st['p50_ms']:.0f} ms  p90 {st['p90_ms']:.0f} ms  p99 {st['p99_ms']:.0f} ms"
+              f"  max {st['max_ms']:.0f} ms")
+        print("  decided by: " + ", ".join(f"{k} {v:.0%}" for k, v in st['share'].items()))
+        print(f"  breaker {st['breaker']}, {st['trips']} trips, {st['refused']} calls refused")
+        return
+    if args.stream:
+        results = stream_compare(args.moves, args.token_ms)
+        print(f"time-to-action, {args.moves} moves, {args.token_ms:g} ms per text delta")
+        print(f"  {'':8} {'handshakes':>10} {'mean ms':>9} {'p50 ms':>8} {'p99 ms':>8} {'out tokens':>10}")
+        for name, r in results.items():
+            print(f"  {name:<8} {r['connections']:>10} {r['mean_ms']:>9.2f} {r['p50_ms']:>8.2f}"
+                  f" {r['p99_ms']:>8.2f} {r['output_tokens']:>10}")
+        return
+    if args.cache_games:
+        st = cache_replay(args.cache_games)
+        print(f"decision cache over {args.cache_games} games (opponent turns)")
+        print(f"  hits {st['hits']}  misses {st['misses']}  hit rate {st['hit_rate']:.1%}"
+              f"  entries {st['size']}  saved {st['saved_ms']:.0f} ms at {st['api_mean_ms']:.2f} ms/call")
+        return
+    if args.tls and not shutil.which("openssl"):
+        ap.error("--tls needs the openssl command")
+    results = measure(args.moves, args.tls, args.drop_every)
+    print(f"{'HTTPS' if args.tls else 'HTTP'} stub, {args.moves} moves"
+          + (f", keep-alive dropped every {args.drop_every} requests" if args.drop_every else ""))
+    print(f"  {'':8} {'handshakes':>10} {'mean ms':>9} {'p50 ms':>8} {'p99 ms':>8} {'encode µs':>10}")
+    for name, r in results.items():
+        print(f"  {name:<8} {r['connections']:>10} {r['mean_ms']:>9.2f} {r['p50_ms']:>8.2f}"
+              f" {r['p99_ms']:>8.2f} {r['encode_us']:>10.1f}")
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,348 @@
+"""
+batch_sim.py  –  NumPy lockstep simulator for Uno-Urak
+
+Holds N DurakRules games as arrays and advances all of them one decision
+per step, with heuristic_action (ai_opponent.py) playing both seats as
+array operations.  Finished games are masked out.  The semantics follow
+DurakRules exactly, including SKIP rank locks, REVERSE role swaps, WILD
+trump changes and the FIFO taken-pile refill order of _refill_hand, so
+results match selfplay.play_game on the same deals:
+
+  python batch_sim.py 10000          simulate 10000 seeded games
+  python batch_sim.py --check 500    compare against selfplay.play_game
+
+Games whose mover has no legal action (an empty table and only special
+cards to attack with) end as STALLED, where play_game reports 'stalled'.
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from cards import (BEATS, CARD_RANK, CARD_SPECIAL, CARD_SUIT, N_CARDS, NORMAL, NORMAL_MASK,
+                   RANKSET_CARDS, REVERSE, SKIP, SUIT_INDEX, SUIT_MASK, SUITS, WILD)
+from selfplay import new_game
+
+
+# Phases and outcomes
+ATTACK, DEFENSE, OVER = 0, 1, 2
+PLAYER, OPPONENT, DRAW, STALLED = 0, 1, 2, 3
+OUTCOME_NAMES = ('player', 'opponent', 'draw', 'stalled')
+
+HAND_SIZE = 6
+N_SLOTS   = 6
+DECK_SIZE = N_CARDS - 2 * HAND_SIZE
+
+
+# ── Card tables as arrays ──────────────────────────────────────────────────────
+
+_U1      = np.uint64(1)
+_SHIFTS  = np.arange(N_CARDS, dtype=np.uint64)
+_RANK    = np.array(CARD_RANK, dtype=np.int64)
+_SUIT    = np.array(CARD_SUIT, dtype=np.int64)
+_SPECIAL = np.array(CARD_SPECIAL, dtype=np.int64)
+_BEATS   = np.array(BEATS, dtype=np.uint64)                          # [trump, atk]
+_RANKSET = np.array(RANKSET_CARDS, dtype=np.uint64)
+_SUITM   = np.array(SUIT_MASK, dtype=np.uint64)
+_NORMAL  = np.uint64(NORMAL_MASK)
+_REVERSE = np.uint64(sum(1 << i for i in range(N_CARDS) if CARD_SPECIAL[i] == REVERSE))
+# heuristic_action's _id_strength, per trump suit: specials 50, trumps +100
+_COST = np.array([[50 if CARD_SPECIAL[i] != NORMAL else CARD_RANK[i] + (100 if CARD_SUIT[i] == t else 0)
+                   for i in range(N_CARDS)] for t in range(len(SUITS))], dtype=np.int64)
+_POP8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+_NEVER = np.iinfo(np.int64).max
+
+
+def popcount(masks):
+    """Set bits per uint64 mask."""
+    masks = np.ascontiguousarray(masks, dtype=np.uint64)
+    return _POP8[masks.view(np.uint8)].reshape(masks.shape + (8,)).sum(-1)
+
+
+def bits(masks):
+    """uint64 masks [n] -> bool card membership [n, N_CARDS]."""
+    return ((masks[:, None] >> _SHIFTS) & _U1).astype(bool)
+
+
+def _bit(ids):
+    return _U1 << ids.astype(np.uint64)
+
+
+# ── Batch state ────────────────────────────────────────────────────────────────
+
+class BatchGames:
+    """
+    N games as parallel arrays.  Side 0 is the player, 1 the opponent.
+
+      hands, taken   uint64 [N, 2]   card-ID masks
+      order          int64 [N, 45]   per-card insertion stamp (list order)
+      deck, deck_pos int64 [N, 33]   draw order and next index
+      atk, dfn       int64 [N, 6]    table slots, -1 when empty
+      table_ranks, locked            9-bit rank sets
+      trump, phase, attacker, winner int64 [N]
+    """
+
+    def __init__(self, games):
+        n = len(games)
+        self.n = n
+        self.hands = np.zeros((n, 2), dtype=np.uint64)
+        self.taken = np.zeros((n, 2), dtype=np.uint64)
+        self.order = np.zeros((n, N_CARDS), dtype=np.int64)
+        self.clock = np.zeros(n, dtype=np.int64)
+        self.deck = np.zeros((n, DECK_SIZE), dtype=np.int64)
+        self.deck_pos = np.zeros(n, dtype=np.int64)
+        self.atk = np.full((n, N_SLOTS), -1, dtype=np.int64)
+        self.dfn = np.full((n, N_SLOTS), -1, dtype=np.int64)
+        self.table_ranks = np.zeros(n, dtype=np.int64)
+        self.locked = np.zeros(n, dtype=np.int64)
+        self.trump = np.zeros(n, dtype=np.int64)
+        self.phase = np.zeros(n, dtype=np.int64)
+        self.attacker = np.zeros(n, dtype=np.int64)
+        self.winner = np.full(n, -1, dtype=np.int64)
+        self.steps = np.zeros(n, dtype=np.int64)
+        for g, r in enumerate(games):
+            self.hands[g] = r._hands; self.taken[g] = r._taken
+            self.order[g] = r._order; self.clock[g] = r._clock
+            self.deck[g, DECK_SIZE - len(r._deck):] = list(r._deck)
+            self.deck_pos[g] = DECK_SIZE - len(r._deck)
+            self.atk[g] = r._atk; self.dfn[g] = r._def
+            self.table_ranks[g] = r._table_ranks; self.locked[g] = r._locked
+            self.trump[g] = r._trump
+            self.phase[g] = {'attack': ATTACK, 'defense': DEFENSE}.get(r.phase, OVER)
+            self.attacker[g] = 0 if r.attacker == 'player' else 1
+
+    @classmethod
+    def seeded(cls, n, seed=0):
+        """Games dealt by selfplay.new_game(seed + i)."""
+        return cls([new_game(seed + i) for i in range(n)])
+
+    # ── Pile helpers ──
+
+    def _pile(self, g, side):
+        return self.hands[g, side] | self.taken[g, side]
+
+    def _stamp(self, g, cards):
+        self.order[g, cards] = self.clock[g]
+        self.clock[g] += 1
+
+    def _check_game_over(self, g):
+        g = g[self.deck_pos[g] == DECK_SIZE]
+        p_empty = self._pile(g, 0) == 0
+        o_empty = self._pile(g, 1) == 0
+        over = p_empty | o_empty
+        self.winner[g[p_empty & o_empty]] = DRAW
+        self.winner[g[p_empty & ~o_empty]] = PLAYER
+        self.winner[g[o_empty & ~p_empty]] = OPPONENT
+        self.phase[g[over]] = OVER
+
+    def _all_beaten(self, g):
+        occ = self.atk[g] >= 0
+        return occ.any(1) & ~(occ & (self.dfn[g] < 0)).any(1)
+
+    def _remove(self, g, side, cards):
+        bit = _bit(cards)
+        in_taken = (self.taken[g, side] & bit) != 0
+        self.taken[g, side] ^= np.where(in_taken, bit, 0).astype(np.uint64)
+        self.hands[g, side] ^= np.where(in_taken, 0, bit).astype(np.uint64)
+
+    def _clear_table(self, g):
+        self.atk[g] = -1; self.dfn[g] = -1
+        self.table_ranks[g] = 0; self.locked[g] = 0
+
+    def _refill(self, g, side):
+        """_refill_hand: oldest taken-pile cards first, then the deck."""
+        for _ in range(HAND_SIZE):
+            need = (popcount(self.hands[g, side]) < HAND_SIZE) & (self.taken[g, side] != 0)
+            if not need.any(): break
+            h, s = g[need], side[need]
+            stamps = np.where(bits(self.taken[h, s]), self.order[h], _NEVER)
+            card = stamps.argmin(1)
+            self.taken[h, s] ^= _bit(card); self.hands[h, s] |= _bit(card)
+            self._stamp(h, card)
+        for _ in range(HAND_SIZE):
+            need = (popcount(self.hands[g, side]) < HAND_SIZE) & (self.deck_pos[g] < DECK_SIZE)
+            if not need.any(): break
+            h, s = g[need], side[need]
+            card = self.deck[h, self.deck_pos[h]]
+            self.deck_pos[h] += 1
+            self.hands[h, s] |= _bit(card)
+            self._stamp(h, card)
+
+    # ── Moves ──
+
+    def attack(self, g, cards, slots):
+        self.atk[g, slots] = cards
+        self.table_ranks[g] |= 1 << _RANK[cards]
+        self.phase[g] = DEFENSE
+        self._remove(g, self.attacker[g], cards)
+        self._check_game_over(g)
+
+    def defend(self, g, atk_cards, def_cards):
+        defender = 1 - self.attacker[g]
+        self._remove(g, defender, def_cards)
+        special = _SPECIAL[def_cards]
+        skip, normal = special == SKIP, special == NORMAL
+        self.locked[g[skip]] |= 1 << _RANK[atk_cards[skip]]
+        self.table_ranks[g[normal]] |= 1 << _RANK[def_cards[normal]]
+        slot = ((self.atk[g] == atk_cards[:, None]) & (self.dfn[g] < 0)).argmax(1)
+        self.dfn[g, slot] = def_cards
+        rev = special == REVERSE
+        self.attacker[g[rev]] ^= 1
+        self.phase[g[rev]] = ATTACK
+        rest = g[~rev]
+        self.phase[rest[self._all_beaten(rest)]] = ATTACK
+        self._check_game_over(g)
+        wild = (special == WILD) & (self.phase[g] != OVER)
+        if wild.any():
+            self.trump[g[wild]] = self._wild_suit(g[wild], defender[wild])
+
+    def take(self, g):
+        defender = 1 - self.attacker[g]
+        for slot in range(N_SLOTS):
+            for col in (self.atk, self.dfn):
+                card = col[g, slot]
+                has = card >= 0
+                h, c = g[has], card[has]
+                self.taken[h, defender[has]] |= _bit(c)
+                self._stamp(h, c)
+        self._clear_table(g)
+        self._refill(g, self.attacker[g])
+        self._refill(g, defender)
+        self.phase[g] = ATTACK
+        self._check_game_over(g)
+
+    def end_attack(self, g):
+        self._clear_table(g)
+        self.attacker[g] ^= 1
+        self._refill(g, self.attacker[g])
+        self._refill(g, 1 - self.attacker[g])
+        self.phase[g] = ATTACK
+        self._check_game_over(g)
+
+    # ── Heuristic policy (heuristic_action as array operations) ──
+
+    def _wild_suit(self, g, side):
+        """Suit with most normal cards in hand + taken; ties go to the suit seen first."""
+        hand, taken = bits(self.hands[g, side]), bits(self.taken[g, side])
+        normal = (hand | taken)[:, :36].reshape(-1, 4, 9)
+        seen = np.where(hand, self.order[g], np.where(taken, self.order[g] + (1 << 40), _NEVER))
+        first = seen[:, :36].reshape(-1, 4, 9).min(2)
+        count = normal.sum(2)
+        best = np.where(count == count.max(1, keepdims=True), first, _NEVER).argmin(1)
+        return np.where(count.max(1) > 0, best, SUIT_INDEX['clubs'])
+
+    def _attack_step(self, g):
+        a = self.attacker[g]
+        pile = self._pile(g, a)
+        ranks = (self.table_ranks[g] & ~self.locked[g]).astype(np.int64)
+        legal = np.where(self.table_ranks[g] == 0, pile & _NORMAL, pile & _RANKSET[ranks])
+        empty = self.atk[g] < 0
+        beaten = self._all_beaten(g)
+        other = popcount(self._pile(g, 1 - a))
+        end = (legal == 0) | (beaten & (other <= 3)) | ~empty.any(1)
+
+        # Highest non-trump first, then highest trump; ties to the lowest ID
+        trump_card = _SUIT[None, :] == self.trump[g, None]
+        score = np.where(bits(legal), _RANK[None, :] + np.where(trump_card, 0, 100), -1)
+        cards = score.argmax(1)
+        self.attack(g[~end], cards[~end], empty.argmax(1)[~end])
+
+        ending = g[end]
+        ok = self._all_beaten(ending)
+        self.end_attack(ending[ok])
+        stalled = ending[~ok]
+        self.phase[stalled] = OVER; self.winner[stalled] = STALLED
+        self.steps[stalled] -= 1   # the no-op end_attack is not a move
+
+    def _defense_step(self, g):
+        trump = self.trump[g]
+        pile = self._pile(g, 1 - self.attacker[g])
+        unbeaten = (self.atk[g] >= 0) & (self.dfn[g] < 0)
+        atk_cost = _COST[trump[:, None], np.maximum(self.atk[g], 0)]
+        # Hardest attack first, table order on ties
+        plan_order = np.argsort(np.where(unbeaten, -atk_cost, _NEVER), axis=1, kind='stable')
+        n_unbeaten = unbeaten.sum(1)
+
+        rows = np.arange(len(g))
+        used = np.zeros(len(g), dtype=np.uint64)
+        take = np.zeros(len(g), dtype=bool)
+        first_atk = np.zeros(len(g), dtype=np.int64)
+        first_def = np.zeros(len(g), dtype=np.int64)
+        cost = _COST[trump]
+        trump_suit = _SUITM[trump]
+        for k in range(N_SLOTS):
+            live = (k < n_unbeaten) & ~take
+            if not live.any(): break
+            r = rows[live]
+            atk = self.atk[g[r], plan_order[r, k]]
+            opts = pile[r] & _BEATS[trump[r], atk] & ~used[r]
+            rev = opts & _REVERSE
+            non_trump = opts & ~trump_suit[r]
+            trumps = opts & trump_suit[r]
+            trump_ok = (_COST[trump[r], atk] >= 5) | (_SUIT[atk] == trump[r])
+            gives_up = (opts == 0) | ((rev == 0) & (non_trump == 0) & ~trump_ok)
+            pool = np.where(rev != 0, rev, np.where(non_trump != 0, non_trump, trumps))
+            chosen = np.where(bits(pool), cost[r], _NEVER).argmin(1)
+            take[r[gives_up]] = True
+            ok = r[~gives_up]
+            used[ok] |= _bit(chosen[~gives_up])
+            if k == 0:
+                first_atk[ok] = atk[~gives_up]; first_def[ok] = chosen[~gives_up]
+        self.take(g[take])
+        self.defend(g[~take], first_atk[~take], first_def[~take])
+
+    def step(self):
+        """One decision in every unfinished game.  Returns the number still running."""
+        live = np.flatnonzero(self.phase != OVER)
+        self.steps[live] += 1
+        att = live[self.phase[live] == ATTACK]
+        dfn = live[self.phase[live] == DEFENSE]
+        if len(att): self._attack_step(att)
+        if len(dfn): self._defense_step(dfn)
+        return int((self.phase != OVER).sum())
+
+    def run(self, max_steps=500):
+        for _ in range(max_steps):
+            if not self.step(): break
+        live = self.phase != OVER
+        self.winner[live] = STALLED; self.phase[live] = OVER
+        return self.winner
+
+
+# ── Entry points ───────────────────────────────────────────────────────────────
+
+def check(n, seed=0):
+    """Compare winners and step counts with selfplay.play_game on the same deals."""
+    from ai_opponent import heuristic_action
+    from selfplay import play_game
+    batch = BatchGames.seeded(n, seed)
+    batch.run()
+    policies = {'player': heuristic_action, 'opponent': heuristic_action}
+    bad = 0
+    for i in range(n):
+        winner, steps = play_game(new_game(seed + i), policies)
+        if (winner, steps) != (OUTCOME_NAMES[batch.winner[i]], batch.steps[i]):
+            bad += 1
+            print(f"mismatch seed={seed + i}: single={winner}/{steps} "
+                  f"batch={OUTCOME_NAMES[batch.winner[i]]}/{batch.steps[i]}")
+    print(f"{n - bad}/{n} games match")
+    return bad == 0
+
+
+def main(argv):
+    if argv and argv[0] == '--check':
+        sys.exit(0 if check(int(argv[1]) if len(argv) > 1 else 500) else 1)
+    n = int(argv[0]) if argv else 10000
+    t0 = time.perf_counter()
+    batch = BatchGames.seeded(n)
+    t1 = time.perf_counter()
+    winner = batch.run()
+    t2 = time.perf_counter()
+    counts = np.bincount(winner, minlength=len(OUTCOME_NAMES))
+    print(f"{n} games: deal {t1 - t0:.2f}s, play {t2 - t1:.2f}s  ({n / (t2 - t1):,.0f} games/s)")
+    print("  " + "  ".join(f"{name}={c}" for name, c in zip(OUTCOME_NAMES, counts)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,383 @@
+"""
+bench.py  –  Benchmark suite for Uno-Urak hot paths
+
+  python bench.py                         run every benchmark
+  python bench.py micro game              run selected benchmarks
+  python bench.py --json out.json         also save the results as JSON
+  python bench.py --compare a.json b.json compare two saved runs
+
+  micro     µs/call for _parse_key, _can_beat, _ranks_on_table,
+            valid_attack_cards, all_defense_cards, heuristic_action
+            (legal-move cache cleared per call; *_cached rows are cache hits)
+  game      full heuristic self-play games/s, no rendering
+  frame     run_game frames under SDL_VIDEODRIVER=dummy, p50/p99 ms
+  defense   all_defense_cards: string parsing vs beat tables, uncached and cached
+  import    cold import time: durak_rules vs Game
+  clone     lookahead cycles/s: deepcopy vs clone() vs undo() vs restore()
+
+Positions come from seeded random play, so numbers are comparable run to run.
+"""
+
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from ai_opponent import heuristic_action
+from cards import CARD_ID, DECK, SUIT_INDEX, can_beat
+from durak_rules import DurakRules, _can_beat, _parse_key, _ranks_on_table
+from selfplay import apply_action, new_game, play_game, seat_view, to_move
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+# ── Legacy reference (string-key parsing, before card IDs) ────────────────────
+
+_L_RANK_NAMES  = {'six': '6', 'seven': '7', 'eight': '8', 'nine': '9', 'ten': '10',
+                  'jack': 'J', 'queen': 'Q', 'king': 'K', 'ace': 'A'}
+_L_SUIT_SUFFIX = {'C': 'clubs', 'D': 'diamonds', 'H': 'hearts', 'S': 'spades'}
+_L_RANK_ORDER  = ['6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+_L_SKIP_SUIT   = {'skipC': 'clubs', 'skipD': 'diamonds', 'skipH': 'hearts', 'skipS': 'spades'}
+_L_REV_SUIT    = {'reverseC': 'clubs', 'reverseD': 'diamonds', 'reverseH': 'hearts', 'reverseS': 'spades'}
+
+
+def _legacy_parse_key(key):
+    if key == 'wild':        return ('wild', 'WILD')
+    if key in _L_SKIP_SUIT:  return (_L_SKIP_SUIT[key], 'SKIP')
+    if key in _L_REV_SUIT:   return (_L_REV_SUIT[key], 'REVERSE')
+    low = key.lower()
+    for name, rank in _L_RANK_NAMES.items():
+        if low.startswith(name):
+            return _L_SUIT_SUFFIX[key[len(name):]], rank
+    raise ValueError(f"Cannot parse image key: {key!r}")
+
+
+def _legacy_can_beat(atk_key, def_key, trump_suit):
+    if def_key == 'wild': return True
+    a_suit, a_rank = _legacy_parse_key(atk_key)
+    d_suit, d_rank = _legacy_parse_key(def_key)
+    if def_key in _L_REV_SUIT or def_key in _L_SKIP_SUIT: return d_suit == a_suit
+    if d_suit != trump_suit and d_suit != a_suit: return False
+    a_str = _L_RANK_ORDER.index(a_rank) + (100 if a_suit == trump_suit else 0)
+    d_str = _L_RANK_ORDER.index(d_rank) + (100 if d_suit == trump_suit else 0)
+    return d_str > a_str
+
+
+def _legacy_all_defense_cards(rules):
+    hand = rules._defender_hand() + rules._defender_taken()
+    return {k for k in hand
+            if any(_legacy_can_beat(slot[0], k, rules.trump_suit)
+                   for slot in rules.table if slot is not None and slot[1] is None)}
+
+
+def _pairwise_all_defense_cards(rules):
+    """Card IDs, but one can_beat call per (hand card, attack) pair."""
+    trump = SUIT_INDEX[rules.trump_suit]
+    atks = [CARD_ID[s[0]] for s in rules._unbeaten()]
+    return {k for k in rules._defender_hand() + rules._defender_taken()
+            if any(can_beat(a, CARD_ID[k], trump) for a in atks)}
+
+
+# ── Positions ──────────────────────────────────────────────────────────────────
+
+def random_move(rules, rng):
+    """Apply one uniformly random legal move.  Returns False when none exists."""
+    if rules.phase == 'attack':
+        moves = [('attack', k) for k in sorted(rules.valid_attack_cards())]
+        if rules._all_beaten(): moves.append(('end',))
+    elif rules.phase == 'defense':
+        moves = [('defend', s[0], d) for s in rules._unbeaten()
+                 for d in sorted(rules.valid_defense_for(s[0]))]
+        moves.append(('take',))
+    else:
+        return False
+    if not moves: return False
+    m = rng.choice(moves)
+    if m[0] == 'attack':
+        rules.try_attack(m[1], rules.table.index(None))
+    elif m[0] == 'defend':
+        if rules.try_defend(m[1], m[2]) == 'ok_wild':
+            rules.resolve_wild(rng.choice(['clubs', 'diamonds', 'hearts', 'spades']))
+    elif m[0] == 'take':
+        rules.try_take()
+    else:
+        rules.try_end_attack()
+    return True
+
+
+def positions(n, want, seed=0):
+    """n copies of positions from seeded random play for which want(rules) holds."""
+    rng = random.Random(seed); out = []
+    while len(out) < n:
+        rules = DurakRules(list(DECK), 'ace' + rng.choice('CDHS'), rng=rng)
+        while len(out) < n and random_move(rules, rng):
+            if want(rules):
+                out.append(rules.clone())
+    return out
+
+
+def attack_positions(n, seed=0):
+    return positions(n, lambda r: r.phase == 'attack', seed)
+
+
+def defense_positions(n, seed=0):
+    """n defence-phase positions with at least one unbeaten attack."""
+    return positions(n, lambda r: r.phase == 'defense' and r._unbeaten(), seed)
+
+
+def dense_position(seed=0):
+    """A busy mid-game table: three or more slots used and both taken piles non-empty."""
+    return positions(1, lambda r: sum(s is not None for s in r.table) >= 3
+                     and r.player_taken and r.opp_taken and r.remaining, seed)[0]
+
+
+# ── Timing ─────────────────────────────────────────────────────────────────────
+
+def time_per_call(fn, args, repeat=5):
+    """Best-of-`repeat` mean time per call in microseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for a in args: fn(a)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(args) * 1e6
+
+
+def uncached(fn):
+    """`fn` on a position whose legal-move cache is emptied first, as on a fresh turn.
+
+    DurakRules memoises its masks per version, so repeating a call on the same
+    position only times the cache hit."""
+    def call(r):
+        r._cache.clear()
+        return fn(r)
+    return call
+
+
+# ── Benchmarks ─────────────────────────────────────────────────────────────────
+# Each benchmark prints a summary and returns {metric: value} for the JSON file.
+
+def bench_micro():
+    atk_pos, def_pos = attack_positions(2000), defense_positions(2000)
+    mixed = atk_pos + def_pos
+    tables = [r.table for r in mixed]
+    pairs = [(s[0], k, r.trump_suit) for r in def_pos for s in r._unbeaten()
+             for k in r._defender_hand() + r._defender_taken()]
+    results = {
+        '_parse_key_us':         time_per_call(_parse_key, list(DECK) * 40),
+        '_can_beat_us':          time_per_call(lambda p: _can_beat(*p), pairs),
+        '_ranks_on_table_us':    time_per_call(_ranks_on_table, tables),
+        'valid_attack_cards_us': time_per_call(uncached(DurakRules.valid_attack_cards), atk_pos),
+        'all_defense_cards_us':  time_per_call(uncached(DurakRules.all_defense_cards), def_pos),
+        'heuristic_action_us':   time_per_call(uncached(lambda r: heuristic_action(seat_view(r, to_move(r)))), mixed),
+        'valid_attack_cards_cached_us': time_per_call(DurakRules.valid_attack_cards, atk_pos),
+        'all_defense_cards_cached_us':  time_per_call(DurakRules.all_defense_cards, def_pos),
+    }
+    print("micro  (µs/call)")
+    for name, us in results.items():
+        print(f"  {name[:-3]:<27} {us:8.2f}")
+    return results
+
+
+def bench_game(n=400):
+    policies = {'player': heuristic_action, 'opponent': heuristic_action}
+    moves = 0
+    t0 = time.perf_counter()
+    for seed in range(n):
+        _, steps = play_game(new_game(seed), policies)
+        moves += steps
+    dt = time.perf_counter() - t0
+    print(f"game  heuristic self-play, {n} games")
+    print(f"  {n / dt:8.0f} games/s   {moves / dt:10.0f} moves/s")
+    return {'games_per_s': n / dt, 'moves_per_s': moves / dt}
+
+
+def frame_times(draw, frames=300, warmup=30):
+    """Per-frame ms of draw(tick) + display.flip(), sorted."""
+    import pygame
+    times = []; tick = 0
+    for i in range(frames + warmup):
+        t0 = time.perf_counter()
+        draw(tick)
+        pygame.display.flip()
+        if i >= warmup: times.append((time.perf_counter() - t0) * 1000)
+        tick += 7
+    return sorted(times)
+
+
+def setup_screen(w, h):
+    """Headless display at w x h with Game's layout globals to match."""
+    import pygame
+    import Game
+    Game.SCREEN_W, Game.SCREEN_H, Game.FULLSCREEN = w, h, False
+    Game._recalc_layout()
+    return pygame.display.set_mode((w, h))
+
+
+def game_frame(screen, rules, ai_thinking=True):
+    """A draw(tick) callable rendering run_game frames for `rules`."""
+    import pygame
+    import Game
+    fonts = Game.load_fonts(); bg = Game.make_bg(Game.SCREEN_W, Game.SCREEN_H)
+    small_f = pygame.font.SysFont("Palatino Linotype", 18)
+    L = Game._build_layout()
+    ui = dict(mx=L['hand_x0'] + 10, my=L['hand_y'] + 10, held_card=None, held_offset=(0, 0),
+              held_from_taken=False, anim_queue=[], animating_cards=set(),
+              discard_pile=['back'] * 8, discard_anims=[],
+              reverse_flash="ROLES REVERSED!", reverse_flash_timer=1500, ai_thinking=ai_thinking)
+    return lambda tick: Game.draw_frame(screen, bg, fonts, small_f, tick, rules, rules.trump_key, True, L, ui)
+
+
+def percentiles(times):
+    return {'p50_ms': times[len(times) // 2], 'p99_ms': times[min(len(times) - 1, int(len(times) * 0.99))],
+            'mean_ms': sum(times) / len(times)}
+
+
+def bench_frame(resolutions=((1920, 1080), (2560, 1440))):
+    results = {}
+    print("frame  run_game draw + flip, dense mid-game position (ms)")
+    for w, h in resolutions:
+        screen = setup_screen(w, h)
+        stats = percentiles(frame_times(game_frame(screen, dense_position())))
+        for k, v in stats.items(): results[f"{w}x{h}_{k}"] = v
+        print(f"  {w}x{h}   p50 {stats['p50_ms']:7.2f}   p99 {stats['p99_ms']:7.2f}")
+    return results
+
+
+def bench_defense():
+    positions = defense_positions(2000)
+    for r in positions:
+        assert _legacy_all_defense_cards(r) == r.all_defense_cards()
+    legacy   = time_per_call(_legacy_all_defense_cards, positions)
+    pairwise = time_per_call(_pairwise_all_defense_cards, positions)
+    table    = time_per_call(uncached(DurakRules.all_defense_cards), positions)
+    cached   = time_per_call(DurakRules.all_defense_cards, positions)
+    print("defense  all_defense_cards (µs/call over 2000 positions)")
+    print(f"  string parsing        {legacy:8.2f}")
+    print(f"  card IDs              {pairwise:8.2f}")
+    print(f"  beat tables           {table:8.2f}   ({legacy / table:.1f}x vs string parsing)")
+    print(f"  beat tables, cached   {cached:8.2f}   (repeat call on an unchanged position)")
+    return {'string_parsing_us': legacy, 'card_ids_us': pairwise, 'beat_tables_us': table,
+            'beat_tables_cached_us': cached}
+
+
+def cold_import_ms(module, repeat=5):
+    """Best-of-`repeat` cumulative import time of `module` in a fresh interpreter."""
+    best = float('inf')
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                             capture_output=True, text=True, cwd=HERE)
+        for line in out.stderr.splitlines():
+            parts = line.split("|")
+            if len(parts) == 3 and parts[2].strip() == module:
+                best = min(best, int(parts[1]) / 1000)
+    return best
+
+
+def bench_import():
+    rules_ms = cold_import_ms("durak_rules")
+    game_ms  = cold_import_ms("Game")
+    print("import  cold import (ms, best of 5)")
+    print(f"  durak_rules  {rules_ms:8.2f}")
+    print(f"  Game         {game_ms:8.2f}   (pygame.init + 46 PNG loads)")
+    return {'durak_rules_ms': rules_ms, 'Game_ms': game_ms}
+
+
+def bench_clone(n=2000):
+    """One lookahead step per position: copy the state, play the heuristic move, drop it."""
+    cases = [(r, heuristic_action(seat_view(r, to_move(r))))
+             for r in attack_positions(n // 2) + defense_positions(n // 2)]
+
+    def deepcopy_cycle(case):
+        apply_action(copy.deepcopy(case[0]), case[1])
+
+    def clone_cycle(case):
+        apply_action(case[0].clone(), case[1])
+
+    def undo_cycle(case):
+        if apply_action(case[0], case[1]): case[0].undo()
+
+    def restore_cycle(case):
+        r = case[0]; snap = r.snapshot()
+        apply_action(r, case[1])
+        r.restore(snap)
+
+    for r, _ in cases: r.begin_search()
+    results = {}
+    print(f"clone  copy + heuristic move + discard ({n} positions, cycles/s)")
+    for name, fn in (('deepcopy', deepcopy_cycle), ('clone', clone_cycle),
+                     ('undo', undo_cycle), ('restore', restore_cycle)):
+        rate = 1e6 / time_per_call(fn, cases)
+        results[f"{name}_cycles_per_s"] = rate
+        print(f"  {name:<10} {rate:10,.0f}   ({rate / results['deepcopy_cycles_per_s']:5.1f}x deepcopy)")
+    for r, _ in cases: r.end_search()
+    return results
+
+
+BENCHMARKS = {
+    'micro':   bench_micro,
+    'game':    bench_game,
+    'frame':   bench_frame,
+    'defense': bench_defense,
+    'import':  bench_import,
+    'clone':   bench_clone,
+}
+
+
+# ── JSON results ───────────────────────────────────────────────────────────────
+
+def run_meta():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=HERE).stdout.strip()
+    except OSError:
+        commit = ""
+    return {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+            'time': time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def compare(path_a, path_b):
+    with open(path_a) as f: a = json.load(f)
+    with open(path_b) as f: b = json.load(f)
+    print(f"{a['meta'].get('commit') or path_a}  ->  {b['meta'].get('commit') or path_b}")
+    for bench, metrics in a['results'].items():
+        for metric, old in metrics.items():
+            new = b['results'].get(bench, {}).get(metric)
+            if new is None: continue
+            # *_per_s: higher is better; times: lower is better
+            better = new > old if metric.endswith('_per_s') else new < old
+            change = (new - old) / old * 100 if old else 0.0
+            print(f"  {bench + '.' + metric:<36} {old:12.3f} {new:12.3f}  {change:+7.1f}%"
+                  f"{'  better' if better and abs(change) >= 5 else '  worse' if abs(change) >= 5 else ''}")
+
+
+def main(argv):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("names", nargs="*", metavar="NAME", help=f"any of: {', '.join(BENCHMARKS)}")
+    ap.add_argument("--json", metavar="PATH", help="save results as JSON")
+    ap.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two JSON files")
+    args = ap.parse_args(argv)
+    if args.compare:
+        compare(*args.compare); return
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        ap.error(f"unknown benchmark: {', '.join(sorted(unknown))}")
+    results = {}
+    for name in args.names or BENCHMARKS:
+        results[name] = BENCHMARKS[name]()
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'meta': run_meta(), 'results': results}, f, indent=2)
+        print(f"saved {args.json}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
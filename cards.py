@@ -0,0 +1,135 @@
+"""
+cards.py  –  Shared card core for Uno-Urak
+
+Every image key is mapped once to a small integer card ID.  Suit, rank,
+special type and display key live in flat tables indexed by that ID, so
+rules code never has to parse key strings again:
+
+  IDs  0-35   normal cards, suit-major  (id = suit * 9 + rank)
+  IDs 36-39   SKIP    (clubs, diamonds, hearts, spades)
+  IDs 40-43   REVERSE (clubs, diamonds, hearts, spades)
+  ID  44      WILD
+
+Suits are indices into SUITS, ranks are indices into RANKS (0 = '6' .. 8 = 'A').
+No pygame dependency.
+"""
+
+# ── Suits / ranks ──────────────────────────────────────────────────────────────
+
+SUITS        = ('clubs', 'diamonds', 'hearts', 'spades')
+SUIT_LETTERS = ('C', 'D', 'H', 'S')
+SUIT_INDEX   = {s: i for i, s in enumerate(SUITS)}
+
+RANKS      = ('6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A')
+RANK_WORDS = ('six', 'seven', 'eight', 'nine', 'ten', 'jack', 'queen', 'king', 'ace')
+
+NO_SUIT = -1   # suit of the WILD card
+NO_RANK = -1   # rank of every special card
+
+# Special types
+NORMAL, SKIP, REVERSE, WILD = 0, 1, 2, 3
+SPECIAL_NAMES = (None, 'SKIP', 'REVERSE', 'WILD')
+
+
+# ── Card table ─────────────────────────────────────────────────────────────────
+
+def _build_table():
+    keys, suits, ranks, specials = [], [], [], []
+    for s, letter in enumerate(SUIT_LETTERS):
+        for r, word in enumerate(RANK_WORDS):
+            keys.append(word + letter); suits.append(s); ranks.append(r); specials.append(NORMAL)
+    for prefix, special in (('skip', SKIP), ('reverse', REVERSE)):
+        for s, letter in enumerate(SUIT_LETTERS):
+            keys.append(prefix + letter); suits.append(s); ranks.append(NO_RANK); specials.append(special)
+    keys.append('wild'); suits.append(NO_SUIT); ranks.append(NO_RANK); specials.append(WILD)
+    return tuple(keys), tuple(suits), tuple(ranks), tuple(specials)
+
+
+CARD_KEYS, CARD_SUIT, CARD_RANK, CARD_SPECIAL = _build_table()
+N_CARDS = len(CARD_KEYS)
+CARD_ID = {k: i for i, k in enumerate(CARD_KEYS)}
+
+# Legacy (suit, rank) strings as returned by the old _parse_key
+CARD_SUIT_NAME = tuple('wild' if s == NO_SUIT else SUITS[s] for s in CARD_SUIT)
+CARD_RANK_NAME = tuple(RANKS[r] if sp == NORMAL else SPECIAL_NAMES[sp]
+                       for r, sp in zip(CARD_RANK, CARD_SPECIAL))
+
+WILD_ID = CARD_ID['wild']
+
+# Short codes for compact AI prompts: rank + lower-case suit ('Th' = ten of
+# hearts), 'S' / 'R' + suit for SKIP / REVERSE, and 'W' for WILD
+RANK_CODES = '6789TJQKA'
+CARD_CODES = tuple('W' if sp == WILD else
+                   ('S' if sp == SKIP else 'R' if sp == REVERSE else RANK_CODES[r]) + SUIT_LETTERS[s].lower()
+                   for s, r, sp in zip(CARD_SUIT, CARD_RANK, CARD_SPECIAL))
+CODE_ID = {c: i for i, c in enumerate(CARD_CODES)}
+
+# The full playable deck, in ID order
+DECK = CARD_KEYS
+
+
+def card_id(key):
+    """Image key -> card ID.  Raises ValueError for unknown keys."""
+    try:
+        return CARD_ID[key]
+    except KeyError:
+        raise ValueError(f"Cannot parse image key: {key!r}") from None
+
+
+def parse_key(key):
+    """Legacy (suit, rank) string pair, e.g. ('hearts', 'A') or ('clubs', 'SKIP')."""
+    i = card_id(key)
+    return CARD_SUIT_NAME[i], CARD_RANK_NAME[i]
+
+
+# ── Rules primitives on IDs ────────────────────────────────────────────────────
+
+def strength(cid, trump):
+    """Rank index, +100 when in the trump suit.  Specials have rank -1."""
+    return CARD_RANK[cid] + (100 if CARD_SUIT[cid] == trump else 0)
+
+
+def can_beat(atk, dfn, trump):
+    """True if card `dfn` covers attack card `atk` with trump suit index `trump`."""
+    sp = CARD_SPECIAL[dfn]
+    if sp == WILD: return True
+    if sp != NORMAL: return CARD_SUIT[dfn] == CARD_SUIT[atk]
+    d_suit = CARD_SUIT[dfn]
+    if d_suit != trump and d_suit != CARD_SUIT[atk]: return False
+    return strength(dfn, trump) > strength(atk, trump)
+
+
+# ── Beat tables ────────────────────────────────────────────────────────────────
+# BEATS[trump][atk] is a bitmask over card IDs: bit d is set when card d covers
+# attack card atk.  One table per trump suit, so a WILD trump change is just a
+# switch to another table.
+
+def _beat_table(trump):
+    return tuple(sum(1 << d for d in range(N_CARDS) if can_beat(a, d, trump))
+                 for a in range(N_CARDS))
+
+
+BEATS = tuple(_beat_table(t) for t in range(len(SUITS)))
+
+
+# ── Card masks ─────────────────────────────────────────────────────────────────
+# A pile of cards is an int with bit i set for card ID i (45 bits, fits in 64).
+
+def bit_ids(mask):
+    """Card IDs in `mask`, lowest first."""
+    ids = []
+    while mask:
+        low = mask & -mask
+        ids.append(low.bit_length() - 1)
+        mask ^= low
+    return ids
+
+
+ALL_MASK    = (1 << N_CARDS) - 1
+NORMAL_MASK = sum(1 << i for i in range(N_CARDS) if CARD_SPECIAL[i] == NORMAL)
+SUIT_MASK   = tuple(sum(1 << i for i in range(N_CARDS) if CARD_SUIT[i] == s) for s in range(len(SUITS)))
+RANK_MASK   = tuple(sum(1 << i for i in range(N_CARDS) if CARD_RANK[i] == r) for r in range(len(RANKS)))
+
+# RANKSET_CARDS[bits] = every normal card whose rank bit is set in the 9-bit rank set
+RANKSET_CARDS = tuple(sum(RANK_MASK[r] for r in range(len(RANKS)) if bits >> r & 1)
+                      for bits in range(1 << len(RANKS)))
@@ -0,0 +1,400 @@
+"""
+durak_rules.py  –  Headless Durak rules engine for Uno-Urak
+
+Pure Python, no pygame import: safe for batch jobs, servers and tools.
+Game.py and ai_opponent.py both build on it.
+"""
+
+import random
+from collections import deque
+from typing import NamedTuple
+
+from cards import (CARD_ID, CARD_KEYS, CARD_RANK, CARD_SPECIAL, NORMAL, SKIP, REVERSE, WILD,
+                   N_CARDS, RANKS, SUIT_INDEX, BEATS, NORMAL_MASK, SUIT_MASK, RANKSET_CARDS,
+                   bit_ids, card_id, parse_key)
+
+# ── Card parsing ───────────────────────────────────────────────────────────────
+
+_RANK_ORDER  = list(RANKS)
+_UNPLAYABLE  = {'back'}
+
+# Every playable card key; 'back' is display-only
+DECK = CARD_KEYS
+
+def _is_skip(k):    return CARD_SPECIAL[CARD_ID[k]]==SKIP
+def _is_wild(k):    return CARD_SPECIAL[CARD_ID[k]]==WILD
+def _is_reverse(k): return CARD_SPECIAL[CARD_ID[k]]==REVERSE
+
+_parse_key=parse_key
+
+def _trump_suit_of(key): return _parse_key(key)[0]
+
+def _can_beat(atk_key, def_key, trump_suit):
+    return bool(BEATS[SUIT_INDEX[trump_suit]][card_id(atk_key)]>>card_id(def_key)&1)
+
+def _ranks_on_table(table):
+    """Rank indices (0-8) of the normal cards on the table."""
+    ranks=set()
+    for slot in table:
+        if slot is None: continue
+        for k in slot:
+            if k is not None and CARD_RANK[CARD_ID[k]]>=0: ranks.add(CARD_RANK[CARD_ID[k]])
+    return ranks
+
+def _mask_keys(mask): return frozenset(CARD_KEYS[i] for i in bit_ids(mask))
+
+# ── Visible state ──────────────────────────────────────────────────────────────
+
+class VisibleState(NamedTuple):
+    """
+    Everything one side can see, frozen and hashable, with that side in
+    the 'opponent' seat.  Piles are card-ID bitmasks.  The other hand and
+    the deck are known only together, as the `unseen` set.  Pile order is
+    dropped, so positions that differ only in pick-up order are equal.
+    Built by DurakRules.visible_state(); DurakRules.from_visible() thaws it.
+    """
+    trump_suit: str
+    trump_key: str
+    phase: str
+    attacking: bool         # the viewer is the attacker
+    pending_wild: bool
+    hand: int
+    taken: int
+    other_taken: int
+    other_hand_size: int
+    unseen: int             # other hand | deck
+    atk: tuple
+    dfn: tuple
+    table_ranks: int
+    locked: int
+
+# ── DurakRules ─────────────────────────────────────────────────────────────────
+
+class DurakRules:
+    """
+    Rules engine.  Piles are card-ID bitmasks (see cards.py); the per-card
+    _order stamps keep the insertion order the list views and the FIFO
+    taken-pile refill rely on.  hand / opp_hand / player_taken / opp_taken /
+    remaining / table / locked_ranks are read-only views over that state.
+    Side index 0 is the player, 1 the opponent.  `rng` (default: the
+    random module) drives the shuffle and the first-attacker tie-break.
+
+    `version` goes up on every state change (try_attack, try_defend,
+    try_take, try_end_attack, resolve_wild).  Legal-move masks and sets are
+    cached until the next change, so repeated queries between moves are
+    O(1); the sets are returned as shared frozensets.
+
+    For lookahead: between begin_search() and end_search() every state
+    change also pushes a reversible delta, so undo() rolls back one call; a
+    live game outside a search records none.  clone() is a cheap
+    independent copy (with its own cache, not searching), and
+    snapshot() / restore() save the whole state as a hashable tuple.
+    visible_state() freezes only what one side can see (a VisibleState),
+    and from_visible() turns that back into a game the AI can work on.
+    """
+    def __init__(self, all_card_keys, trump_key, rng=random):
+        self.trump_suit=_trump_suit_of(trump_key)
+        self._trump=SUIT_INDEX[self.trump_suit]; self._beats=BEATS[self._trump]
+        self.trump_key=trump_key
+        pool=[k for k in all_card_keys if k not in _UNPLAYABLE]
+        rng.shuffle(pool)
+        pool=[card_id(k) for k in pool]
+        self._order=[0]*N_CARDS; self._clock=0
+        self._undo=[]; self._stamps=[]; self._popped=[]; self._searching=0
+        self._hands=[0,0]; self._taken=[0,0]
+        for c in pool[:6]:   self._put(self._hands,0,c)
+        for c in pool[6:12]: self._put(self._hands,1,c)
+        self._deck=deque(pool[12:])
+        self.attacker=self._first_attacker(rng)
+        self.defender='opponent' if self.attacker=='player' else 'player'
+        self._atk=[-1]*6; self._def=[-1]*6; self._table_ranks=0; self._locked=0
+        self.phase='attack'; self.winner=None; self.status=""
+        self.pending_wild=False
+        self.version=0; self._cache={}
+        self._refresh_status()
+
+    def _touch(self):
+        """
+        Record a state change: bump the version, drop cached legal moves and,
+        inside a search, push an undo frame.  The frame holds the scalar
+        state plus the lists _put (overwritten order stamps) and
+        _refill_hand (cards drawn from the deck) append to until the next
+        change.
+        """
+        self.version+=1; self._cache={}
+        self._stamps=[]; self._popped=[]
+        if self._searching: self._undo.append((self._scalars(),self._stamps,self._popped))
+
+    def begin_search(self):
+        """Start recording undo frames for lookahead.  Scopes nest; pair each with end_search()."""
+        self._searching+=1
+
+    def end_search(self):
+        """Close a begin_search() scope; the outermost one drops the undo stack and stops recording."""
+        self._searching-=1
+        if not self._searching: self._undo=[]
+
+    # ── Snapshot / clone / undo ──
+    def _scalars(self):
+        return (self.trump_suit,self.trump_key,self._clock,self._hands[0],self._hands[1],
+                self._taken[0],self._taken[1],self.attacker,self.defender,
+                tuple(self._atk),tuple(self._def),self._table_ranks,self._locked,
+                self.phase,self.winner,self.status,self.pending_wild)
+
+    def _load_scalars(self,s):
+        (self.trump_suit,self.trump_key,self._clock,h0,h1,t0,t1,self.attacker,self.defender,
+         atk,dfn,self._table_ranks,self._locked,self.phase,self.winner,self.status,
+         self.pending_wild)=s
+        self._hands=[h0,h1]; self._taken=[t0,t1]; self._atk=list(atk); self._def=list(dfn)
+        self._trump=SUIT_INDEX[self.trump_suit]; self._beats=BEATS[self._trump]
+
+    def undo(self):
+        """Roll back the last state change.  Returns False when there is none."""
+        if not self._undo: return False
+        scalars,stamps,popped=self._undo.pop()
+        self._load_scalars(scalars)
+        for c,stamp in reversed(stamps): self._order[c]=stamp
+        self._deck.extendleft(reversed(popped))
+        # version only ever grows, so (rules, version) never names two states
+        self.version+=1; self._cache={}
+        self._stamps=[]; self._popped=[]
+        return True
+
+    def snapshot(self):
+        """The whole game state as a hashable tuple, for restore()."""
+        return (self._scalars(),tuple(self._order),tuple(self._deck))
+
+    def restore(self,snap):
+        """Return to a snapshot() of this game.  Clears the undo stack."""
+        scalars,order,deck=snap
+        self._load_scalars(scalars)
+        self._order=list(order); self._deck=deque(deck)
+        self.version+=1; self._cache={}
+        self._undo=[]; self._stamps=[]; self._popped=[]
+
+    def visible_state(self,side=1):
+        """What `side` (default: the opponent) can see, as a VisibleState."""
+        o=1-side; deck=0
+        for c in self._deck: deck|=1<<c
+        return VisibleState(self.trump_suit,self.trump_key,self.phase,self._atk_side()==side,self.pending_wild,
+                            self._hands[side],self._taken[side],self._taken[o],self._hands[o].bit_count(),
+                            self._hands[o]|deck,tuple(self._atk),tuple(self._def),self._table_ranks,self._locked)
+
+    @classmethod
+    def from_visible(cls,v):
+        """
+        A game matching VisibleState `v`, its viewer as 'opponent'.  Piles
+        list in card-ID order, and the unseen cards are dealt lowest first
+        (the other hand, then the deck), so nothing hidden leaks in and
+        equal states thaw into equal games.
+        """
+        r=object.__new__(cls)
+        unseen=bit_ids(v.unseen); n=v.other_hand_size
+        r.trump_suit=v.trump_suit; r.trump_key=v.trump_key
+        r._trump=SUIT_INDEX[v.trump_suit]; r._beats=BEATS[r._trump]
+        r._order=list(range(N_CARDS)); r._clock=N_CARDS
+        r._undo=[]; r._stamps=[]; r._popped=[]; r._searching=0
+        r._hands=[sum(1<<c for c in unseen[:n]),v.hand]; r._taken=[v.other_taken,v.taken]
+        r._deck=deque(unseen[n:])
+        r.attacker,r.defender=('opponent','player') if v.attacking else ('player','opponent')
+        r._atk=list(v.atk); r._def=list(v.dfn); r._table_ranks=v.table_ranks; r._locked=v.locked
+        r.phase=v.phase; r.winner=None; r.pending_wild=v.pending_wild
+        r.version=0; r._cache={}
+        r._refresh_status()
+        return r
+
+    def clone(self):
+        """Independent copy of the current state, with an empty undo stack and its own cache."""
+        c=object.__new__(type(self))
+        c.__dict__.update(self.__dict__)
+        c._order=self._order[:]; c._hands=self._hands[:]; c._taken=self._taken[:]
+        c._atk=self._atk[:]; c._def=self._def[:]; c._deck=deque(self._deck)
+        c._undo=[]; c._stamps=[]; c._popped=[]; c._searching=0; c._cache={}
+        return c
+
+    def _cached(self,key,compute,*args):
+        try: return self._cache[key]
+        except KeyError:
+            value=self._cache[key]=compute(*args)
+            return value
+
+    def _put(self,piles,side,c):
+        piles[side]|=1<<c; self._stamps.append((c,self._order[c]))
+        self._order[c]=self._clock; self._clock+=1
+
+    def _ids(self,mask):  return sorted(bit_ids(mask),key=self._order.__getitem__)
+    def _view(self,mask): return [CARD_KEYS[i] for i in self._ids(mask)]
+
+    # ── List views ──
+    @property
+    def hand(self):         return self._view(self._hands[0])
+    @property
+    def opp_hand(self):     return self._view(self._hands[1])
+    @property
+    def player_taken(self): return self._view(self._taken[0])
+    @property
+    def opp_taken(self):    return self._view(self._taken[1])
+    @property
+    def remaining(self):    return [CARD_KEYS[i] for i in self._deck]
+    @property
+    def locked_ranks(self): return {r for r in range(len(RANKS)) if self._locked>>r&1}
+    @property
+    def table(self):
+        return [None if a<0 else [CARD_KEYS[a],None if d<0 else CARD_KEYS[d]]
+                for a,d in zip(self._atk,self._def)]
+
+    def _first_attacker(self,rng):
+        def lowest_trump(mask):
+            mask&=SUIT_MASK[self._trump]&NORMAL_MASK
+            return CARD_RANK[(mask&-mask).bit_length()-1] if mask else 999
+        p,o=lowest_trump(self._hands[0]),lowest_trump(self._hands[1])
+        if p==o: return rng.choice(['player','opponent'])
+        return 'player' if p<o else 'opponent'
+
+    def _refresh_status(self):
+        if self.phase=='game_over':
+            if self.winner=='draw':   self.status="DRAW - both players emptied their hands!"
+            elif self.winner=='player': self.status="YOU WIN - AI is the Durak!"
+            else:                     self.status="YOU LOSE - You are the Durak!"
+            return
+        if self.phase=='attack':
+            who="YOUR TURN" if self.attacker=='player' else "AI ATTACKS"
+            self.status=f"{who}: drag a card to attack."
+        else:
+            who="YOUR TURN" if self.defender=='player' else "AI DEFENDS"
+            self.status=f"{who}: defend or click TAKE."
+
+    def _atk_side(self): return 0 if self.attacker=='player' else 1
+    def _def_side(self): return 0 if self.defender=='player' else 1
+    def _attacker_hand(self):  return self._view(self._hands[self._atk_side()])
+    def _defender_hand(self):  return self._view(self._hands[self._def_side()])
+    def _defender_taken(self): return self._view(self._taken[self._def_side()])
+    def _attacker_taken(self): return self._view(self._taken[self._atk_side()])
+
+    # ── Legal-move masks (cached per version) ──
+    def attack_mask(self): return self._cached('attack',self._attack_mask)
+    def defense_mask(self,atk): return self._cached(('defense',atk),self._defense_mask,atk)
+    def all_defense_mask(self): return self._cached('all_defense',self._all_defense_mask)
+
+    def _attack_mask(self):
+        a=self._atk_side(); pile=self._hands[a]|self._taken[a]
+        # Attack cards are always normal, so an occupied table has a rank bit set
+        if not self._table_ranks: return pile&NORMAL_MASK
+        return pile&RANKSET_CARDS[self._table_ranks&~self._locked]
+
+    def _defense_mask(self,atk):
+        d=self._def_side()
+        return (self._hands[d]|self._taken[d])&self._beats[atk]
+
+    def _all_defense_mask(self):
+        beats=0
+        for a,d in zip(self._atk,self._def):
+            if a>=0 and d<0: beats|=self._beats[a]
+        d=self._def_side()
+        return (self._hands[d]|self._taken[d])&beats
+
+    def valid_attack_cards(self):
+        return self._cached('attack_keys',_mask_keys,self.attack_mask())
+    def valid_defense_for(self,atk_key):
+        atk=card_id(atk_key)
+        return self._cached(('defense_keys',atk),_mask_keys,self.defense_mask(atk))
+    def all_defense_cards(self):
+        return self._cached('all_defense_keys',_mask_keys,self.all_defense_mask())
+
+    def _unbeaten(self):
+        return [[CARD_KEYS[a],None] for a,d in zip(self._atk,self._def) if a>=0 and d<0]
+    def _all_beaten(self):
+        return any(a>=0 for a in self._atk) and all(d>=0 for a,d in zip(self._atk,self._def) if a>=0)
+
+    def _remove(self,side,c):
+        bit=1<<c
+        if self._taken[side]&bit: self._taken[side]^=bit
+        else: self._hands[side]^=bit
+
+    def try_attack(self,card_key,slot_index):
+        if self.phase!='attack': return False
+        c=CARD_ID.get(card_key)
+        if c is None or not self.attack_mask()>>c&1: return False
+        if self._atk[slot_index]>=0: return False
+        self._touch()
+        self._atk[slot_index]=c; self._table_ranks|=1<<CARD_RANK[c]; self.phase='defense'
+        self._remove(self._atk_side(),c)
+        self._check_game_over(); self._refresh_status()
+        return True
+
+    def try_defend(self,atk_key,def_key):
+        if self.phase!='defense': return False
+        atk=card_id(atk_key); d=CARD_ID.get(def_key)
+        if d is None or not self.defense_mask(atk)>>d&1: return False
+        self._touch()
+        self._remove(self._def_side(),d)
+        special=CARD_SPECIAL[d]
+        if special==SKIP: self._locked|=1<<CARD_RANK[atk]
+        elif special==NORMAL: self._table_ranks|=1<<CARD_RANK[d]
+        for i in range(6):
+            if self._atk[i]==atk and self._def[i]<0:
+                self._def[i]=d; break
+        if special==REVERSE:
+            self.attacker,self.defender=self.defender,self.attacker
+            self.phase='attack'; self._check_game_over(); self._refresh_status()
+            return 'ok_reverse'
+        if self._all_beaten(): self.phase='attack'
+        self._check_game_over(); self._refresh_status()
+        if special==WILD: self.pending_wild=True; return 'ok_wild'
+        return 'ok'
+
+    def _clear_table(self):
+        cards=[]
+        for a,d in zip(self._atk,self._def):
+            if a>=0:
+                cards.append(a)
+                if d>=0: cards.append(d)
+        self._atk=[-1]*6; self._def=[-1]*6; self._table_ranks=0; self._locked=0
+        return cards
+
+    def try_take(self):
+        if self.phase!='defense': return False
+        if not any(a>=0 for a in self._atk): return False
+        self._touch()
+        d=self._def_side()
+        for c in self._clear_table(): self._put(self._taken,d,c)
+        atk_r=self._refill_hand(self._atk_side())
+        def_r=self._refill_hand(d)
+        self.phase='attack'; self._check_game_over(); self._refresh_status()
+        return (True,atk_r,def_r)
+
+    def _refill_hand(self,side):
+        refilled=[]
+        while self._hands[side].bit_count()<6 and self._taken[side]:
+            card=min(bit_ids(self._taken[side]),key=self._order.__getitem__)
+            self._taken[side]^=1<<card; self._put(self._hands,side,card)
+            refilled.append((CARD_KEYS[card],'taken'))
+        while self._hands[side].bit_count()<6 and self._deck:
+            card=self._deck.popleft(); self._popped.append(card); self._put(self._hands,side,card)
+            refilled.append((CARD_KEYS[card],'deck'))
+        return refilled
+
+    def resolve_wild(self,new_suit):
+        self._touch()
+        self.trump_suit=new_suit; self._trump=SUIT_INDEX[new_suit]; self._beats=BEATS[self._trump]
+        suffix={'clubs':'C','diamonds':'D','hearts':'H','spades':'S'}
+        self.trump_key='ace'+suffix[new_suit]; self.pending_wild=False
+
+    def try_end_attack(self):
+        if self.phase!='attack': return []
+        if not self._all_beaten(): return []
+        self._touch()
+        cleared=[CARD_KEYS[c] for c in self._clear_table()]
+        self.attacker,self.defender=self.defender,self.attacker
+        atk_r=self._refill_hand(self._atk_side())
+        def_r=self._refill_hand(self._def_side())
+        self.phase='attack'; self._check_game_over(); self._refresh_status()
+        return (cleared,atk_r,def_r)
+
+    def _check_game_over(self):
+        if self._deck: return
+        p_empty=not (self._hands[0]|self._taken[0])
+        o_empty=not (self._hands[1]|self._taken[1])
+        if p_empty and o_empty: self.phase='game_over'; self.winner='draw'
+        elif p_empty:           self.phase='game_over'; self.winner='player'
+        elif o_empty:           self.phase='game_over'; self.winner='opponent'
@@ -0,0 +1,340 @@
+"""
+endgame.py  –  Exact endgame solver for Uno-Urak
+
+Once the deck is empty nothing is hidden any more: every card the side to
+move cannot see in its own piles, on the table or in the discard is in the
+other hand.  The rest of the game is a small perfect-information game, and
+this module solves it outright.
+
+The search runs on a compact copy of the position rather than on
+DurakRules: with no deck a hand and a taken pile behave the same, so each
+side is one card mask, and the table is the mask of its cards plus the one
+attack still unbeaten (the engine alternates attack and defense, so there
+is at most one).  Moves and their order are ismcts.py's (kind, a, b)
+tuples; the transitions mirror durak_rules.py for an empty deck.
+
+Minimax with alpha-beta, scored +1 win, 0 draw, -1 loss for the side to
+move at the root.  Positions are Zobrist-hashed, incrementally as moves
+are made, into a bounded always-replace transposition table that keeps
+its entries from move to move, so later moves of the same endgame are
+mostly lookups.  A position with no legal move (an attacker holding only
+special cards) and a line repeating a position score as draws, as stalled
+games do in selfplay.py.
+
+  endgame_action(rules, ask_wild=False, budget_ms=250)
+
+endgame_action has the heuristic_action signature plus a budget, and
+returns None while the deck is not empty or when the search does not
+finish within the budget.  get_ai_action tries it before any backend.
+No pygame dependency.
+"""
+
+import random
+import threading
+import time
+
+from ai_opponent import heuristic_action
+from cards import (BEATS, CARD_RANK, CARD_SPECIAL, N_CARDS, NORMAL, NORMAL_MASK, RANKS, RANKSET_CARDS,
+                   REVERSE, SKIP, SUITS, WILD, bit_ids, strength)
+from ismcts import ATTACK, DEFEND, END, SUIT, TAKE, legal_moves, to_action
+from selfplay import SEATS, seat_view
+
+
+DEFAULT_BUDGET_MS = 250
+TABLE_BITS = 16          # 65536 transposition-table slots
+MAX_PLY = 200            # deeper lines score as draws, like the selfplay step cap
+
+EXACT, LOWER, UPPER = range(3)
+
+
+# ── Position ───────────────────────────────────────────────────────────────────
+#
+# (piles, table, unbeaten, attacks, ranks, locked, attacker, defense, trump, wild)
+#   piles     (side 0 mask, side 1 mask): hand | taken pile
+#   table     mask of every card on the table
+#   unbeaten  the attack card still to be covered, or -1
+#   attacks   attack cards on the table (slots used)
+#   ranks / locked   as DurakRules._table_ranks / _locked
+#   attacker  side index; defense: phase == 'defense'; wild: pending_wild
+
+def position(rules):
+    """The compact position of `rules`, or None if it is not an endgame the solver handles."""
+    if rules._deck or rules.phase == 'game_over':
+        return None
+    unbeaten = [a for a, d in zip(rules._atk, rules._def) if a >= 0 and d < 0]
+    if len(unbeaten) > 1:
+        return None
+    table = 0
+    for a, d in zip(rules._atk, rules._def):
+        if a >= 0: table |= 1 << a
+        if d >= 0: table |= 1 << d
+    return ((rules._hands[0] | rules._taken[0], rules._hands[1] | rules._taken[1]), table,
+            unbeaten[0] if unbeaten else -1, sum(a >= 0 for a in rules._atk), rules._table_ranks,
+            rules._locked, rules._atk_side(), rules.phase == 'defense', rules._trump, rules.pending_wild)
+
+
+def to_move(pos):
+    """Side index whose decision `pos` waits on."""
+    return 1 - pos[6] if pos[7] or pos[9] else pos[6]
+
+
+# Cheapest first: low non-trumps, then trumps, then the special cards
+_COST = [[strength(c, t) if CARD_SPECIAL[c] == NORMAL else 200 for c in range(N_CARDS)] for t in range(len(SUITS))]
+
+
+def moves(pos):
+    """Legal moves in `pos`, cheapest cards first, take / end_attack last."""
+    piles, _, unbeaten, attacks, ranks, locked, attacker, defense, trump, wild = pos
+    if wild:
+        return [(SUIT, s, 0) for s in range(len(SUITS))]
+    cost = _COST[trump].__getitem__
+    if defense:
+        cards = sorted(bit_ids(piles[1 - attacker] & BEATS[trump][unbeaten]), key=cost)
+        return [(DEFEND, unbeaten, c) for c in cards] + [(TAKE, 0, 0)]
+    result = []
+    if attacks < 6:
+        legal = RANKSET_CARDS[ranks & ~locked] if ranks else NORMAL_MASK
+        result = [(ATTACK, c, 0) for c in sorted(bit_ids(piles[attacker] & legal), key=cost)]
+    if attacks:
+        result.append((END, 0, 0))
+    return result
+
+
+# ── Zobrist keys ───────────────────────────────────────────────────────────────
+
+_rng = random.Random(0x5EED)
+_key = lambda: _rng.getrandbits(64)
+_Z_PILE  = [[_key() for _ in range(N_CARDS)] for _ in range(2)]
+_Z_TABLE = [_key() for _ in range(N_CARDS)]
+_Z_UNBEATEN = [_key() for _ in range(N_CARDS + 1)]         # [card + 1]
+_Z_ATTACKS  = [_key() for _ in range(7)]
+_Z_RANKS    = [_key() for _ in range(1 << len(RANKS))]
+_Z_LOCKED   = [_key() for _ in range(1 << len(RANKS))]
+_Z_TRUMP    = [_key() for _ in range(len(SUITS))]
+_Z_ATTACKER, _Z_DEFENSE, _Z_WILD = _key(), _key(), _key()
+
+
+def _byte_table(keys):
+    """[i][byte]: XOR of the keys of the cards in byte i of a card mask."""
+    return [[_xor(keys[c] for c in bit_ids(b << 8 * i) if c < N_CARDS) for b in range(256)]
+            for i in range((N_CARDS + 7) // 8)]
+
+
+def _xor(values):
+    h = 0
+    for v in values: h ^= v
+    return h
+
+
+# Whole masks hash a byte at a time (a take moves the table in one go)
+_PILE_BYTES  = [_byte_table(keys) for keys in _Z_PILE]
+_TABLE_BYTES = _byte_table(_Z_TABLE)
+
+
+def _mask_hash(bytes_, mask):
+    h = 0
+    for i, row in enumerate(bytes_):
+        h ^= row[mask >> 8 * i & 0xFF]
+    return h
+
+
+def zobrist(pos):
+    """64-bit hash of `pos`; play() keeps it up to date incrementally."""
+    piles, table, unbeaten, attacks, ranks, locked, attacker, defense, trump, wild = pos
+    return (_mask_hash(_PILE_BYTES[0], piles[0]) ^ _mask_hash(_PILE_BYTES[1], piles[1])
+            ^ _mask_hash(_TABLE_BYTES, table) ^ _Z_UNBEATEN[unbeaten + 1] ^ _Z_ATTACKS[attacks]
+            ^ _Z_RANKS[ranks] ^ _Z_LOCKED[locked] ^ _Z_TRUMP[trump]
+            ^ (_Z_ATTACKER if attacker else 0) ^ (_Z_DEFENSE if defense else 0) ^ (_Z_WILD if wild else 0))
+
+
+def play(pos, h, move):
+    """(position, hash) after `move`."""
+    piles, table, unbeaten, attacks, ranks, locked, attacker, defense, trump, wild = pos
+    kind, a, c = move
+    if kind == ATTACK:
+        bit, r = 1 << a, 1 << CARD_RANK[a]
+        piles = (piles[0] ^ bit, piles[1]) if attacker == 0 else (piles[0], piles[1] ^ bit)
+        h ^= (_Z_PILE[attacker][a] ^ _Z_TABLE[a] ^ _Z_UNBEATEN[0] ^ _Z_UNBEATEN[a + 1]
+              ^ _Z_ATTACKS[attacks] ^ _Z_ATTACKS[attacks + 1] ^ _Z_RANKS[ranks] ^ _Z_RANKS[ranks | r] ^ _Z_DEFENSE)
+        return (piles, table | bit, a, attacks + 1, ranks | r, locked, attacker, True, trump, wild), h
+    if kind == DEFEND:
+        d, bit, special = 1 - attacker, 1 << c, CARD_SPECIAL[c]
+        piles = (piles[0] ^ bit, piles[1]) if d == 0 else (piles[0], piles[1] ^ bit)
+        h ^= _Z_PILE[d][c] ^ _Z_TABLE[c] ^ _Z_UNBEATEN[a + 1] ^ _Z_UNBEATEN[0] ^ _Z_DEFENSE
+        if special == SKIP:
+            new = locked | 1 << CARD_RANK[a]
+            h ^= _Z_LOCKED[locked] ^ _Z_LOCKED[new]; locked = new
+        elif special == NORMAL:
+            new = ranks | 1 << CARD_RANK[c]
+            h ^= _Z_RANKS[ranks] ^ _Z_RANKS[new]; ranks = new
+        elif special == REVERSE:
+            h ^= _Z_ATTACKER; attacker = d
+        elif special == WILD:
+            h ^= _Z_WILD; wild = True
+        return (piles, table | bit, -1, attacks, ranks, locked, attacker, False, trump, wild), h
+    if kind == SUIT:
+        return (piles, table, unbeaten, attacks, ranks, locked, attacker, defense, a, False), \
+            h ^ _Z_TRUMP[trump] ^ _Z_TRUMP[a] ^ _Z_WILD
+    # TAKE or END: the table is cleared
+    h ^= (_mask_hash(_TABLE_BYTES, table) ^ _Z_UNBEATEN[unbeaten + 1] ^ _Z_UNBEATEN[0] ^ _Z_ATTACKS[attacks]
+          ^ _Z_ATTACKS[0] ^ _Z_RANKS[ranks] ^ _Z_RANKS[0] ^ _Z_LOCKED[locked] ^ _Z_LOCKED[0])
+    d = 1 - attacker
+    if kind == TAKE:
+        h ^= _mask_hash(_PILE_BYTES[d], table) ^ _Z_DEFENSE
+        piles = (piles[0] | table, piles[1]) if d == 0 else (piles[0], piles[1] | table)
+    else:
+        h ^= _Z_ATTACKER; attacker = d
+    return (piles, 0, -1, 0, 0, 0, attacker, False, trump, wild), h
+
+
+# ── Transposition table ────────────────────────────────────────────────────────
+
+class TranspositionTable:
+    """
+    Fixed-size hash table of searched positions: slot = hash & mask, and a
+    new entry always replaces the old one.  Entries are (hash, side, value,
+    flag, best move), value from `side`'s point of view.  probes / hits
+    count lookups.
+    """
+
+    def __init__(self, bits: int = TABLE_BITS):
+        self.mask = (1 << bits) - 1
+        self._slots = [None] * (1 << bits)
+        self.lock = threading.Lock()      # one search at a time
+        self.probes = self.hits = 0
+
+    def get(self, h, side):
+        self.probes += 1
+        entry = self._slots[h & self.mask]
+        if entry is not None and entry[0] == h and entry[1] == side:
+            self.hits += 1
+            return entry
+        return None
+
+    def put(self, h, side, value, flag, move):
+        self._slots[h & self.mask] = (h, side, value, flag, move)
+
+    def clear(self):
+        self._slots = [None] * len(self._slots)
+        self.probes = self.hits = 0
+
+
+table = TranspositionTable()
+
+
+# ── Search ─────────────────────────────────────────────────────────────────────
+
+class _OutOfTime(Exception):
+    pass
+
+
+class _Search:
+    def __init__(self, side, tt, deadline):
+        self.side, self.tt, self.deadline = side, tt, deadline
+        self.path = set()
+        self.nodes = 0
+
+    def value(self, pos, h, alpha, beta, ply):
+        piles = pos[0]
+        if not piles[0] or not piles[1]:
+            if not piles[0] and not piles[1]: return 0
+            return 1 if (not piles[self.side]) else -1
+        self.nodes += 1
+        if not self.nodes & 1023 and time.perf_counter() > self.deadline:
+            raise _OutOfTime
+        if h in self.path or ply >= MAX_PLY:
+            return 0
+        entry = self.tt.get(h, self.side)
+        best_move = None
+        if entry is not None:
+            _, _, value, flag, best_move = entry
+            if flag == EXACT: return value
+            if flag == LOWER: alpha = max(alpha, value)
+            else:             beta = min(beta, value)
+            if alpha >= beta: return value
+        legal = moves(pos)
+        if not legal:
+            return 0
+        if best_move in legal:
+            legal.remove(best_move); legal.insert(0, best_move)
+        return self.best(pos, h, legal, alpha, beta, ply)[0]
+
+    def best(self, pos, h, legal, alpha, beta, ply):
+        """(value, move) of the best of `legal`; stores the result under hash h."""
+        maximize = to_move(pos) == self.side
+        alpha0, beta0 = alpha, beta
+        best, best_move = (-2 if maximize else 2), legal[0]
+        self.path.add(h)
+        try:
+            for m in legal:
+                v = self.value(*play(pos, h, m), alpha, beta, ply + 1)
+                if maximize and v > best:
+                    best, best_move, alpha = v, m, max(alpha, v)
+                elif not maximize and v < best:
+                    best, best_move, beta = v, m, min(beta, v)
+                if alpha >= beta: break
+        finally:
+            self.path.discard(h)
+        flag = UPPER if best <= alpha0 else LOWER if best >= beta0 else EXACT
+        self.tt.put(h, self.side, best, flag, best_move)
+        return best, best_move
+
+
+def solve(rules, budget_ms=DEFAULT_BUDGET_MS, tt=None):
+    """
+    (value, move, nodes) for the side to act in DurakRules `rules` with
+    the deck empty: value +1 / 0 / -1 is a forced
+    win / draw / loss under perfect play, and move an ismcts move tuple,
+    None when there is none.  Among equal moves heuristic_action's choice
+    is kept.  Raises ValueError for a position the solver does not handle
+    and TimeoutError when `budget_ms` runs out first.
+    """
+    tt = tt or table
+    pos = position(rules)
+    if pos is None:
+        raise ValueError("not an endgame position")
+    legal = moves(pos)
+    if not legal:
+        return 0, None, 0
+    hint = _move_of(rules, heuristic_action(seat_view(rules, SEATS[to_move(pos)]), ask_wild=pos[9]))
+    if hint in legal:
+        legal.remove(hint); legal.insert(0, hint)
+    search = _Search(to_move(pos), tt, time.perf_counter() + budget_ms / 1000)
+    with tt.lock:
+        try:
+            value, move = search.best(pos, zobrist(pos), legal, -1, 1, 0)
+        except _OutOfTime:
+            raise TimeoutError(f"endgame search unfinished after {search.nodes} nodes") from None
+    return value, move, search.nodes
+
+
+def _move_of(rules, action):
+    """The ismcts move tuple for a heuristic_action dict (any attack slot), or None."""
+    for m in legal_moves(rules):
+        move = to_action(rules, m)
+        if move == action or move["action"] == action.get("action") == "attack" and move["card"] == action.get("card"):
+            return m
+    return None
+
+
+def endgame_action(rules, ask_wild=False, budget_ms=DEFAULT_BUDGET_MS):
+    """
+    Perfect-play move for the side to act in `rules` once the deck is
+    empty, as a heuristic_action-style dict.  None while cards are left in
+    the deck, or when the search does not finish within `budget_ms`.
+    """
+    base = rules.clone()             # always an unswapped DurakRules
+    if ask_wild and not base.pending_wild:
+        base.pending_wild = True
+    if position(base) is None:
+        return None
+    try:
+        _, move, _ = solve(base, budget_ms)
+    except TimeoutError:
+        return None
+    return None if move is None else to_action(base, move)
+
+
+def endgame_policy(rules, ask_wild=False):
+    """heuristic_action, with the solver's move whenever it has one: a tournament bot."""
+    return endgame_action(rules, ask_wild) or heuristic_action(rules, ask_wild=ask_wild)
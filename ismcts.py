@@ -0,0 +1,212 @@
+"""
+ismcts.py  –  Information-set Monte Carlo tree search AI for Uno-Urak
+
+Single-observer ISMCTS.  Each iteration deals a determinization: the cards
+the searching side cannot see (the other hand and the deck order) are
+reshuffled, while everything on the table and in both taken piles stays
+as it is.  The iteration walks one shared tree using only the moves that
+are legal in that deal, expands one new move, and finishes the game with a
+heuristic_action playout.  Every node counts how often it was available,
+and UCB uses that count, so moves that exist in only some deals are not
+starved.
+
+  ismcts_action(rules, ask_wild=False, budget_ms=500, workers=0)
+
+ismcts_action has the heuristic_action signature and returns the same
+action dicts.  get_ai_action uses it when backend="ismcts".  With
+workers > 0, that many processes each search for the whole budget with
+their own seeds, and their root statistics are summed (root
+parallelisation).  No pygame dependency.
+"""
+
+import math
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from ai_opponent import heuristic_action
+from cards import CARD_KEYS, SUITS, bit_ids
+from selfplay import play_game
+
+
+DEFAULT_BUDGET_MS = 500
+EXPLORATION = 0.7        # UCB constant; rewards are in [0, 1]
+PLAYOUT_STEPS = 300      # playout cap; capped and stalled playouts score as draws
+
+# Moves are (kind, a, b) int tuples: cheap to hash as tree keys
+ATTACK, DEFEND, TAKE, END, SUIT = range(5)
+
+
+# ── Moves on DurakRules ────────────────────────────────────────────────────────
+
+def legal_moves(rules):
+    """Every move the side to act may make; [] when the game is over or stuck."""
+    if rules.phase == 'game_over':
+        return []
+    if rules.pending_wild:
+        return [(SUIT, s, 0) for s in range(len(SUITS))]
+    if rules.phase == 'attack':
+        moves = [(ATTACK, c, 0) for c in bit_ids(rules.attack_mask())] if -1 in rules._atk else []
+        if rules._all_beaten():
+            moves.append((END, 0, 0))
+        return moves
+    moves = [(DEFEND, a, d) for a, dfn in zip(rules._atk, rules._def) if a >= 0 and dfn < 0
+             for d in bit_ids(rules.defense_mask(a))]
+    moves.append((TAKE, 0, 0))
+    return moves
+
+
+def mover(rules):
+    """Side index (0 player, 1 opponent) whose decision the game waits on."""
+    if rules.pending_wild or rules.phase == 'defense':
+        return rules._def_side()
+    return rules._atk_side()
+
+
+def play(rules, move):
+    kind, a, b = move
+    if kind == ATTACK:   rules.try_attack(CARD_KEYS[a], rules._atk.index(-1))
+    elif kind == DEFEND: rules.try_defend(CARD_KEYS[a], CARD_KEYS[b])
+    elif kind == TAKE:   rules.try_take()
+    elif kind == END:    rules.try_end_attack()
+    else:                rules.resolve_wild(SUITS[a])
+
+
+def to_action(rules, move):
+    """The get_ai_action dict for `move` in `rules`."""
+    kind, a, b = move
+    if kind == ATTACK: return {"action": "attack", "card": CARD_KEYS[a], "slot": rules._atk.index(-1)}
+    if kind == DEFEND: return {"action": "defend", "atk_card": CARD_KEYS[a], "def_card": CARD_KEYS[b]}
+    if kind == TAKE:   return {"action": "take"}
+    if kind == END:    return {"action": "end_attack"}
+    return {"action": "choose_suit", "suit": SUITS[a]}
+
+
+def determinize(rules, side, rng):
+    """
+    Copy of `rules` with the cards `side` cannot see (the other hand plus
+    the deck) shuffled back out at their current sizes.
+    """
+    d = rules.clone()
+    other = 1 - side
+    hidden = bit_ids(d._hands[other]) + list(d._deck)
+    rng.shuffle(hidden)
+    n = d._hands[other].bit_count()
+    d._hands[other] = sum(1 << c for c in hidden[:n])
+    d._deck = deque(hidden[n:])
+    d._cache = {}
+    return d
+
+
+# ── Search ─────────────────────────────────────────────────────────────────────
+
+class Node:
+    __slots__ = ('side', 'children', 'visits', 'reward', 'avail')
+
+    def __init__(self, side):
+        self.side = side           # side that made the move leading here
+        self.children = {}         # move -> Node
+        self.visits = 0
+        self.reward = 0.0          # from `side`'s point of view
+        self.avail = 0             # iterations in which this move was legal
+
+
+_PLAYOUT = {'player': heuristic_action, 'opponent': heuristic_action}
+_SIDE_WINNER = ('player', 'opponent')
+
+
+def playout(rules):
+    """Finish the game with heuristic_action on both sides.  Returns the winning side, or None for a draw."""
+    if rules.pending_wild and rules.phase != 'game_over':
+        play(rules, (SUIT, SUITS.index(heuristic_action(rules, ask_wild=True)["suit"]), 0))
+    winner, _ = play_game(rules, _PLAYOUT, max_steps=PLAYOUT_STEPS)
+    return _SIDE_WINNER.index(winner) if winner in _SIDE_WINNER else None
+
+
+def search(rules, budget_ms=DEFAULT_BUDGET_MS, iterations=None, seed=None):
+    """
+    Run ISMCTS for the side to move until `budget_ms` runs out, or
+    `iterations` is reached if given.  Returns {move: (visits, reward)}
+    for the root's children.
+    """
+    rng = random.Random(seed)
+    side = mover(rules)
+    root = Node(1 - side)
+    deadline = time.perf_counter() + budget_ms / 1000
+    done = 0
+    while (iterations is None or done < iterations) and (done == 0 or time.perf_counter() < deadline):
+        done += 1
+        state = determinize(rules, side, rng)
+        node, path = root, []
+        # Selection / expansion
+        while True:
+            moves = legal_moves(state)
+            if not moves:
+                break
+            to_act = mover(state)
+            untried = [m for m in moves if m not in node.children]
+            for m in moves:
+                child = node.children.get(m)
+                if child is not None: child.avail += 1
+            if untried:
+                move = rng.choice(untried)
+                child = node.children[move] = Node(to_act)
+                child.avail = 1
+                play(state, move); path.append(child)
+                break
+            move, child = max(((m, node.children[m]) for m in moves),
+                              key=lambda mc: mc[1].reward / mc[1].visits
+                              + EXPLORATION * math.sqrt(math.log(mc[1].avail) / mc[1].visits))
+            play(state, move); path.append(child)
+            node = child
+        # Playout and backpropagation
+        winner = playout(state) if state.phase != 'game_over' else (
+            None if state.winner == 'draw' else _SIDE_WINNER.index(state.winner))
+        for n in path:
+            n.visits += 1
+            n.reward += 0.5 if winner is None else float(winner == n.side)
+    return {m: (c.visits, c.reward) for m, c in root.children.items()}
+
+
+_pool = None
+_pool_workers = 0
+
+
+def _get_pool(workers):
+    """One long-lived pool, so worker start-up is paid once per session."""
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None: _pool.shutdown(wait=False, cancel_futures=True)
+        _pool, _pool_workers = ProcessPoolExecutor(max_workers=workers), workers
+    return _pool
+
+
+def ismcts_action(rules, ask_wild=False, budget_ms=DEFAULT_BUDGET_MS, workers=0, iterations=None):
+    """
+    Best move for the side to act in `rules`, found within `budget_ms`.
+    `rules` may be a DurakRules or a selfplay SeatView.  Returns a
+    heuristic_action-style dict.
+    """
+    base = rules.clone()             # always an unswapped DurakRules, safe to pickle
+    if ask_wild and not base.pending_wild:
+        base.pending_wild = True
+    moves = legal_moves(base)
+    if not moves:
+        return {"action": "end_attack"}
+    if len(moves) == 1:
+        return to_action(base, moves[0])
+    seed = random.getrandbits(32)
+    if workers:
+        pool = _get_pool(workers)
+        futures = [pool.submit(search, base, budget_ms, iterations, seed + i) for i in range(workers)]
+        results = [f.result() for f in futures]
+    else:
+        results = [search(base, budget_ms, iterations, seed)]
+    totals = {}
+    for stats in results:
+        for m, (visits, reward) in stats.items():
+            v, r = totals.get(m, (0, 0.0))
+            totals[m] = (v + visits, r + reward)
+    best = max(moves, key=lambda m: totals.get(m, (0, 0.0)))
+    return to_action(base, best)
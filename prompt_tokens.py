@@ -0,0 +1,141 @@
+"""
+prompt_tokens.py  –  Prompt size of the full vs compact state encodings
+
+Builds both build_state_prompt formats for a corpus of recorded states and
+reports their size per turn.  The corpus is every decision point (attack,
+defense, WILD suit choice) of seeded heuristic self-play, seen from the seat
+to move; --save / --load keep it as JSON lines of VisibleState fields so
+later runs compare against the same positions.
+
+With --api-key the counts are exact, from the messages/count_tokens
+endpoint (one request per prompt; the cached system prompt is counted once
+and subtracted).  Without it they are an offline estimate: words, numbers
+and punctuation runs, with long words split every four characters, which
+tracks BPE counts for this kind of text closely enough to compare formats.
+
+  python prompt_tokens.py                     estimate over 50 games
+  python prompt_tokens.py --menu              the same with numbered move menus
+  python prompt_tokens.py --games 200 --save states.jsonl
+  python prompt_tokens.py --load states.jsonl --api-key sk-...
+"""
+
+import argparse
+import json
+import re
+import sys
+import urllib.request
+
+from ai_opponent import API_VERSION, DEFAULT_MODEL, _SYSTEM, build_state_prompt, heuristic_action, move_menu
+from durak_rules import DurakRules, VisibleState
+from selfplay import apply_action, new_game, seat_view, to_move
+
+
+COUNT_URL = "https://api.anthropic.com/v1/messages/count_tokens"
+
+
+# ── Corpus ─────────────────────────────────────────────────────────────────────
+
+def record_states(games, seed=0):
+    """(state, ask_wild) for every decision of `games` seeded heuristic games."""
+    states = []
+    for g in range(seed, seed + games):
+        rules = new_game(g)
+        for _ in range(500):
+            seat = to_move(rules)
+            if seat is None: break
+            view = seat_view(rules, seat)
+            states.append((view.visible_state(), False))
+            if not apply_action(rules, heuristic_action(view)): break
+            if rules.pending_wild and rules.phase != 'game_over':
+                view = seat_view(rules, seat)
+                states.append((view.visible_state(), True))
+                apply_action(rules, heuristic_action(view, ask_wild=True))
+    return states
+
+
+def save_states(path, states):
+    with open(path, "w") as f:
+        for state, ask_wild in states:
+            f.write(json.dumps({"state": state._asdict(), "ask_wild": ask_wild}) + "\n")
+
+
+def load_states(path):
+    states = []
+    with open(path) as f:
+        for line in f:
+            row = json.loads(line)
+            fields = row["state"]
+            fields["atk"], fields["dfn"] = tuple(fields["atk"]), tuple(fields["dfn"])
+            states.append((VisibleState(**fields), row["ask_wild"]))
+    return states
+
+
+# ── Counting ───────────────────────────────────────────────────────────────────
+
+_PIECE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]+")
+
+
+def estimate_tokens(text):
+    return sum((len(p) + 3) // 4 if p.isalpha() else len(p) if p.isdigit() else 1
+               for p in _PIECE.findall(text))
+
+
+def api_counter(api_key, model=DEFAULT_MODEL):
+    """count(text) -> exact input tokens of `text` as the user turn."""
+    def post(content):
+        body = json.dumps({"model": model, "system": _SYSTEM,
+                           "messages": [{"role": "user", "content": content}]}).encode("utf-8")
+        req = urllib.request.Request(COUNT_URL, data=body, method="POST", headers={
+            "Content-Type": "application/json", "x-api-key": api_key, "anthropic-version": API_VERSION})
+        with urllib.request.urlopen(req, timeout=15) as resp:
+            return json.loads(resp.read().decode("utf-8"))["input_tokens"]
+    base = post(".") - 1
+    return lambda text: post(text) - base
+
+
+def compare(states, count, whole_turn=True, indexed=False):
+    """
+    Per-format totals over `states`: prompts, chars, tokens, largest prompt.
+    indexed builds the prompts with their numbered move menus.
+    """
+    report = {}
+    for name, compact in (("full", False), ("compact", True)):
+        chars = tokens = peak = 0
+        for state, ask_wild in states:
+            rules = DurakRules.from_visible(state)
+            prompt = build_state_prompt(rules, ask_wild=ask_wild, whole_turn=whole_turn, compact=compact,
+                                        menu=move_menu(rules, ask_wild) if indexed else None)
+            n = count(prompt)
+            chars += len(prompt); tokens += n; peak = max(peak, n)
+        report[name] = {"prompts": len(states), "chars": chars, "tokens": tokens, "max_tokens": peak}
+    return report
+
+
+def main(argv):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--games", type=int, default=50, help="self-play games to record states from")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--save", help="write the recorded states to this JSONL file")
+    ap.add_argument("--load", help="read states from this JSONL file instead of recording")
+    ap.add_argument("--api-key", help="count exactly with messages/count_tokens")
+    ap.add_argument("--model", default=DEFAULT_MODEL)
+    ap.add_argument("--menu", action="store_true", help="prompts with the numbered move menu, as get_ai_action sends")
+    args = ap.parse_args(argv)
+
+    states = load_states(args.load) if args.load else record_states(args.games, args.seed)
+    if args.save:
+        save_states(args.save, states)
+    count = api_counter(args.api_key, args.model) if args.api_key else estimate_tokens
+    report = compare(states, count, indexed=args.menu)
+    print(f"{len(states)} states, tokens {'from count_tokens' if args.api_key else 'estimated offline'}")
+    print(f"{'format':<8} {'chars/turn':>10} {'tokens/turn':>11} {'max tokens':>10}")
+    for name, r in report.items():
+        n = r["prompts"]
+        print(f"{name:<8} {r['chars'] / n:>10.0f} {r['tokens'] / n:>11.1f} {r['max_tokens']:>10}")
+    full, compact = report["full"]["tokens"], report["compact"]["tokens"]
+    print(f"compact saves {1 - compact / full:.0%} of the per-turn input tokens")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,105 @@
+"""
+selfplay.py  –  Headless game driver for Uno-Urak bots
+
+Plays a DurakRules game to the end with one policy per seat.  A policy has
+the heuristic_action signature, policy(rules, ask_wild=False) -> action dict,
+and always plays the 'opponent' seat; SeatView mirrors the state so the same
+policy can sit in the 'player' seat too.
+"""
+
+import random
+
+from durak_rules import DurakRules, DECK
+
+
+SEATS = ('player', 'opponent')
+
+
+# ── Seat mirror ────────────────────────────────────────────────────────────────
+
+class SeatView:
+    """Read-only view of `rules` with the 'player' and 'opponent' seats swapped."""
+
+    _SWAP = {'player': 'opponent', 'opponent': 'player'}
+
+    def __init__(self, rules):
+        self._rules = rules
+
+    def __getattr__(self, name):
+        return getattr(self._rules, name)
+
+    hand         = property(lambda self: self._rules.opp_hand)
+    opp_hand     = property(lambda self: self._rules.hand)
+    player_taken = property(lambda self: self._rules.opp_taken)
+    opp_taken    = property(lambda self: self._rules.player_taken)
+    attacker     = property(lambda self: self._SWAP[self._rules.attacker])
+    defender     = property(lambda self: self._SWAP[self._rules.defender])
+
+    def visible_state(self, side=1):
+        return self._rules.visible_state(1 - side)
+
+
+def seat_view(rules, seat):
+    """`rules` as seen by a policy sitting in `seat`."""
+    return rules if seat == 'opponent' else SeatView(rules)
+
+
+def to_move(rules):
+    """Seat whose decision the game is waiting on, or None when it is over."""
+    if rules.phase == 'attack':  return rules.attacker
+    if rules.phase == 'defense': return rules.defender
+    return None
+
+
+# ── Action execution ───────────────────────────────────────────────────────────
+
+def apply_action(rules, action):
+    """
+    Execute one action dict on `rules`, as run_game does for the AI.
+    Returns the DurakRules result; a falsy result means the move was illegal
+    or had no effect.
+    """
+    a = action.get("action")
+    if a == "choose_suit":
+        rules.resolve_wild(action.get("suit", "clubs"))
+        return True
+    if a == "attack":
+        slot = action.get("slot", 0)
+        return 0 <= slot <= 5 and rules.try_attack(action.get("card"), slot)
+    if a == "defend":
+        return rules.try_defend(action.get("atk_card"), action.get("def_card"))
+    if a == "defend_all":
+        # Only the first pair answers this position; the rest wait for pile-ons
+        atk, dfn = action.get("pairs", [[None, None]])[0]
+        return rules.try_defend(atk, dfn)
+    if a == "take":
+        return rules.try_take()
+    if a == "end_attack":
+        return rules.try_end_attack()
+    return False
+
+
+def play_game(rules, policies, max_steps=500):
+    """
+    Drive `rules` to the end.  `policies` maps seat -> policy.
+    Returns (winner, steps): winner is 'player', 'opponent', 'draw', or
+    'stalled' when a policy's move has no effect or max_steps runs out.
+    WILD suit choices are not counted as steps.
+    """
+    for step in range(max_steps):
+        seat = to_move(rules)
+        if seat is None:
+            return rules.winner, step
+        action = policies[seat](seat_view(rules, seat))
+        result = apply_action(rules, action)
+        if not result:
+            return 'stalled', step
+        if rules.pending_wild and rules.phase != 'game_over':
+            apply_action(rules, policies[seat](seat_view(rules, seat), ask_wild=True))
+    return 'stalled', max_steps
+
+
+def new_game(seed):
+    """Seeded deal: trump and shuffle both come from random.Random(seed)."""
+    rng = random.Random(seed)
+    return DurakRules(list(DECK), 'ace' + rng.choice('CDHS'), rng=rng)
@@ -0,0 +1,193 @@
+"""
+tournament.py  –  Multi-process bot tournament for Uno-Urak
+
+Every pair of bots plays each seeded deal twice, once from each seat, so
+seat and deal luck cancel out.  Seed ranges are spread across a
+ProcessPoolExecutor (one worker per core by default) and results are
+streamed back as chunks finish.
+
+  python tournament.py --bots heuristic random --games 100000
+  python tournament.py --bots heuristic mybots:greedy_v2 --workers 8
+
+A bot is a name from BOTS or a "module:function" path to any policy with
+the heuristic_action signature (see selfplay.py).  Stalled games (no legal
+move, or over the step limit) count as draws for scoring.
+"""
+
+import argparse
+import importlib
+import itertools
+import math
+import os
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from ai_opponent import heuristic_action
+from cards import CARD_ID, CARD_KEYS, bit_ids
+from endgame import endgame_policy
+from ismcts import ismcts_action
+from selfplay import new_game, play_game
+
+
+# ── Bots ───────────────────────────────────────────────────────────────────────
+
+def random_action(rules, ask_wild=False):
+    """Uniformly random legal move; a baseline for the ratings."""
+    if ask_wild:
+        return {"action": "choose_suit", "suit": random.choice(['clubs', 'diamonds', 'hearts', 'spades'])}
+    if rules.phase == 'attack':
+        moves = [{"action": "attack", "card": CARD_KEYS[i], "slot": rules.table.index(None)}
+                 for i in bit_ids(rules.attack_mask())] if None in rules.table else []
+        if rules._all_beaten() or not moves:
+            moves.append({"action": "end_attack"})
+        return random.choice(moves)
+    moves = [{"action": "defend", "atk_card": s[0], "def_card": CARD_KEYS[d]}
+             for s in rules._unbeaten() for d in bit_ids(rules.defense_mask(CARD_ID[s[0]]))]
+    return random.choice(moves + [{"action": "take"}])
+
+
+BOTS = {
+    'heuristic': heuristic_action,
+    'random':    random_action,
+    'ismcts':    ismcts_action,     # 500 ms per move; slow, use a small --games
+    'endgame':   endgame_policy,    # heuristic until the deck is empty, then solved
+}
+
+
+def resolve_bot(name):
+    if name in BOTS:
+        return BOTS[name]
+    module, _, func = name.partition(':')
+    return getattr(importlib.import_module(module), func)
+
+
+# ── Worker ─────────────────────────────────────────────────────────────────────
+
+def play_chunk(bot_a, bot_b, seeds):
+    """
+    Play seeds as deals, bot_a in each seat once.  Returns counts from bot_a's
+    side ({'win', 'draw', 'loss', 'stalled'}), the game count, busy seconds
+    and the worker pid.
+    """
+    a, b = resolve_bot(bot_a), resolve_bot(bot_b)
+    counts = defaultdict(int)
+    t0 = time.perf_counter()
+    for seed in seeds:
+        for a_seat in ('opponent', 'player'):
+            b_seat = 'player' if a_seat == 'opponent' else 'opponent'
+            random.seed(seed)
+            winner, _ = play_game(new_game(seed), {a_seat: a, b_seat: b})
+            if winner == a_seat:     counts['win'] += 1
+            elif winner == b_seat:   counts['loss'] += 1
+            else:
+                counts['draw'] += 1
+                if winner == 'stalled': counts['stalled'] += 1
+    return bot_a, bot_b, dict(counts), 2 * len(seeds), time.perf_counter() - t0, os.getpid()
+
+
+# ── Statistics ─────────────────────────────────────────────────────────────────
+
+def score_interval(win, draw, loss, z=1.96):
+    """Mean score (win=1, draw=½) with a normal-approximation confidence interval."""
+    n = win + draw + loss
+    if not n: return 0.5, 0.0, 1.0
+    s = (win + 0.5 * draw) / n
+    var = (win * (1 - s) ** 2 + draw * (0.5 - s) ** 2 + loss * s ** 2) / n
+    half = z * math.sqrt(var / n)
+    return s, max(0.0, s - half), min(1.0, s + half)
+
+
+def elo_diff(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def elo_ratings(results, bots, anchor=1500, iters=200):
+    """
+    Bradley-Terry fit of pairwise scores (draws as half wins), converted to
+    Elo and shifted so the mean rating is `anchor`.
+    """
+    strength = {b: 1.0 for b in bots}
+    wins = defaultdict(float); games = defaultdict(float)
+    for (a, b), c in results.items():
+        wins[a] += c['win'] + 0.5 * c['draw']; wins[b] += c['loss'] + 0.5 * c['draw']
+        n = c['win'] + c['draw'] + c['loss']
+        games[a, b] += n; games[b, a] += n
+    for _ in range(iters):
+        for x in bots:
+            denom = sum(games[x, y] / (strength[x] + strength[y]) for y in bots if y != x)
+            if denom and wins[x]: strength[x] = wins[x] / denom
+    elo = {b: 400 * math.log10(strength[b]) for b in bots}
+    shift = anchor - sum(elo.values()) / len(elo)
+    return {b: r + shift for b, r in elo.items()}
+
+
+# ── Runner ─────────────────────────────────────────────────────────────────────
+
+def run(bots, games, workers=None, chunk=500, seed=0):
+    """Play `games` deals per pairing.  Returns (results, per-worker stats, wall seconds)."""
+    workers = workers or os.cpu_count() or 1
+    results = defaultdict(lambda: defaultdict(int))
+    per_worker = defaultdict(lambda: [0, 0.0])
+    pairings = list(itertools.combinations(bots, 2))
+    jobs = [(a, b, range(s, min(s + chunk, seed + games)))
+            for a, b in pairings for s in range(seed, seed + games, chunk)]
+    total = 2 * games * len(pairings)
+    done = 0
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(play_chunk, *job) for job in jobs]
+        for fut in as_completed(futures):
+            a, b, counts, n, busy, pid = fut.result()
+            for k, v in counts.items(): results[a, b][k] += v
+            per_worker[pid][0] += n; per_worker[pid][1] += busy
+            done += n
+            elapsed = time.perf_counter() - t0
+            print(f"  {done:>9,}/{total:,} games  {done / elapsed:8,.0f} games/s", flush=True)
+    return results, per_worker, time.perf_counter() - t0
+
+
+def report(bots, results, per_worker, wall):
+    print("\nPAIRINGS (first bot's view, 95% CI on score)")
+    for (a, b), c in sorted(results.items()):
+        w, d, l = c['win'], c['draw'], c['loss']
+        n = w + d + l
+        s, lo, hi = score_interval(w, d, l)
+        print(f"  {a} vs {b}:  W {w / n:6.1%}  D {d / n:6.1%}  L {l / n:6.1%}"
+              f"  (stalled {c['stalled'] / n:.1%})  score {s:.3f} [{lo:.3f}, {hi:.3f}]"
+              f"  Elo diff {elo_diff(s):+.0f} [{elo_diff(lo):+.0f}, {elo_diff(hi):+.0f}]")
+
+    print("\nRATINGS")
+    for b, r in sorted(elo_ratings(results, bots).items(), key=lambda x: -x[1]):
+        print(f"  {b:<24} {r:7.0f}")
+
+    print("\nWORKERS")
+    rates = []
+    for pid, (n, busy) in sorted(per_worker.items()):
+        rates.append(n / busy if busy else 0.0)
+        print(f"  pid {pid:<8} {n:>9,} games  {rates[-1]:8,.0f} games/s")
+    total = sum(n for n, _ in per_worker.values())
+    wall_rate = total / wall if wall else 0.0
+    print(f"  total {wall_rate:,.0f} games/s over {len(rates)} workers"
+          f"  (scaling efficiency {wall_rate / max(sum(rates), 1e-9):.0%} of the per-worker sum)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--bots", nargs="+", default=["heuristic", "random"])
+    ap.add_argument("--games", type=int, default=10000, help="seeded deals per pairing (each played twice)")
+    ap.add_argument("--workers", type=int, default=None, help="default: os.cpu_count()")
+    ap.add_argument("--chunk", type=int, default=500, help="seeds per work unit")
+    ap.add_argument("--seed", type=int, default=0, help="first seed")
+    args = ap.parse_args()
+    if len(args.bots) < 2:
+        ap.error("need at least two bots")
+    for b in args.bots: resolve_bot(b)
+    results, per_worker, wall = run(args.bots, args.games, args.workers, args.chunk, args.seed)
+    report(args.bots, results, per_worker, wall)
+
+
+if __name__ == "__main__":
+    main()